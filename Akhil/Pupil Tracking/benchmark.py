@@ -0,0 +1,350 @@
+"""
+Accuracy + latency benchmark of every pupil detector variant over val/.
+
+    python benchmark.py                                  # all variants -> benchmark_report.json
+    python benchmark.py --only teacher-openvino-int8 student-openvino-int8 classical
+    python benchmark.py --baseline main.json             # exit 1 on a regression
+
+Each variant in VARIANTS (model, backend, input size, confidence threshold -
+the settings mousecontrol.py, pupilcam_tracking.py and predict.py actually
+use) runs --runs times, each in a fresh process, so load time and peak RSS
+are its own:
+
+    load        model load + warmup (s)
+    p50 / p99   per-frame detect() latency over --repeat passes (ms),
+                median of the runs
+    mAP50, mAP  box AP at IoU 0.5 and 0.5:0.95 against the polygon labels
+    found       frames with a pupil; center: median / p95 box-centre error (px)
+    rss         peak resident memory of the process, and what the model added (MB)
+
+The report records the commit, CPU and library versions next to the
+numbers. With --baseline, variants run on the same machine are compared
+and latency, RSS or accuracy regressions beyond the tolerances are listed
+and fail the run - as does a variant that was ok in the baseline and is
+now failed, skipped or missing. The latency tolerance widens with the
+run-to-run spread of either report, and latency only fails the run when both
+timed at least MIN_TIMED_FRAMES frames (otherwise it is a warning). Variants
+whose files are missing are reported as skipped.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from pupil_backends import MODELS, variant_path
+from pupil_classical import box_iou, load_labelled
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+VAL_DIR = os.path.join(HERE, "val")
+REPORT_FILE = os.path.join(HERE, "benchmark_report.json")
+REPEAT = 20                         # Timed passes over val/ per run
+RUNS = 3                            # Fresh-process runs per variant (latency = median)
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+# Regressions against --baseline
+LATENCY_TOLERANCE = 0.10            # p50 / p99 slower by more than 10% ...
+NOISE_MARGIN = 2.0                  # ... or twice the run-to-run spread, if larger
+MIN_TIMED_FRAMES = 300              # Fewer frames (all runs): latency changes only warn
+RSS_TOLERANCE = 0.10
+MAP_TOLERANCE = 0.01                # mAP50-95 lower by more than this
+CENTER_TOLERANCE = 1.0              # Median centre error higher by more than this (px)
+
+
+def variant(name, model, backend, imgsz=320, conf=0.4, hybrid=False):
+    return {"name": name, "model": model, "backend": backend, "imgsz": imgsz, "conf": conf, "hybrid": hybrid}
+
+
+VARIANTS = [
+    # mousecontrol.py: 320 px, conf 0.4, any backend, optionally classical-first
+    *(variant(f"teacher-{b}", "teacher", b) for b in ("torch", "onnx", "onnx-int8", "openvino", "openvino-int8")),
+    *(variant(f"student-{b}", "student", b) for b in ("torch", "onnx", "onnx-int8", "openvino", "openvino-int8")),
+    variant("hybrid-teacher-openvino-int8", "teacher", "openvino-int8", hybrid=True),
+    variant("hybrid-student-openvino-int8", "student", "openvino-int8", hybrid=True),
+    variant("classical", None, "classical", conf=0.0),
+    # pupilcam_tracking.py and predict.py: the .pt model at 640 px
+    variant("pupilcam-teacher-torch", "teacher", "torch", imgsz=640, conf=0.8),
+    variant("predict-teacher-torch", "teacher", "torch", imgsz=640, conf=0.7),
+]
+
+
+# ----------------------------
+# Metrics
+# ----------------------------
+def peak_rss_mb():
+    """Peak resident set size of this process so far."""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak / 2 ** 20 if sys.platform == "darwin" else peak / 2 ** 10   # bytes on macOS, KB on Linux
+    except ImportError:     # Windows
+        import psutil
+        return psutil.Process().memory_info().peak_wset / 2 ** 20
+
+
+def average_precision(scored, n_truth, threshold):
+    """COCO-style (101-point) AP; scored is [(conf, IoU with that image's only pupil, image)]."""
+    if not n_truth or not scored:
+        return 0.0
+    matched = set()
+    tp = []
+    for conf, iou, image in sorted(scored, key=lambda s: -s[0]):
+        hit = iou >= threshold and image not in matched
+        if hit:
+            matched.add(image)
+        tp.append(hit)
+    tp = np.cumsum(tp)
+    recall = tp / n_truth
+    precision = tp / np.arange(1, len(tp) + 1)
+    precision = np.maximum.accumulate(precision[::-1])[::-1]    # Monotone envelope
+    points = np.linspace(0, 1, 101)
+    at = np.searchsorted(recall, points, side="left")
+    return float(np.mean([precision[i] if i < len(precision) else 0.0 for i in at]))
+
+
+def load_detector(config):
+    from pupil_backends import load_backend
+    from pupil_classical import ClassicalPupil, HybridPupil
+    if config["backend"] == "classical":
+        return ClassicalPupil(conf=config["conf"])
+    path = os.path.join(HERE, MODELS[config["model"]])
+    detector = load_backend(config["backend"], path, imgsz=config["imgsz"], conf=config["conf"])
+    return HybridPupil(detector) if config["hybrid"] else detector
+
+
+def run_variant(config, val_dir=VAL_DIR, repeat=REPEAT):
+    """Benchmark one variant (in its own process); returns its report entry."""
+    samples = [(cv2.imread(p), polygon) for p, polygon in load_labelled(val_dir)]
+    samples = [s for s in samples if s[0] is not None]
+    rss_before = peak_rss_mb()
+
+    start = time.perf_counter()
+    detector = load_detector(config)
+    load = time.perf_counter() - start
+
+    # Accuracy from the first pass, latency from all of them
+    scored, errors, times = [], [], []
+    for i in range(repeat):
+        for image, (frame, polygon) in enumerate(samples):
+            h, w = frame.shape[:2]
+            points = polygon * (w, h)
+            truth = (*points.min(0), *points.max(0))
+            start = time.perf_counter()
+            boxes = detector.detect(frame)
+            times.append(time.perf_counter() - start)
+            if i:
+                continue
+            scored += [(float(box[4]), box_iou(box, truth), image) for box in boxes]
+            if len(boxes):
+                box = boxes[0]
+                errors.append(np.hypot((box[0] + box[2] - truth[0] - truth[2]) / 2,
+                                       (box[1] + box[3] - truth[1] - truth[3]) / 2))
+
+    times = np.array(times) * 1000
+    aps = [average_precision(scored, len(samples), t) for t in IOU_THRESHOLDS]
+    peak = peak_rss_mb()
+    return {
+        **config,
+        "status": "ok",
+        "images": len(samples),
+        "frames_timed": len(times),
+        "load_s": load,
+        "p50_ms": float(np.percentile(times, 50)),
+        "p99_ms": float(np.percentile(times, 99)),
+        "mean_ms": float(times.mean()),
+        "map50": aps[0],
+        "map": float(np.mean(aps)),
+        "found": len(errors) / len(samples) if samples else 0.0,
+        "center_px": float(np.median(errors)) if errors else None,
+        "center_p95_px": float(np.percentile(errors, 95)) if errors else None,
+        "peak_rss_mb": peak,
+        "model_rss_mb": peak - rss_before,
+    }
+
+
+def combine_runs(runs):
+    """One report entry from several runs of a variant: median latency and load,
+    the per-run p50/p99 kept for the noise estimate."""
+    result = dict(runs[0])   # Accuracy is the same every run
+    for key in ("load_s", "p50_ms", "p99_ms", "mean_ms", "peak_rss_mb", "model_rss_mb"):
+        result[key] = float(np.median([r[key] for r in runs]))
+    result["runs"] = len(runs)
+    result["frames_timed"] = sum(r["frames_timed"] for r in runs)
+    result["p50_runs_ms"] = [r["p50_ms"] for r in runs]
+    result["p99_runs_ms"] = [r["p99_ms"] for r in runs]
+    return result
+
+
+def missing_files(config):
+    if config["backend"] == "classical":
+        return None
+    path = variant_path(config["backend"], os.path.join(HERE, MODELS[config["model"]]))
+    return None if os.path.exists(path) else f"{os.path.relpath(path, HERE)} not found"
+
+
+# ----------------------------
+# Report
+# ----------------------------
+def package_version(name):
+    try:
+        from importlib.metadata import version
+        return version(name)
+    except Exception:
+        return None
+
+
+def environment():
+    """What the numbers depend on besides the code: commit, CPU, libraries."""
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=HERE, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ""
+
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "machine": {"node": platform.node(), "cpu": platform.processor() or platform.machine(),
+                    "cores": os.cpu_count(), "system": f"{platform.system()} {platform.release()}"},
+        "python": platform.python_version(),
+        "packages": {name: package_version(name) for name in
+                     ("ultralytics", "torch", "onnxruntime", "openvino", "opencv-python", "numpy")},
+    }
+
+
+def spread(result, key):
+    """Relative run-to-run spread (max - min) / median of a latency, 0 for a single run."""
+    runs = result.get(key.replace("_ms", "_runs_ms")) or []
+    if len(runs) < 2:
+        return 0.0
+    return (max(runs) - min(runs)) / float(np.median(runs))
+
+
+def regressions(report, baseline, names=None):
+    """ What got worse than the baseline (only `names`, if given), as two
+        human-readable lists: regressions, and latency changes measured on too
+        few frames to fail the run.
+    """
+    before = {r["name"]: r for r in baseline["results"]
+              if r.get("status") == "ok" and (names is None or r["name"] in names)}
+    now = {r["name"]: r for r in report["results"]}
+    found = [f"{name}: ok -> missing from this report" for name in before if name not in now]
+    warnings = []
+    for result in report["results"]:
+        old = before.get(result["name"])
+        if old is None:
+            continue
+        name = result["name"]
+        if result.get("status") != "ok":
+            # A broken export or crashing backend is a regression too
+            found.append(f"{name}: ok -> {result.get('status')}")
+            continue
+        enough = min(result["frames_timed"], old["frames_timed"]) >= MIN_TIMED_FRAMES
+        for key in ("p50_ms", "p99_ms"):
+            tolerance = max(LATENCY_TOLERANCE, NOISE_MARGIN * max(spread(result, key), spread(old, key)))
+            if result[key] > old[key] * (1 + tolerance):
+                line = f"{name}: {key} {old[key]:.2f} -> {result[key]:.2f} (tolerance {tolerance:.0%})"
+                if enough:
+                    found.append(line)
+                else:
+                    warnings.append(f"{line}, only {min(result['frames_timed'], old['frames_timed'])} "
+                                    f"frames timed")
+        if result["peak_rss_mb"] > old["peak_rss_mb"] * (1 + RSS_TOLERANCE):
+            found.append(f"{name}: peak RSS {old['peak_rss_mb']:.0f} -> {result['peak_rss_mb']:.0f} MB")
+        if result["map"] < old["map"] - MAP_TOLERANCE:
+            found.append(f"{name}: mAP50-95 {old['map']:.3f} -> {result['map']:.3f}")
+        if (result["center_px"] is not None and old["center_px"] is not None
+                and result["center_px"] > old["center_px"] + CENTER_TOLERANCE):
+            found.append(f"{name}: centre error {old['center_px']:.1f} -> {result['center_px']:.1f} px")
+    return found, warnings
+
+
+def print_table(results):
+    print(f"\n{'variant':30s} {'load s':>7s} {'p50':>7s} {'p99':>7s} {'mAP50':>6s} {'mAP':>6s} "
+          f"{'found':>6s} {'center':>7s} {'rss MB':>7s}")
+    for r in results:
+        if r["status"] != "ok":
+            print(f"{r['name']:30s} {r['status']}")
+            continue
+        center = f"{r['center_px']:7.1f}" if r["center_px"] is not None else f"{'-':>7s}"
+        print(f"{r['name']:30s} {r['load_s']:7.2f} {r['p50_ms']:7.2f} {r['p99_ms']:7.2f} {r['map50']:6.3f} "
+              f"{r['map']:6.3f} {r['found']:6.0%} {center} {r['peak_rss_mb']:7.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark every pupil detector variant on val/")
+    parser.add_argument("--only", nargs="+", metavar="VARIANT", help="Run just these variants")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Timed passes over val/ per run")
+    parser.add_argument("--runs", type=int, default=RUNS, help="Fresh-process runs per variant")
+    parser.add_argument("--val", default=VAL_DIR, help="Directory with images/ and labels/")
+    parser.add_argument("--out", default=REPORT_FILE)
+    parser.add_argument("--baseline", help="Earlier report to compare against (same machine)")
+    args = parser.parse_args()
+
+    configs = VARIANTS
+    if args.only:
+        unknown = set(args.only) - {c["name"] for c in VARIANTS}
+        if unknown:
+            parser.error(f"unknown variant(s) {', '.join(sorted(unknown))}; "
+                         f"choose from {', '.join(c['name'] for c in VARIANTS)}")
+        configs = [c for c in VARIANTS if c["name"] in args.only]
+
+    report = {**environment(), "val": os.path.relpath(os.path.abspath(args.val), HERE),
+              "repeat": args.repeat, "runs": max(args.runs, 1), "results": []}
+    print(f"{len(configs)} variants on {report['val']} ({report['runs']} x {report['repeat']} passes), commit "
+          f"{(report['commit'] or '?')[:8]}{' (dirty)' if report['dirty'] else ''}")
+
+    # A fresh process per variant: load time and peak RSS are its own
+    spawn = multiprocessing.get_context("spawn")
+    for config in configs:
+        missing = missing_files(config)
+        if missing:
+            result = {**config, "status": f"skipped: {missing}"}
+        else:
+            try:
+                runs = []
+                for _ in range(report["runs"]):
+                    with ProcessPoolExecutor(max_workers=1, mp_context=spawn) as pool:
+                        runs.append(pool.submit(run_variant, config, args.val, args.repeat).result())
+                result = combine_runs(runs)
+            except Exception as e:
+                result = {**config, "status": f"failed: {e}"}
+        report["results"].append(result)
+        if result["status"] == "ok":
+            print(f"[{config['name']}] p50 {result['p50_ms']:.2f}ms (spread {spread(result, 'p50_ms'):.0%}), "
+                  f"mAP50-95 {result['map']:.3f}")
+        else:
+            print(f"[{config['name']}] {result['status']}")
+
+    print_table(report["results"])
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"\nReport: {args.out}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("machine") != report["machine"]:
+            print(f"Warning: baseline is from {baseline.get('machine')}, latency/RSS are not comparable")
+        found, warnings = regressions(report, baseline, {c["name"] for c in configs} if args.only else None)
+        print(f"\nvs {args.baseline} ({(baseline.get('commit') or '?')[:8]}): "
+              f"{len(found)} regression(s)")
+        for line in found:
+            print(f"  {line}")
+        for line in warnings:
+            print(f"  warning: {line}")
+        if found:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""
+Distil the medium pupil model (teacher) into a nano student for CPU laptops.
+
+    python distill.py                                  # label, train, export, compare
+    python distill.py --epochs 150 --ground-truth
+    python distill.py --steps compare                  # re-run the comparison only
+
+1. label    The teacher (yolo11m-seg-custom.pt) segments every frame of
+            train/images and the unlabelled Test/ at TEACHER_CONF. Its best
+            polygon becomes the frame's label in distill/; frames it misses
+            keep their human label (or are dropped if they have none).
+            --ground-truth reverses the priority for train/images.
+2. train    yolo11n-seg trains on distill/images at the deployment size
+            (decode-once store, like train.py) and validates on the real val/.
+            The result is copied to yolo11n-seg-distilled.pt.
+3. export   The student's CPU variants (export_models.py).
+4. compare  Teacher vs student on val/: per-frame latency for each backend,
+            box IoU and centre error against the ground truth, box/mask mAP.
+            Written to distill_report.json.
+
+mousecontrol.py and pupilcam_tracking.py run the student with --student.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from export_models import export, list_images
+from prepare_dataset import CachedSegmentationTrainer, EpochTimer, build_store, read_label
+from pupil_backends import MODEL_PATH, STUDENT_PATH, load_backend, variant_path
+from pupil_classical import evaluate, load_labelled
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_YAML = os.path.join(HERE, "custom_dataset.yaml")
+DISTILL_DIR = os.path.join(HERE, "distill")
+RUNS_DIR = os.path.join(HERE, "runs", "distill")
+REPORT_FILE = os.path.join(HERE, "distill_report.json")
+SOURCES = ("train", "Test")     # Frames the teacher labels (Test/ has no labels of its own)
+
+STUDENT_BASE = "yolo11n-seg.pt"
+TEACHER_IMGSZ = 640
+STUDENT_IMGSZ = 320             # mousecontrol.py's IMGSZ
+TEACHER_CONF = 0.5
+EPOCHS = 100
+BATCH = 16
+VARIANTS = ["openvino", "openvino-int8"]
+REPEAT = 3                      # Passes over val/ when timing
+TARGET_SPEEDUP = 4.0
+
+
+# ----------------------------
+# 1. Teacher labels
+# ----------------------------
+def source_images(source):
+    """train/images, or a flat directory like Test/."""
+    directory = os.path.join(HERE, source)
+    images = os.path.join(directory, "images")
+    return images if os.path.isdir(images) else directory
+
+
+def teacher_polygon(teacher, path):
+    """Normalized (k, 2) polygon of the teacher's most confident pupil, or None."""
+    result = teacher.predict(path, imgsz=TEACHER_IMGSZ, conf=TEACHER_CONF, device="cpu",
+                             retina_masks=True, verbose=False)[0]
+    if result.masks is None or not len(result.boxes):
+        return None
+    best = int(result.boxes.conf.argmax())
+    polygon = result.masks.xyn[best]
+    return polygon if len(polygon) >= 3 else None
+
+
+def label(teacher_path=MODEL_PATH, ground_truth=False):
+    """Write distill/images + distill/labels and the data yaml; returns the yaml path."""
+    from ultralytics import YOLO
+    teacher = YOLO(teacher_path)
+
+    images_dir = os.path.join(DISTILL_DIR, "images")
+    labels = os.path.join(DISTILL_DIR, "labels")
+    shutil.rmtree(DISTILL_DIR, ignore_errors=True)
+    os.makedirs(images_dir)
+    os.makedirs(labels)
+
+    counts = {"teacher": 0, "human": 0, "dropped": 0}
+    start = time.perf_counter()
+    for source in SOURCES:
+        directory = source_images(source)
+        human_dir = os.path.join(os.path.dirname(directory), "labels")
+        for path in list_images(directory):
+            stem = os.path.splitext(os.path.basename(path))[0]
+            human = read_label(os.path.join(human_dir, stem + ".txt"))
+            human = human[0][1] if human else None
+            polygon = None if ground_truth and human is not None else teacher_polygon(teacher, path)
+            if polygon is None:
+                polygon = human
+            if polygon is None:
+                counts["dropped"] += 1
+                continue
+            counts["human" if polygon is human else "teacher"] += 1
+
+            # Prefixed: Test/1.jpg must not collide with a train image
+            name = f"{source.lower()}_{os.path.basename(path)}"
+            shutil.copy2(path, os.path.join(images_dir, name))
+            with open(os.path.join(labels, os.path.splitext(name)[0] + ".txt"), "w") as f:
+                f.write("0 " + " ".join(f"{v:.6f}" for v in np.asarray(polygon).ravel()) + "\n")
+
+    data_yaml = os.path.join(DISTILL_DIR, "data.yaml")
+    with open(data_yaml, "w") as f:
+        f.write("# Written by distill.py - paths are relative to this file\n"
+                "train: images\n"
+                f"val: {os.path.relpath(os.path.join(HERE, 'val', 'images'), DISTILL_DIR)}\n"
+                "nc: 1\n"
+                'names: ["PUPIL"]\n')
+    print(f"[label] {counts['teacher']} teacher / {counts['human']} human labels, "
+          f"{counts['dropped']} frames dropped ({time.perf_counter() - start:.1f}s)")
+    return data_yaml
+
+
+# ----------------------------
+# 2. Student
+# ----------------------------
+def train(data_yaml, base=STUDENT_BASE, imgsz=STUDENT_IMGSZ, epochs=EPOCHS, batch=BATCH):
+    """Train the student on the teacher labels; returns STUDENT_PATH."""
+    from ultralytics import YOLO
+
+    # Only the distill split: val/ keeps its own store (train.py builds it at 640)
+    build_store(os.path.join(DISTILL_DIR, "images"), imgsz)
+
+    model = YOLO(base)
+    timer = EpochTimer().attach(model)
+    model.train(data=data_yaml, imgsz=imgsz, device="cpu", batch=batch, epochs=epochs, workers=3,
+                project=RUNS_DIR, name="student", exist_ok=True, trainer=CachedSegmentationTrainer)
+    print(timer.describe())
+
+    shutil.copy(model.trainer.best, os.path.join(HERE, STUDENT_PATH))
+    return STUDENT_PATH
+
+
+# ----------------------------
+# 4. Comparison
+# ----------------------------
+def mask_map(model_path, imgsz):
+    """Box and mask mAP50 / mAP50-95 of one model on val/."""
+    from ultralytics import YOLO
+    metrics = YOLO(model_path).val(data=DATA_YAML, split="val", imgsz=imgsz, device="cpu", batch=1,
+                                   plots=False, verbose=False, project=RUNS_DIR,
+                                   name=f"val_{os.path.splitext(os.path.basename(model_path))[0]}",
+                                   exist_ok=True)
+    return {"box_map50": float(metrics.box.map50), "box_map": float(metrics.box.map),
+            "mask_map50": float(metrics.seg.map50), "mask_map": float(metrics.seg.map)}
+
+
+def compare(variants, teacher=MODEL_PATH, imgsz=STUDENT_IMGSZ, repeat=REPEAT, report_file=REPORT_FILE):
+    samples = [(cv2.imread(p), polygon) for p, polygon in load_labelled(os.path.join(HERE, "val"))]
+    samples = [s for s in samples if s[0] is not None]
+    if not samples:
+        print("No labelled images in val/")
+        return None
+
+    report = {"imgsz": imgsz, "images": len(samples), "models": {}}
+    for role, model_path in (("teacher", teacher), ("student", STUDENT_PATH)):
+        path = os.path.join(HERE, model_path)
+        if not os.path.exists(path):
+            print(f"[{role}] {path} not found - skipped")
+            continue
+        entry = {"path": model_path, "size_mb": os.path.getsize(path) / 2 ** 20,
+                 "accuracy": mask_map(path, imgsz), "backends": {}}
+        for variant in ["torch"] + list(variants):
+            if not os.path.exists(variant_path(variant, path)):
+                print(f"[{role}] no {variant} export - skipped")
+                continue
+            result = evaluate(load_backend(variant, path, imgsz=imgsz), samples * repeat)
+            n = len(samples) * repeat
+            entry["backends"][variant] = {"ms": float(result["ms"]), "p95": float(result["p95"]),
+                                          "found": result["found"] / n, "iou": float(result["iou"]),
+                                          "center_px": float(result["error"])}
+        report["models"][role] = entry
+
+    print(f"\n{'model':8s} {'backend':14s} {'ms':>7s} {'p95':>7s} {'found':>6s} {'IoU':>6s} "
+          f"{'center px':>10s} {'box mAP50':>10s} {'mask mAP50-95':>14s}")
+    for role, entry in report["models"].items():
+        for variant, r in entry["backends"].items():
+            print(f"{role:8s} {variant:14s} {r['ms']:7.2f} {r['p95']:7.2f} {r['found']:6.0%} {r['iou']:6.3f} "
+                  f"{r['center_px']:10.1f} {entry['accuracy']['box_map50']:10.3f} "
+                  f"{entry['accuracy']['mask_map']:14.3f}")
+
+    if len(report["models"]) == 2:
+        teacher, student = report["models"]["teacher"], report["models"]["student"]
+        report["speedup"] = {v: teacher["backends"][v]["ms"] / student["backends"][v]["ms"]
+                             for v in student["backends"] if v in teacher["backends"]}
+        report["mask_map_drop"] = teacher["accuracy"]["mask_map"] - student["accuracy"]["mask_map"]
+        speedups = ", ".join(f"{v} {s:.1f}x" for v, s in report["speedup"].items())
+        print(f"\nstudent vs teacher: {speedups} faster (target {TARGET_SPEEDUP:.0f}x), "
+              f"mask mAP50-95 {-report['mask_map_drop']:+.3f}")
+
+    with open(report_file, "w") as f:
+        json.dump(report, f, indent=1)
+    print(f"Report: {report_file}")
+    return report
+
+
+def main():
+    steps = ["label", "train", "export", "compare"]
+    parser = argparse.ArgumentParser(description="Distil the pupil model into a nano student")
+    parser.add_argument("--steps", nargs="+", default=steps, choices=steps)
+    parser.add_argument("--teacher", default=MODEL_PATH)
+    parser.add_argument("--student", default=STUDENT_BASE, help="Starting weights (or a model yaml)")
+    parser.add_argument("--ground-truth", action="store_true",
+                        help="Prefer human labels over the teacher's where they exist")
+    parser.add_argument("--imgsz", type=int, default=STUDENT_IMGSZ)
+    parser.add_argument("--epochs", type=int, default=EPOCHS)
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--variants", nargs="+", default=VARIANTS)
+    args = parser.parse_args()
+
+    data_yaml = os.path.join(DISTILL_DIR, "data.yaml")
+    if "label" in args.steps:
+        data_yaml = label(os.path.join(HERE, args.teacher), args.ground_truth)
+    if "train" in args.steps:
+        train(data_yaml, args.student, args.imgsz, args.epochs, args.batch)
+    if "export" in args.steps:
+        student = os.path.join(HERE, STUDENT_PATH)
+        # INT8 variants are built from the FP32 ones
+        for variant in sorted(args.variants, key=lambda v: v.endswith("-int8")):
+            base = variant.replace("-int8", "")
+            if variant != base and base not in args.variants:
+                export(student, base, args.imgsz)
+            start = time.perf_counter()
+            path = export(student, variant, args.imgsz)
+            print(f"[{variant}] {path} ({time.perf_counter() - start:.1f}s)")
+    if "compare" in args.steps:
+        compare(args.variants, args.teacher, args.imgsz)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,187 @@
+"""
+Export the pupil YOLO model to the CPU inference variants in pupil_backends.py.
+
+    python export_models.py                          # yolo11m-seg-custom.pt, all variants
+    python export_models.py best.pt --imgsz 320 --variants onnx openvino-int8
+
+FP32 ONNX and OpenVINO IR come from Ultralytics' exporter. The INT8 variants
+are calibrated on train/images, letterboxed exactly like pupil_backends does
+at inference time:
+    onnx-int8      ONNX Runtime static quantization (QDQ, per-channel weights)
+    openvino-int8  NNCF post-training quantization of the OpenVINO IR
+
+Afterwards every variant is timed on val/images and its top box is compared
+with the FP32 ONNX model's (IoU), so a bad quantization shows up right away.
+"""
+
+import argparse
+import glob
+import os
+import shutil
+import time
+
+import cv2
+import numpy as np
+
+from pupil_backends import MODEL_PATH, IMGSZ, VARIANTS, Letterbox, load_backend, variant_path
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CALIBRATION_DIR = os.path.join(HERE, "train", "images")
+VALIDATION_DIR = os.path.join(HERE, "val", "images")
+CALIBRATION_IMAGES = 100
+IMAGE_PATTERNS = ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+
+
+def list_images(directory, limit=None):
+    paths = sorted(p for pattern in IMAGE_PATTERNS for p in glob.glob(os.path.join(directory, pattern)))
+    return paths[:limit] if limit else paths
+
+
+def calibration_tensors(imgsz, directory=CALIBRATION_DIR, limit=CALIBRATION_IMAGES):
+    """Letterboxed (1, 3, imgsz, imgsz) tensors of the calibration images."""
+    letterbox = Letterbox(imgsz)
+    for path in list_images(directory, limit):
+        frame = cv2.imread(path)
+        if frame is not None:
+            yield letterbox(frame).copy()
+
+
+# ----------------------------
+# Exports
+# ----------------------------
+def export_fp32(model_path, fmt, imgsz):
+    """Ultralytics export; returns where it wrote the model."""
+    from ultralytics import YOLO
+    kwargs = {"simplify": True} if fmt == "onnx" else {}
+    return YOLO(model_path).export(format=fmt, imgsz=imgsz, dynamic=False, device="cpu", **kwargs)
+
+
+def quantize_onnx(fp32_path, int8_path, imgsz):
+    from onnxruntime.quantization import (CalibrationDataReader, QuantFormat, QuantType,
+                                          quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+    import onnxruntime as ort
+
+    input_name = ort.InferenceSession(fp32_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.tensors = calibration_tensors(imgsz)
+
+        def get_next(self):
+            tensor = next(self.tensors, None)
+            return None if tensor is None else {input_name: tensor}
+
+    prepared = int8_path + ".prep.onnx"
+    quant_pre_process(fp32_path, prepared)
+    try:
+        quantize_static(prepared, int8_path, Reader(), quant_format=QuantFormat.QDQ,
+                        per_channel=True, weight_type=QuantType.QInt8, activation_type=QuantType.QUInt8)
+    finally:
+        os.remove(prepared)
+    return int8_path
+
+
+def quantize_openvino(fp32_dir, int8_dir, imgsz):
+    import nncf
+    import openvino as ov
+
+    xml = next(os.path.join(fp32_dir, f) for f in sorted(os.listdir(fp32_dir)) if f.endswith(".xml"))
+    model = ov.Core().read_model(xml)
+    tensors = list(calibration_tensors(imgsz))
+    quantized = nncf.quantize(model, nncf.Dataset(tensors), preset=nncf.QuantizationPreset.MIXED,
+                              subset_size=len(tensors))
+
+    os.makedirs(int8_dir, exist_ok=True)
+    ov.save_model(quantized, os.path.join(int8_dir, os.path.basename(xml)))
+    # Keep Ultralytics' metadata next to the IR like the FP32 export
+    metadata = os.path.join(fp32_dir, "metadata.yaml")
+    if os.path.exists(metadata):
+        shutil.copy(metadata, int8_dir)
+    return int8_dir
+
+
+def export(model_path, variant, imgsz):
+    path = variant_path(variant, model_path)
+    if variant == "onnx":
+        written = export_fp32(model_path, "onnx", imgsz)
+    elif variant == "openvino":
+        written = export_fp32(model_path, "openvino", imgsz)
+    elif variant == "onnx-int8":
+        written = quantize_onnx(variant_path("onnx", model_path), path, imgsz)
+    elif variant == "openvino-int8":
+        written = quantize_openvino(variant_path("openvino", model_path), path, imgsz)
+    else:
+        return model_path
+    if os.path.normpath(written) != os.path.normpath(path):
+        shutil.move(written, path)
+    return path
+
+
+# ----------------------------
+# Check
+# ----------------------------
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+def compare(model_path, variants, imgsz, directory=VALIDATION_DIR):
+    frames = [cv2.imread(p) for p in list_images(directory)]
+    frames = [f for f in frames if f is not None]
+    if not frames:
+        print(f"No images in {directory}")
+        return
+
+    reference = None
+    if os.path.exists(variant_path("onnx", model_path)):
+        backend = load_backend("onnx", model_path, imgsz)
+        reference = [backend.detect(f) for f in frames]
+
+    print(f"\n{'variant':14s} {'ms/frame':>9s} {'detected':>9s} {'IoU vs onnx':>12s}")
+    for variant in variants:
+        if not os.path.exists(variant_path(variant, model_path)):
+            continue
+        backend = load_backend(variant, model_path, imgsz)
+        ious = []
+        detected = 0
+        start = time.perf_counter()
+        for i, frame in enumerate(frames):
+            boxes = backend.detect(frame)
+            detected += bool(len(boxes))
+            if reference is not None and len(boxes) and len(reference[i]):
+                ious.append(box_iou(boxes[0], reference[i][0]))
+        ms = (time.perf_counter() - start) / len(frames) * 1000
+        iou = f"{np.mean(ious):.3f}" if ious else "-"
+        print(f"{variant:14s} {ms:9.1f} {detected:5d}/{len(frames):<3d} {iou:>12s}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export CPU inference variants of the pupil model")
+    parser.add_argument("model", nargs="?", default=MODEL_PATH)
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--variants", nargs="+", default=[v for v in VARIANTS if v != "torch"],
+                        choices=list(VARIANTS))
+    parser.add_argument("--skip-export", action="store_true", help="Only time/compare existing files")
+    args = parser.parse_args()
+
+    if not args.skip_export:
+        # INT8 variants are built from the FP32 ones
+        needed = list(args.variants)
+        for variant in args.variants:
+            base = variant.replace("-int8", "")
+            if variant.endswith("-int8") and base not in needed and not os.path.exists(variant_path(base, args.model)):
+                needed.insert(0, base)
+        for variant in sorted(needed, key=lambda v: v.endswith("-int8")):
+            start = time.perf_counter()
+            path = export(args.model, variant, args.imgsz)
+            print(f"[{variant}] {path} ({time.perf_counter() - start:.1f}s)")
+
+    compare(args.model, ["torch"] + args.variants, args.imgsz)
+
+
+if __name__ == "__main__":
+    main()
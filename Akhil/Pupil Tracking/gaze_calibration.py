@@ -0,0 +1,241 @@
+"""
+Pupil -> screen mapping and gaze smoothing for mousecontrol.py.
+
+GazeMapping fits screen = f(pupil) to the calibration points with least
+squares: a second-order polynomial in the pupil x, y (6 terms, needs 6+
+points - the 9-point grid leaves room for noise), or affine with 3-5
+points. The fit is evaluated once over the whole camera frame into a
+lookup table, so mapping a pupil position per frame is a bilinear read
+of four table cells.
+
+GazeKalman is a constant-velocity Kalman filter on the screen point. It
+smooths the noisy per-frame estimates without the lag of an exponential
+filter and, because it carries a velocity, can predict where the gaze is
+*now* from an estimate that is a pipeline latency old.
+
+    mapping = GazeMapping.fit(pupils, targets, (640, 480), (1920, 1080))
+    kalman = GazeKalman()
+    kalman.update(mapping(px, py), t_capture)
+    x, y = kalman.predict(time.monotonic())
+
+    python gaze_calibration.py       # synthetic check: fit error, lookup cost, filter lag
+"""
+
+import json
+import os
+import time
+
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+CALIBRATION_FILE = os.path.join(HERE, "gaze_calibration.json")
+
+# 3 x 3 grid of calibration targets, as fractions of the screen
+GRID_9 = [(x, y) for y in (0.1, 0.5, 0.9) for x in (0.1, 0.5, 0.9)]
+
+LUT_STEP = 4            # Lookup table cell size (camera pixels)
+KALMAN_ACCEL = 4000.0   # Process noise: gaze acceleration std (screen px/s^2)
+KALMAN_NOISE = 25.0     # Measurement noise std (screen px)
+KALMAN_RESET = 0.5      # Restart the filter after a gap this long (s)
+PREDICT_MAX = 0.15      # Never predict further ahead than this (s)
+
+
+# ----------------------------
+# Mapping
+# ----------------------------
+def poly_terms(x, y, degree):
+    """Design matrix rows for pupil positions (already normalized)."""
+    one = np.ones_like(x)
+    if degree == 1:
+        return np.stack([one, x, y], -1)
+    return np.stack([one, x, y, x * y, x * x, y * y], -1)
+
+
+class GazeMapping:
+    """ Least-squares pupil -> screen fit, baked into a bilinear lookup table. """
+
+    def __init__(self, coeffs, center, scale, degree, frame_size, screen_size, pupils=None, targets=None):
+        self.coeffs = coeffs            # (terms, 2)
+        self.center = center            # Pupil normalization
+        self.scale = scale
+        self.degree = degree
+        self.frame_size = frame_size
+        self.screen_size = screen_size
+        self.pupils = pupils
+        self.targets = targets
+
+        # Evaluate the fit on a grid covering the camera frame
+        w, h = frame_size
+        gx = np.arange(0, w + LUT_STEP, LUT_STEP, dtype=np.float64)
+        gy = np.arange(0, h + LUT_STEP, LUT_STEP, dtype=np.float64)
+        px, py = np.meshgrid(gx, gy)
+        self.lut = self.evaluate(np.stack([px, py], -1)).astype(np.float32)   # (rows, cols, 2)
+        self.lut[..., 0].clip(0, screen_size[0] - 1, out=self.lut[..., 0])
+        self.lut[..., 1].clip(0, screen_size[1] - 1, out=self.lut[..., 1])
+        self.rows = self.lut.tolist()
+        self.max_x = self.lut.shape[1] - 1.001
+        self.max_y = self.lut.shape[0] - 1.001
+
+    @classmethod
+    def fit(cls, pupils, targets, frame_size, screen_size):
+        """pupils: (n, 2) camera pixels, targets: (n, 2) screen pixels."""
+        pupils = np.asarray(pupils, dtype=np.float64)
+        targets = np.asarray(targets, dtype=np.float64)
+        if len(pupils) < 3:
+            raise ValueError(f"Need at least 3 calibration points, got {len(pupils)}")
+        degree = 2 if len(pupils) >= 6 else 1
+
+        center = pupils.mean(0)
+        scale = pupils.std(0).clip(1e-6)
+        u = (pupils - center) / scale
+        coeffs, *_ = np.linalg.lstsq(poly_terms(u[:, 0], u[:, 1], degree), targets, rcond=None)
+        return cls(coeffs, center, scale, degree, tuple(frame_size), tuple(screen_size), pupils, targets)
+
+    def evaluate(self, points):
+        """Exact fit at (..., 2) pupil positions (no table)."""
+        u = (points - self.center) / self.scale
+        return poly_terms(u[..., 0], u[..., 1], self.degree) @ self.coeffs
+
+    def __call__(self, x, y):
+        """Screen position of one pupil position, from the table."""
+        fx = min(max(x / LUT_STEP, 0.0), self.max_x)
+        fy = min(max(y / LUT_STEP, 0.0), self.max_y)
+        ix, iy = int(fx), int(fy)
+        ax, ay = fx - ix, fy - iy
+        # Plain floats: numpy's per-call overhead is larger than this arithmetic
+        row, below = self.rows[iy], self.rows[iy + 1]
+        (x00, y00), (x01, y01) = row[ix], row[ix + 1]
+        (x10, y10), (x11, y11) = below[ix], below[ix + 1]
+        top_x, top_y = x00 + ax * (x01 - x00), y00 + ax * (y01 - y00)
+        bottom_x, bottom_y = x10 + ax * (x11 - x10), y10 + ax * (y11 - y10)
+        return top_x + ay * (bottom_x - top_x), top_y + ay * (bottom_y - top_y)
+
+    def residual(self):
+        """RMS distance (screen px) between the fit and the calibration targets."""
+        if self.pupils is None:
+            return float("nan")
+        error = self.evaluate(self.pupils) - self.targets
+        return float(np.sqrt((error ** 2).sum(1).mean()))
+
+    def save(self, path=CALIBRATION_FILE):
+        with open(path, "w") as f:
+            json.dump({"frame": list(self.frame_size), "screen": list(self.screen_size),
+                       "pupils": self.pupils.tolist(), "targets": self.targets.tolist()}, f, indent=1)
+
+    @classmethod
+    def load(cls, path=CALIBRATION_FILE, screen_size=None):
+        """Refit from saved points; None if there is no (usable) file."""
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            data = json.load(f)
+        if screen_size is not None and tuple(data["screen"]) != tuple(screen_size):
+            return None     # Calibrated for another screen
+        return cls.fit(data["pupils"], data["targets"], data["frame"], data["screen"])
+
+
+# ----------------------------
+# Smoothing + prediction
+# ----------------------------
+class GazeKalman:
+    """ Constant-velocity Kalman filter on a screen point.
+
+        Both axes use the same model and noise, so they share one 2x2
+        covariance; the state is [[x, vx], [y, vy]].
+    """
+
+    def __init__(self, accel=KALMAN_ACCEL, noise=KALMAN_NOISE):
+        self.q = accel ** 2
+        self.r = noise ** 2
+        self.state = None
+        self.P = None
+        self.t = None
+
+    def reset(self):
+        self.state = None
+
+    def update(self, point, t):
+        """Fold in a measurement taken at time t (e.g. the frame's capture time)."""
+        z = np.asarray(point, dtype=np.float64)
+        if self.state is None or t - self.t > KALMAN_RESET:
+            self.state = np.stack([z, np.zeros(2)], 1)
+            self.P = np.diag([self.r, self.q * KALMAN_RESET])
+            self.t = t
+            return
+
+        dt = max(t - self.t, 0.0)
+        F = np.array([[1.0, dt], [0.0, 1.0]])
+        Q = self.q * np.array([[dt ** 4 / 4, dt ** 3 / 2], [dt ** 3 / 2, dt ** 2]])
+        self.state = self.state @ F.T
+        P = F @ self.P @ F.T + Q
+
+        # Position is measured: H = [1, 0]
+        gain = P[:, 0] / (P[0, 0] + self.r)
+        self.state += (z - self.state[:, 0])[:, None] * gain[None, :]
+        self.P = P - np.outer(gain, P[0])
+        self.t = t
+
+    def predict(self, t):
+        """Gaze position at time t (ahead of the last measurement by at most PREDICT_MAX)."""
+        if self.state is None:
+            return None
+        ahead = min(max(t - self.t, 0.0), PREDICT_MAX)
+        x, y = self.state[:, 0] + self.state[:, 1] * ahead
+        return float(x), float(y)
+
+
+# ----------------------------
+# Synthetic check
+# ----------------------------
+def main():
+    rng = np.random.default_rng(0)
+    frame, screen = (640, 480), (1920, 1080)
+
+    # A mildly non-linear "eye": screen -> pupil, 1 px detection noise
+    def eye(s):
+        u = s / screen - 0.5
+        return np.stack([320 + 180 * u[..., 0] + 25 * u[..., 0] * u[..., 1],
+                         240 + 110 * u[..., 1] + 20 * u[..., 0] ** 2], -1)
+
+    targets = np.array(GRID_9) * screen
+    pupils = eye(targets) + rng.normal(0, 1.0, targets.shape)
+    mapping = GazeMapping.fit(pupils, targets, frame, screen)
+
+    tests = rng.uniform(0.1, 0.9, (2000, 2)) * screen
+    seen = eye(tests)
+    mapped = np.array([mapping(x, y) for x, y in seen])
+    error = np.sqrt(((mapped - tests) ** 2).sum(1))
+    print(f"9-point quadratic fit: residual {mapping.residual():.1f}px, "
+          f"test error {error.mean():.1f}px mean / {np.percentile(error, 95):.1f}px p95")
+
+    start = time.perf_counter()
+    for x, y in seen:
+        mapping(x, y)
+    lookup = (time.perf_counter() - start) / len(seen)
+    start = time.perf_counter()
+    for p in seen:
+        mapping.evaluate(p)
+    direct = (time.perf_counter() - start) / len(seen)
+    print(f"per-frame mapping: lookup {lookup * 1e6:.1f}us, direct polynomial {direct * 1e6:.1f}us")
+
+    # Gaze sweeping at 800 px/s, measured at 15 Hz with 25 px noise and 80 ms latency
+    rate, latency = 15.0, 0.08
+    times = np.arange(0, 4, 1 / rate)
+    truth = np.stack([200 + 800 * (times % 2), 540 + 0 * times], 1)
+    measured = truth + rng.normal(0, KALMAN_NOISE, truth.shape)
+    kalman = GazeKalman()
+    ema = None
+    k_err, e_err = [], []
+    for t, true, z in zip(times, truth, measured):
+        kalman.update(z, t)
+        ema = z if ema is None else ema + 0.3 * (z - ema)
+        if 0.3 < (t % 2) < 1.7:     # Away from the sweep restarts
+            now_true = true + [800 * latency, 0]
+            k_err.append(np.hypot(*(np.array(kalman.predict(t + latency)) - now_true)))
+            e_err.append(np.hypot(*(ema - now_true)))
+    print(f"gaze error at display time (15 Hz, {latency * 1000:.0f}ms latency): "
+          f"Kalman + prediction {np.mean(k_err):.0f}px, 0.3 exponential filter {np.mean(e_err):.0f}px")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,142 +1,448 @@
+import os
+import sys
+
+# Shared frame source lives in "Tello Drone Control"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Tello Drone Control"))
+
+import math
+import threading
+import time
+from collections import deque, namedtuple
+
 import cv2
 import numpy as np
 import pyautogui
-from ultralytics import YOLO
+
+from frame_source import camera_source
+from gaze_calibration import GRID_9, GazeKalman, GazeMapping
+from pupil_backends import MODELS, load_backend
+from pupil_classical import HybridPupil
+from pupil_tracker import PupilTracker
 
 # ----------------------------
 # SETTINGS
 # ----------------------------
-MODEL_PATH = "yolo11m-seg-custom.pt"   # <-- change if your model is elsewhere
+MODEL = "student" if "--student" in sys.argv else "teacher"   # student: nano model from distill.py
+MODEL_PATH = MODELS[MODEL]   # <-- change in pupil_backends.py if your model is elsewhere
+BACKEND = "openvino-int8"   # torch | onnx | onnx-int8 | openvino | openvino-int8 (export_models.py; torch if not exported)
+IMGSZ = 320
+CONF = 0.4
+HYBRID = True         # Classical threshold + ellipse fit first, YOLO only as fallback / drift check
+REDETECT_EVERY = 15   # Full-frame detection at least every N frames, tracking in between (0 = detect every frame)
 CAMERA_INDEX = 0
 FRAME_W, FRAME_H = 640, 480
 
-# ----------------------------
-# Load YOLO model
-# ----------------------------
-model = YOLO(MODEL_PATH)
+CURSOR_HZ = 60                # Cursor updates per second (display refresh rate)
+CURSOR_MODE = "kalman"        # kalman: Kalman-smoothed, predicted ahead by the pipeline latency
+                              # extrapolate: constant velocity from the last two estimates
+                              # interpolate: glide between them, one estimate behind
+EXTRAPOLATE_MAX = 0.1         # Never predict further than this past the newest estimate (s)
+SMOOTH_TIME = 0.1             # extrapolate/interpolate smoothing time constant (s), 0 = off
+GAZE_QUEUE = 8                # Pupil estimates buffered between inference and cursor
+CALIBRATION_WINDOW = 0.25     # Pupil estimates of the last N seconds are averaged per point
+HEADLESS = "--headless" in sys.argv   # No preview window; calibration keys from the terminal
 
-# ----------------------------
-# Calibration storage
-# ----------------------------
-calibration = {
-    "center": None,
-    "left": None,
-    "right": None,
-    "up": None,
-    "down": None
-}
-
-calibrated = False
+pyautogui.PAUSE = 0   # moveTo otherwise sleeps 0.1 s after every call
 
 # ----------------------------
-# Camera
+# Load YOLO model (selected backend, warmed up)
 # ----------------------------
-cap = cv2.VideoCapture(CAMERA_INDEX)
-cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_W)
-cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_H)
-
-screen_w, screen_h = pyautogui.size()
-
-print("\nCALIBRATION:")
-print("Look CENTER press 1")
-print("Look LEFT   press 2")
-print("Look RIGHT  press 3")
-print("Look UP     press 4")
-print("Look DOWN   press 5")
-print("Press Q to quit\n")
-
-prev_x, prev_y = 0, 0
+try:
+    detector = load_backend(BACKEND, MODEL_PATH, imgsz=IMGSZ, conf=CONF)
+except FileNotFoundError as e:
+    # Exports are optional: run the .pt model until export_models.py has been run
+    print(f"Warning: {e}\nFalling back to the torch backend")
+    BACKEND = "torch"
+    detector = load_backend(BACKEND, MODEL_PATH, imgsz=IMGSZ, conf=CONF)
+if HYBRID:
+    detector = HybridPupil(detector)
+tracker = PupilTracker(detector, redetect_every=REDETECT_EVERY)
+print(f"Pupil detector: {'classical + ' if HYBRID else ''}{MODEL_PATH} ({BACKEND}), full detection every {REDETECT_EVERY} frames")
 
 # ----------------------------
-# Main loop
+# Calibration (9 points, saved to gaze_calibration.json)
 # ----------------------------
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
-
-    frame = cv2.resize(frame, (FRAME_W, FRAME_H))
-
-    # Run YOLO prediction
-    results = model.predict(frame, device="cpu", imgsz=320, conf=0.4, verbose=False)
-
-    pupil = None
-
-    # If detection exists
-    if results[0].boxes and len(results[0].boxes) > 0:
-        box = results[0].boxes[0]  # take first detected object
-
-        x1, y1, x2, y2 = map(int, box.xyxy[0])
-
-        # Centroid
-        cx = (x1 + x2) // 2
-        cy = (y1 + y2) // 2
-        pupil = (cx, cy)
-
-        # Draw box + center
-        cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-        cv2.circle(frame, (cx, cy), 5, (0, 0, 255), -1)
-
-    # UI text
-    cv2.putText(frame, "1:C 2:L 3:R 4:U 5:D  Q:QUIT",
-                (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
-
-    cv2.imshow("YOLO Eye Control", frame)
+screen_w, screen_h = pyautogui.size()
 
-    key = cv2.waitKey(1) & 0xFF
+mapping = GazeMapping.load(screen_size=(screen_w, screen_h))
+if mapping is not None:
+    print(f"Loaded calibration ({len(mapping.pupils)} points, residual {mapping.residual():.0f}px)")
 
-    # ---- Calibration keys ----
-    if key == ord('1') and pupil:
-        calibration["center"] = pupil
-        print("Center:", pupil)
 
-    elif key == ord('2') and pupil:
-        calibration["left"] = pupil
-        print("Left:", pupil)
+class Calibration:
+    """ The cursor is parked on each target in turn; the median pupil position
+        of the last CALIBRATION_WINDOW seconds is recorded for it.
+    """
 
-    elif key == ord('3') and pupil:
-        calibration["right"] = pupil
-        print("Right:", pupil)
+    def __init__(self, points=GRID_9):
+        self.targets = [(x * (screen_w - 1), y * (screen_h - 1)) for x, y in points]
+        self.pupils = []
 
-    elif key == ord('4') and pupil:
-        calibration["up"] = pupil
-        print("Up:", pupil)
+    @property
+    def target(self):
+        return self.targets[len(self.pupils)] if not self.done else None
 
-    elif key == ord('5') and pupil:
-        calibration["down"] = pupil
-        print("Down:", pupil)
+    @property
+    def done(self):
+        return len(self.pupils) == len(self.targets)
 
-    elif key == ord('q'):
-        break
+    def record(self, gaze):
+        samples = gaze.since(time.monotonic() - CALIBRATION_WINDOW)
+        if not samples:
+            print("No pupil - look at the cursor and try again")
+            return
+        pupil = np.median([(s.x, s.y) for s in samples], 0)
+        self.pupils.append(pupil)
+        print(f"Point {len(self.pupils)}/{len(self.targets)}: pupil ({pupil[0]:.1f}, {pupil[1]:.1f})")
 
-    # ---- Enable tracking after calibration ----
-    if all(calibration.values()):
-        calibrated = True
+    def finish(self):
+        fitted = GazeMapping.fit(self.pupils, self.targets, (FRAME_W, FRAME_H), (screen_w, screen_h))
+        fitted.save()
+        print(f"Calibrated: residual {fitted.residual():.0f}px, saved")
+        return fitted
 
-    # ---- Mouse control using YOLO position ----
-    if calibrated and pupil:
-        lx, rx = calibration["left"][0], calibration["right"][0]
-        uy, dy = calibration["up"][1], calibration["down"][1]
+# ----------------------------
+# Camera (capture stage)
+# ----------------------------
+cap = cv2.VideoCapture(CAMERA_INDEX)
+cap.set(cv2.CAP_PROP_FRAME_WIDTH, FRAME_W)
+cap.set(cv2.CAP_PROP_FRAME_HEIGHT, FRAME_H)
+source = camera_source(cap).start()  # Newest frame only, no buffered backlog
 
-        # Clamp inside calibration region
-        x = np.clip(pupil[0], lx, rx)
-        y = np.clip(pupil[1], uy, dy)
+# ----------------------------
+# Gaze queue (inference -> cursor)
+# ----------------------------
+# t: capture time, arrived: when inference finished, x/y: pupil in frame pixels
+GazeSample = namedtuple("GazeSample", "t arrived x y")
+
+
+class GazeQueue:
+    """ The newest GAZE_QUEUE pupil estimates, shared with the cursor thread.
+
+        Bounded: if the cursor stalls the oldest unread estimates are dropped
+        (counted as overflowed). depth is how many estimates arrived between
+        two cursor reads.
+    """
+
+    def __init__(self, size=GAZE_QUEUE):
+        self.samples = deque(maxlen=size)
+        self.lock = threading.Lock()
+        self.unread = 0
+        self.pushed = 0
+        self.overflowed = 0
+        self.reads = 0
+        self.depth_total = 0
+        self.depth_max = 0
+
+    def push(self, t, pupil):
+        with self.lock:
+            if self.unread == self.samples.maxlen:
+                self.overflowed += 1
+            else:
+                self.unread += 1
+            self.samples.append(GazeSample(t, time.monotonic(), pupil[0], pupil[1]))
+            self.pushed += 1
+
+    def since(self, t):
+        """Samples that arrived after time t."""
+        with self.lock:
+            return [s for s in self.samples if s.arrived >= t]
+
+    def latest(self, n=2):
+        """The newest n samples, oldest first."""
+        with self.lock:
+            self.reads += 1
+            self.depth_total += self.unread
+            self.depth_max = max(self.depth_max, self.unread)
+            self.unread = 0
+            return list(self.samples)[-n:]
+
+    def describe(self):
+        mean = self.depth_total / self.reads if self.reads else 0.0
+        return (f"gaze queue: {self.pushed} estimates, depth {mean:.2f} mean / {self.depth_max} max "
+                f"of {self.samples.maxlen}, {self.overflowed} overflowed")
 
-        # Normalize to screen size
-        mouse_x = int((x - lx) / (rx - lx) * screen_w)
-        mouse_y = int((y - uy) / (dy - uy) * screen_h)
+# ----------------------------
+# Inference stage
+# ----------------------------
+# pupil: (x, y) frame pixels or None, box: [x1, y1, x2, y2] or None, mode: "detect" / "track",
+# t/seq: capture time/number of the frame, view: resized frame for the preview,
+# wait: seconds the frame waited for inference, infer: seconds in the detector/tracker
+PupilResult = namedtuple("PupilResult", "pupil box mode t seq view wait infer")
+
+
+class PupilStage:
+    """ Inference thread: newest frame -> pupil (detect or track) -> gaze queue. """
+
+    def __init__(self, source, tracker, gaze):
+        self.source = source
+        self.tracker = tracker
+        self.gaze = gaze
+        self.result = None
+        self.processed = 0
+        self.wait_total = 0.0
+        self.infer_total = 0.0
+        self.infer_time = 0.0     # Smoothed, for the preview
+        self.active = False
+        self.thread = None
+
+    def process(self, frame):
+        start = time.monotonic()
+        image = cv2.resize(frame.image, (FRAME_W, FRAME_H))
+        self.tracker.stages.add("resize", time.monotonic() - start)
+        found = self.tracker.update(image)
+        infer = time.monotonic() - start
+
+        pupil = box = mode = None
+        if found is not None:
+            x1, y1, x2, y2 = found.box
+            pupil = ((x1 + x2) / 2, (y1 + y2) / 2)
+            box = tuple(int(v) for v in found.box)
+            mode = found.mode
+            self.gaze.push(frame.t, pupil)
+
+        self.processed += 1
+        self.wait_total += start - frame.t
+        self.infer_total += infer
+        self.infer_time += 0.1 * (infer - self.infer_time)
+        self.result = PupilResult(pupil, box, mode, frame.t, frame.seq, image, start - frame.t, infer)
+
+    def run(self):
+        while self.active:
+            frame = self.source.wait_next(timeout=0.5)
+            if frame is None:
+                if self.source.ended:
+                    break
+                continue
+            self.process(frame)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def describe(self):
+        n = max(self.processed, 1)
+        return (f"inference: {self.processed} frames, waited {self.wait_total / n * 1000:.1f}ms, "
+                f"infer {self.infer_total / n * 1000:.1f}ms | {self.tracker.describe()}")
 
-        # Smooth movement
-        smooth = 0.3
-        mouse_x = int(prev_x + smooth * (mouse_x - prev_x))
-        mouse_y = int(prev_y + smooth * (mouse_y - prev_y))
+# ----------------------------
+# Cursor stage
+# ----------------------------
+def estimate(samples, now, mode=CURSOR_MODE):
+    """Pupil position to show at `now` from the newest estimates (oldest first)."""
+    if not samples:
+        return None
+    last = samples[-1]
+    if len(samples) < 2:
+        return last.x, last.y
+    prev = samples[-2]
+
+    if mode == "interpolate":
+        # Glide from the previous estimate to the newest over one arrival interval
+        interval = last.arrived - prev.arrived
+        s = min(1.0, (now - last.arrived) / interval) if interval > 0 else 1.0
+        return prev.x + s * (last.x - prev.x), prev.y + s * (last.y - prev.y)
+
+    # Constant velocity from capture times, carried over the pipeline latency
+    dt = last.t - prev.t
+    if dt <= 0:
+        return last.x, last.y
+    ahead = min(now - last.t, EXTRAPOLATE_MAX)
+    return last.x + (last.x - prev.x) / dt * ahead, last.y + (last.y - prev.y) / dt * ahead
+
+
+class CursorStage:
+    """ Moves the cursor at CURSOR_HZ on a fixed schedule, between pupil estimates.
+
+        `hold` parks the cursor on a point instead (calibration targets).
+    """
+
+    def __init__(self, gaze, mapping, hz=CURSOR_HZ):
+        self.gaze = gaze
+        self.mapping = mapping
+        self.hold = None
+        self.kalman = GazeKalman()
+        self.kalman_t = None      # Capture time of the last estimate given to the filter
+        self.period = 1.0 / hz
+        self.position = None      # Smoothed screen position
+        self.moved_to = None
+        self.ticks = 0
+        self.moves = 0
+        self.overruns = 0
+        self.latency_total = 0.0  # Capture of the newest estimate -> moveTo
+        self.move_total = 0.0
+        self.started = 0.0
+        self.active = False
+        self.thread = None
+
+    def step(self, now):
+        self.ticks += 1
+        if self.hold is not None:
+            self.gaze.latest()      # Keep the queue drained
+            self.move((int(self.hold[0]), int(self.hold[1])))
+            return
+        mapping = self.mapping
+        if mapping is None:
+            return
+
+        if CURSOR_MODE == "kalman":
+            samples = self.gaze.latest(GAZE_QUEUE)
+            for s in samples:
+                if self.kalman_t is None or s.t > self.kalman_t:
+                    self.kalman.update(mapping(s.x, s.y), s.t)
+                    self.kalman_t = s.t
+            # Predicted from the newest capture time to now: ahead by the pipeline latency
+            self.position = self.kalman.predict(now)
+        else:
+            samples = self.gaze.latest()
+            pupil = estimate(samples, now)
+            if pupil is None:
+                return
+            target = mapping(*pupil)
+            if self.position is None or SMOOTH_TIME <= 0:
+                self.position = target
+            else:
+                alpha = 1 - math.exp(-self.period / SMOOTH_TIME)
+                self.position = (self.position[0] + alpha * (target[0] - self.position[0]),
+                                 self.position[1] + alpha * (target[1] - self.position[1]))
+        if self.position is None or not samples:
+            return
+
+        if self.move((int(self.position[0]), int(self.position[1]))):
+            self.latency_total += now - samples[-1].t
+
+    def move(self, point):
+        if point == self.moved_to:
+            return False
+        start = time.monotonic()
+        pyautogui.moveTo(*point)
+        self.move_total += time.monotonic() - start
+        self.moved_to = point
+        self.moves += 1
+        return True
+
+    def run(self):
+        self.started = time.monotonic()
+        deadline = self.started
+        while self.active:
+            self.step(time.monotonic())
+            deadline += self.period
+            now = time.monotonic()
+            if now > deadline:
+                self.overruns += 1
+                deadline = now
+            time.sleep(deadline - now)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
+
+    def describe(self):
+        elapsed = max(time.monotonic() - self.started, 1e-9)
+        moves = max(self.moves, 1)
+        return (f"cursor: {self.ticks / elapsed:.1f}Hz ({CURSOR_MODE}), {self.moves} moves, "
+                f"{self.overruns} overruns, latency {self.latency_total / moves * 1000:.1f}ms, "
+                f"moveTo {self.move_total / moves * 1000:.2f}ms")
 
-        pyautogui.moveTo(mouse_x, mouse_y)
+# ----------------------------
+# Main loop (preview + calibration keys)
+# ----------------------------
+print("\nCALIBRATION:")
+print("Press C, then look at the cursor and press SPACE on each of the 9 points")
+print("Press Q to quit\n")
 
-        prev_x, prev_y = mouse_x, mouse_y
+gaze = GazeQueue()
+stage = PupilStage(source, tracker, gaze).start()
+cursor = CursorStage(gaze, mapping).start()
+calibrating = None
+
+
+def calibration_key(key):
+    """C starts a calibration, SPACE records the current point."""
+    global calibrating
+    if key == "c":
+        calibrating = Calibration()
+        cursor.hold = calibrating.target
+    elif key == " " and calibrating is not None:
+        calibrating.record(gaze)
+        if calibrating.done:
+            cursor.mapping = calibrating.finish()
+            cursor.kalman.reset()
+            calibrating = None
+        cursor.hold = calibrating.target if calibrating is not None else None
+
+
+if HEADLESS:
+    print("Headless: C + Enter to calibrate, then Enter on each point; Q + Enter to quit")
+    for line in sys.stdin:
+        key = line.strip().lower()[:1] or " "
+        if key == "q" or source.ended:
+            break
+        calibration_key(key)
+else:
+    shown = 0
+    while True:
+        result = stage.result
+        if result is not None and result.seq != shown:
+            shown = result.seq
+            t0 = time.perf_counter()
+            frame = result.view
+
+            # If detection exists
+            if result.pupil is not None:
+                x1, y1, x2, y2 = result.box
+                cx, cy = int(result.pupil[0]), int(result.pupil[1])
+
+                # Draw box + center
+                color = (0, 255, 0) if result.mode == "detect" else (255, 255, 0)
+                cv2.rectangle(frame, (x1, y1), (x2, y2), color, 2)
+                cv2.circle(frame, (cx, cy), 5, (0, 0, 255), -1)
+
+            # UI text
+            if calibrating is not None:
+                text = f"Look at the cursor, SPACE ({len(calibrating.pupils) + 1}/{len(calibrating.targets)})"
+            else:
+                text = "C:CALIBRATE  Q:QUIT" + ("" if cursor.mapping else "  (not calibrated)")
+            cv2.putText(frame, text,
+                        (10, 30), cv2.FONT_HERSHEY_SIMPLEX, 0.7, (255,255,255), 2)
+            cv2.putText(frame, f"Infer {stage.infer_time * 1000:.1f}ms  Wait {result.wait * 1000:.0f}ms  "
+                        f"Dropped {source.dropped}", (10, 60), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 1)
+
+            cv2.imshow("YOLO Eye Control", frame)
+            tracker.stages.add("ui", time.perf_counter() - t0)
+
+        key = cv2.waitKey(5) & 0xFF
+
+        if key == ord('q') or source.ended:
+            break
+
+        # ---- Calibration keys ----
+        if key != 0xFF:
+            calibration_key(chr(key).lower())
 
 # ----------------------------
 # Cleanup
 # ----------------------------
-cap.release()
+cursor.stop()
+stage.stop()
+source.stop()  # releases the camera
+print(source.describe())
+print(stage.describe())
+print(gaze.describe())
+print(cursor.describe())
+print(detector.describe())
 cv2.destroyAllWindows()
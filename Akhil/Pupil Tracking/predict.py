@@ -1,5 +1,305 @@
-from ultralytics import YOLO 
-  
-model =YOLO("yolo11m-seg-custom.pt")
+"""
+Offline pupil predictions over recorded eye-camera sessions.
 
-model.predict(source="2.jpg",show=True,save=True,conf=0.7,line_width=2,save_crop=True,save_txt=True,show_labels=True,show_conf=True,classes=[0,1])
\ No newline at end of file
+    python predict.py session.mp4                          # -> session.jsonl
+    python predict.py recordings/ --out pupils.csv --workers 4
+    python predict.py session.mp4 --save annotated/ --crops
+    python predict.py 2.jpg --show                         # one image, in a window
+
+A reader thread decodes the frames (every frame of a video, every image of
+a directory - nothing is dropped) into batches; a pool of worker processes,
+one per core by default, each with its own model and a single inference
+thread, runs the batches. Results are written in frame order as they come
+back, one row per frame:
+
+    .jsonl  {"frame", "source", "t", "pupils": [{"box", "conf", "centroid"}]}
+    .csv    frame, source, t, conf, x1, y1, x2, y2, cx, cy   (best pupil only)
+
+`centroid` is the centre of mass of the pupil mask in frame pixels. Images
+are only written with --save (annotated frames) / --crops (pupil crops).
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import queue
+import sys
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import cv2
+import numpy as np
+
+from pupil_backends import MODELS
+
+CONF = 0.7
+IMGSZ = 640
+BATCH = 8
+INFLIGHT = 2            # Batches queued per worker
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# ----------------------------
+# Reader
+# ----------------------------
+def read_frames(source):
+    """(source name, t, frame) for every frame of a video or every image of a directory."""
+    if os.path.isdir(source):
+        for name in sorted(os.listdir(source)):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                frame = cv2.imread(os.path.join(source, name))
+                if frame is not None:
+                    yield name, None, frame
+        return
+    if source.lower().endswith(IMAGE_EXTENSIONS):
+        frame = cv2.imread(source)
+        if frame is None:
+            raise FileNotFoundError(f"Can't read {source}")
+        yield os.path.basename(source), None, frame
+        return
+
+    cap = cv2.VideoCapture(source)
+    if not cap.isOpened():
+        raise FileNotFoundError(f"Can't open {source}")
+    name = os.path.basename(source)
+    try:
+        while True:
+            ok, frame = cap.read()
+            if not ok:
+                break
+            yield name, cap.get(cv2.CAP_PROP_POS_MSEC) / 1000, frame
+    finally:
+        cap.release()
+
+
+class BatchReader:
+    """ Decodes frames on a thread into a bounded queue of batches.
+
+        A batch is [(frame index, source name, t, frame)]; None marks the end.
+    """
+
+    def __init__(self, source, batch=BATCH, depth=4):
+        self.source = source
+        self.batch = batch
+        self.batches = queue.Queue(maxsize=depth)
+        self.frames = 0
+        self.decode_time = 0.0
+        self.error = None
+        self.thread = threading.Thread(target=self.run, name="batch-reader", daemon=True)
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def run(self):
+        batch = []
+        try:
+            frames = read_frames(self.source)
+            while True:
+                start = time.perf_counter()
+                item = next(frames, None)
+                self.decode_time += time.perf_counter() - start
+                if item is None:
+                    break
+                batch.append((self.frames, *item))
+                self.frames += 1
+                if len(batch) == self.batch:
+                    self.batches.put(batch)
+                    batch = []
+            if batch:
+                self.batches.put(batch)
+        except Exception as e:     # Surface in the main thread
+            self.error = e
+        finally:
+            self.batches.put(None)
+
+    def __iter__(self):
+        while True:
+            batch = self.batches.get()
+            if batch is None:
+                if self.error is not None:
+                    raise self.error
+                return
+            yield batch
+
+
+# ----------------------------
+# Workers (one model per process)
+# ----------------------------
+worker = {}
+
+
+def init_worker(model_path, imgsz, conf, save_dir, crops):
+    # One inference thread per process: the pool provides the parallelism
+    import torch
+    torch.set_num_threads(1)
+    cv2.setNumThreads(1)
+    from ultralytics import YOLO
+    worker.update(model=YOLO(model_path), imgsz=imgsz, conf=conf, save_dir=save_dir, crops=crops)
+
+
+def check_in(barrier):
+    """Warm-up task: blocks until every worker holds one, so each has run init_worker."""
+    barrier.wait()
+    return os.getpid()
+
+
+def mask_centroid(polygon):
+    """Centre of mass of a mask polygon (frame pixels), or None."""
+    if len(polygon) < 3:
+        return None
+    m = cv2.moments(polygon.astype(np.float32))
+    if m["m00"] == 0:
+        return None
+    return [round(m["m10"] / m["m00"], 1), round(m["m01"] / m["m00"], 1)]
+
+
+def predict_batch(batch):
+    """[(index, source, t, frame)] -> [(index, source, t, pupils)], best pupil first."""
+    results = worker["model"].predict([frame for _, _, _, frame in batch], imgsz=worker["imgsz"],
+                                      conf=worker["conf"], device="cpu", verbose=False)
+    rows = []
+    for (index, source, t, frame), result in zip(batch, results):
+        pupils = []
+        polygons = result.masks.xy if result.masks is not None else []
+        for i in np.argsort(-result.boxes.conf.numpy()):
+            box = result.boxes.xyxy[i].tolist()
+            pupils.append({"box": [round(v, 1) for v in box],
+                           "conf": round(float(result.boxes.conf[i]), 4),
+                           "centroid": mask_centroid(polygons[i]) if len(polygons) else None})
+
+        if worker["save_dir"]:
+            stem = f"{os.path.splitext(source)[0]}_{index:06d}"
+            cv2.imwrite(os.path.join(worker["save_dir"], stem + ".jpg"), result.plot(line_width=2))
+            if worker["crops"]:
+                for k, pupil in enumerate(pupils):
+                    x1, y1, x2, y2 = (int(round(v)) for v in pupil["box"])
+                    crop = frame[max(y1, 0):y2, max(x1, 0):x2]
+                    if crop.size:
+                        cv2.imwrite(os.path.join(worker["save_dir"], "crops", f"{stem}_{k}.jpg"), crop)
+        rows.append((index, source, t, pupils))
+    return rows
+
+
+# ----------------------------
+# Output
+# ----------------------------
+class JsonLinesWriter:
+    def __init__(self, path):
+        self.file = open(path, "w")
+
+    def write(self, index, source, t, pupils):
+        self.file.write(json.dumps({"frame": index, "source": source, "t": t, "pupils": pupils}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+class CsvWriter:
+    """ One row per frame, best pupil only (empty columns when none). """
+
+    def __init__(self, path):
+        self.file = open(path, "w", newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(["frame", "source", "t", "conf", "x1", "y1", "x2", "y2", "cx", "cy"])
+
+    def write(self, index, source, t, pupils):
+        row = [index, source, "" if t is None else f"{t:.3f}"]
+        if pupils:
+            best = pupils[0]
+            row += [best["conf"], *best["box"], *(best["centroid"] or ["", ""])]
+        self.writer.writerow(row)
+
+    def close(self):
+        self.file.close()
+
+
+# ----------------------------
+# Batch run
+# ----------------------------
+def run(source, out, model_path, workers, batch=BATCH, imgsz=IMGSZ, conf=CONF, save_dir=None, crops=False):
+    if save_dir:
+        os.makedirs(os.path.join(save_dir, "crops") if crops else save_dir, exist_ok=True)
+    writer = CsvWriter(out) if out.lower().endswith(".csv") else JsonLinesWriter(out)
+
+    start = time.perf_counter()
+    pool = ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                               initargs=(model_path, imgsz, conf, save_dir, crops))
+    # Warm every worker up (model load) before the clock starts: one check-in
+    # per worker, none of which returns until all `workers` are running
+    with multiprocessing.Manager() as manager:
+        barrier = manager.Barrier(workers)
+        list(pool.map(check_in, [barrier] * workers))
+    loaded = time.perf_counter() - start
+
+    reader = BatchReader(source, batch).start()
+    pending = deque()
+    frames = detected = 0
+    start = time.perf_counter()
+    try:
+        for frame_batch in reader:
+            pending.append(pool.submit(predict_batch, frame_batch))
+            # Results in frame order; at most INFLIGHT batches per worker in flight
+            while pending and (len(pending) >= workers * INFLIGHT or pending[0].done()):
+                for row in pending.popleft().result():
+                    writer.write(*row)
+                    frames += 1
+                    detected += bool(row[3])
+        while pending:
+            for row in pending.popleft().result():
+                writer.write(*row)
+                frames += 1
+                detected += bool(row[3])
+    finally:
+        writer.close()
+        pool.shutdown(cancel_futures=True)
+    elapsed = time.perf_counter() - start
+
+    fps = frames / elapsed if elapsed else 0.0
+    print(f"{frames} frames in {elapsed:.1f}s: {fps:.1f} fps with {workers} workers "
+          f"({fps / workers:.1f} fps/worker), pupil in {detected}/{frames} | "
+          f"decode {reader.decode_time / max(reader.frames, 1) * 1000:.1f}ms/frame, "
+          f"model load {loaded:.1f}s -> {out}")
+    return fps
+
+
+def show(source, model_path, conf=CONF):
+    """The original single-image preview: annotated window, crops and labels saved."""
+    from ultralytics import YOLO
+    model = YOLO(model_path)
+    model.predict(source=source, show=True, save=True, conf=conf, line_width=2, save_crop=True, save_txt=True,
+                  show_labels=True, show_conf=True, classes=[0, 1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch pupil predictions over a video or image directory")
+    parser.add_argument("source", nargs="?", default="2.jpg", help="Video file, image directory or image")
+    parser.add_argument("--out", help="Results file, .jsonl or .csv (default: <source>.jsonl)")
+    parser.add_argument("--model", help=f"Default {MODELS['teacher']} ({MODELS['student']} with --student)")
+    parser.add_argument("--student", action="store_true", help="Use the distilled nano model (distill.py)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch", type=int, default=BATCH)
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--conf", type=float, default=CONF)
+    parser.add_argument("--save", metavar="DIR", help="Write annotated frames here")
+    parser.add_argument("--crops", action="store_true", help="With --save: also write pupil crops")
+    parser.add_argument("--show", action="store_true", help="Preview one image interactively")
+    args = parser.parse_args()
+
+    model_path = args.model or MODELS["student" if args.student else "teacher"]
+    if args.show:
+        show(args.source, model_path, args.conf)
+        return
+    if not os.path.exists(args.source):
+        sys.exit(f"{args.source} not found")
+    out = args.out or os.path.splitext(os.path.normpath(args.source))[0] + ".jsonl"
+    run(args.source, out, model_path, max(args.workers, 1), args.batch, args.imgsz, args.conf,
+        args.save, args.crops)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,325 @@
+"""
+Decode-once dataset store for train.py.
+
+Every epoch Ultralytics re-reads and re-decodes each JPEG in train/images
+(and re-parses nothing else - labels are already cached). This script does
+the decode + resize once per split and writes
+
+    cache/<split>/images.npy    (N, imgsz, imgsz, 3) uint8, memory-mapped
+    cache/<split>/segments.npy  (points, 2) float32, every polygon back to back
+    cache/<split>/index.json    file names, mtimes, sizes, objects -> segments
+
+Training then reads an image as a slice of the memory-mapped array (the OS
+page cache keeps it hot), while mosaic/HSV/flip augmentation still runs in
+the DataLoader worker processes. The store is rebuilt only when the images,
+labels or imgsz change.
+
+    python prepare_dataset.py                    # build / check the store, time reads
+    python prepare_dataset.py --imgsz 640 --force
+
+train.py calls prepare() itself, trains through CachedSegmentationTrainer
+and prints data-loading vs compute time per epoch (EpochTimer).
+"""
+
+import argparse
+import json
+import math
+import os
+import time
+
+import cv2
+import numpy as np
+import yaml
+from ultralytics.data.dataset import YOLODataset
+from ultralytics.models.yolo.segment import SegmentationTrainer
+from ultralytics.utils import colorstr
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA_YAML = os.path.join(HERE, "custom_dataset.yaml")
+STORE_DIR = os.path.join(HERE, "cache")
+IMGSZ = 640
+SPLITS = ("train", "val")
+PAD_VALUE = 114
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+
+
+# ----------------------------
+# Paths
+# ----------------------------
+def dataset_dirs(data_yaml=DATA_YAML):
+    """{split: images directory}, resolved relative to the yaml file (or its `path:`)."""
+    with open(data_yaml) as f:
+        data = yaml.safe_load(f)
+    root = os.path.join(os.path.dirname(os.path.abspath(data_yaml)), data.get("path") or "")
+    return {split: os.path.normpath(os.path.join(root, data[split])) for split in SPLITS if data.get(split)}
+
+
+def labels_dir(images_dir):
+    """Ultralytics convention: .../images -> .../labels."""
+    head, tail = os.path.split(images_dir)
+    return os.path.join(head, "labels" if tail == "images" else tail)
+
+
+def store_dir(images_dir):
+    """cache/<split> for .../<split>/images (or .../<split>)."""
+    head, tail = os.path.split(os.path.normpath(images_dir))
+    return os.path.join(STORE_DIR, os.path.basename(head) if tail == "images" else tail)
+
+
+# ----------------------------
+# Build
+# ----------------------------
+def read_label(path):
+    """YOLO segmentation label -> [(class, (k, 2) normalized points)]."""
+    objects = []
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                values = line.split()
+                if len(values) >= 7:
+                    objects.append((int(values[0]), np.array(values[1:], dtype=np.float32).reshape(-1, 2)))
+    return objects
+
+
+def source_state(images_dir):
+    """Image/label names and mtimes, to tell whether a store is stale."""
+    names = sorted(n for n in os.listdir(images_dir) if n.lower().endswith(IMAGE_EXTENSIONS))
+    labels = labels_dir(images_dir)
+    state = []
+    for name in names:
+        label = os.path.join(labels, os.path.splitext(name)[0] + ".txt")
+        state.append([name, os.path.getmtime(os.path.join(images_dir, name)),
+                      os.path.getmtime(label) if os.path.exists(label) else 0.0])
+    return state
+
+
+def load_index(directory):
+    path = os.path.join(directory, "index.json")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return json.load(f)
+
+
+def build_store(images_dir, imgsz=IMGSZ, force=False):
+    """Decode + resize every image of one split into its store. Returns the index."""
+    directory = store_dir(images_dir)
+    state = source_state(images_dir)
+    index = load_index(directory)
+    if not force and index is not None and index["imgsz"] == imgsz and index["state"] == state:
+        return index
+
+    start = time.perf_counter()
+    os.makedirs(directory, exist_ok=True)
+    images = np.lib.format.open_memmap(os.path.join(directory, "images.npy"), mode="w+",
+                                       dtype=np.uint8, shape=(len(state), imgsz, imgsz, 3))
+    entries, segments, points = [], [], 0
+    for i, (name, _, _) in enumerate(state):
+        im = cv2.imread(os.path.join(images_dir, name), cv2.IMREAD_COLOR)
+        if im is None:
+            raise FileNotFoundError(f"Can't read {os.path.join(images_dir, name)}")
+        # Same resize as Ultralytics' load_image: long side to imgsz, aspect kept
+        h0, w0 = im.shape[:2]
+        r = imgsz / max(h0, w0)
+        if r != 1:
+            w, h = min(math.ceil(w0 * r), imgsz), min(math.ceil(h0 * r), imgsz)
+            im = cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        h, w = im.shape[:2]
+        images[i, :h, :w] = im
+        images[i, h:] = PAD_VALUE
+        images[i, :h, w:] = PAD_VALUE
+
+        objects = []
+        label = os.path.join(labels_dir(images_dir), os.path.splitext(name)[0] + ".txt")
+        for cls, polygon in read_label(label):
+            objects.append([cls, points, points + len(polygon)])
+            segments.append(polygon)
+            points += len(polygon)
+        entries.append({"name": name, "shape": [h0, w0], "resized": [h, w], "objects": objects})
+    images.flush()
+    del images
+
+    np.save(os.path.join(directory, "segments.npy"),
+            np.concatenate(segments) if segments else np.empty((0, 2), dtype=np.float32))
+    index = {"imgsz": imgsz, "images_dir": os.path.relpath(images_dir, HERE), "state": state, "entries": entries}
+    with open(os.path.join(directory, "index.json"), "w") as f:
+        json.dump(index, f)
+    print(f"[{os.path.basename(directory)}] {len(entries)} images -> {directory} "
+          f"({time.perf_counter() - start:.1f}s)")
+    return index
+
+
+def prepare(data_yaml=DATA_YAML, imgsz=IMGSZ, force=False):
+    """Make sure every split's store is current; returns {split: index}."""
+    return {split: build_store(images, imgsz, force) for split, images in dataset_dirs(data_yaml).items()}
+
+
+# ----------------------------
+# Training from the store
+# ----------------------------
+class CachedDataset(YOLODataset):
+    """ YOLODataset whose images and labels come from a prepared store.
+
+        The memory map is opened lazily in each process (DataLoader workers
+        included) and left out of pickling, so spawned workers don't copy
+        the whole array.
+    """
+
+    def __init__(self, *args, store, **kwargs):
+        self.store = store
+        self.index = load_index(store)
+        self.rows = {e["name"]: row for row, e in enumerate(self.index["entries"])}
+        self.images = None
+        super().__init__(*args, **kwargs)
+        # Every image is equally cheap now: let mosaic draw from all of them
+        self.buffer = list(range(self.ni))
+        self.max_buffer_length = self.ni
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["images"] = None
+        return state
+
+    def get_labels(self):
+        segments = np.load(os.path.join(self.store, "segments.npy"))
+        labels = []
+        for im_file in self.im_files:
+            row = self.rows.get(os.path.basename(im_file))
+            if row is None:
+                raise RuntimeError(f"{im_file} is not in {self.store} - run prepare_dataset.py")
+            entry = self.index["entries"][row]
+            polygons = [segments[start:end] for _, start, end in entry["objects"]]
+            boxes = np.array([[(p[:, 0].min() + p[:, 0].max()) / 2, (p[:, 1].min() + p[:, 1].max()) / 2,
+                               p[:, 0].max() - p[:, 0].min(), p[:, 1].max() - p[:, 1].min()] for p in polygons],
+                             dtype=np.float32).reshape(-1, 4)
+            labels.append({
+                "im_file": im_file,
+                "shape": tuple(entry["shape"]),
+                "cls": np.array([[cls] for cls, _, _ in entry["objects"]], dtype=np.float32).reshape(-1, 1),
+                "bboxes": boxes,
+                "segments": polygons,
+                "keypoints": None,
+                "normalized": True,
+                "bbox_format": "xywh",
+            })
+        return labels
+
+    def load_image(self, i, rect_mode=True, resize_short=False):
+        if not rect_mode or resize_short or self.index["imgsz"] != self.imgsz:
+            return super().load_image(i, rect_mode, resize_short)
+        if self.images is None:
+            self.images = np.load(os.path.join(self.store, "images.npy"), mmap_mode="r")
+        # By name: rect mode re-sorts im_files/labels by aspect ratio after get_labels
+        row = self.rows[os.path.basename(self.im_files[i])]
+        entry = self.index["entries"][row]
+        h, w = entry["resized"]
+        # Copy: augmentations write into the image in place
+        return np.array(self.images[row, :h, :w]), tuple(entry["shape"]), (h, w)
+
+
+class CachedSegmentationTrainer(SegmentationTrainer):
+    """ SegmentationTrainer that builds its datasets from the prepared stores. """
+
+    def build_dataset(self, img_path, mode="train", batch=None):
+        store = store_dir(os.path.normpath(img_path)) if isinstance(img_path, str) else None
+        if store is None or load_index(store) is None:
+            return super().build_dataset(img_path, mode, batch)
+        model = self.model.module if hasattr(self.model, "module") else self.model
+        stride = max(int(model.stride.max()), 32) if model is not None else 32
+        return CachedDataset(
+            store=store,
+            img_path=img_path,
+            imgsz=self.args.imgsz,
+            batch_size=batch,
+            augment=mode == "train",
+            hyp=self.args,
+            rect=self.args.rect or mode == "val",
+            cache=None,
+            single_cls=self.args.single_cls or False,
+            stride=stride,
+            pad=0.0 if mode == "train" else 0.5,
+            prefix=colorstr(f"{mode}: "),
+            task=self.args.task,
+            classes=self.args.classes,
+            data=self.data,
+            fraction=self.args.fraction if mode == "train" else 1.0,
+        )
+
+
+class EpochTimer:
+    """ Training callbacks: time waiting for batches (data) vs time in the step (compute). """
+
+    def __init__(self):
+        self.epochs = []
+        self.data = self.compute = 0.0
+        self.mark = self.batch_start = 0.0
+
+    def attach(self, model):
+        model.add_callback("on_train_epoch_start", self.epoch_start)
+        model.add_callback("on_train_batch_start", self.batch_started)
+        model.add_callback("on_train_batch_end", self.batch_ended)
+        model.add_callback("on_train_epoch_end", self.epoch_end)
+        return self
+
+    def epoch_start(self, trainer):
+        self.data = self.compute = 0.0
+        self.mark = time.perf_counter()
+
+    def batch_started(self, trainer):
+        self.batch_start = time.perf_counter()
+        self.data += self.batch_start - self.mark
+
+    def batch_ended(self, trainer):
+        self.mark = time.perf_counter()
+        self.compute += self.mark - self.batch_start
+
+    def epoch_end(self, trainer):
+        self.epochs.append((self.data, self.compute))
+        total = self.data + self.compute
+        print(f"\nepoch {trainer.epoch + 1}: data {self.data:.1f}s ({self.data / total:.0%}), "
+              f"compute {self.compute:.1f}s")
+
+    def describe(self):
+        if not self.epochs:
+            return "no epochs timed"
+        data, compute = np.array(self.epochs).sum(0)
+        return (f"{len(self.epochs)} epochs: data loading {data:.1f}s ({data / (data + compute):.0%}), "
+                f"compute {compute:.1f}s")
+
+
+# ----------------------------
+# CLI
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Build the decode-once dataset store for train.py")
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--imgsz", type=int, default=IMGSZ)
+    parser.add_argument("--force", action="store_true", help="Rebuild even if the store is current")
+    args = parser.parse_args()
+
+    dirs = dataset_dirs(args.data)
+    indexes = prepare(args.data, args.imgsz, args.force)
+    for split, index in indexes.items():
+        directory = store_dir(dirs[split])
+        images = np.load(os.path.join(directory, "images.npy"), mmap_mode="r")
+        size = os.path.getsize(os.path.join(directory, "images.npy")) / 2 ** 20
+
+        # One image per read, as a DataLoader worker would
+        start = time.perf_counter()
+        for entry in index["entries"]:
+            im = cv2.imread(os.path.join(dirs[split], entry["name"]), cv2.IMREAD_COLOR)
+            h, w = entry["resized"]
+            if im.shape[:2] != (h, w):
+                cv2.resize(im, (w, h), interpolation=cv2.INTER_LINEAR)
+        decode = (time.perf_counter() - start) / len(index["entries"])
+        start = time.perf_counter()
+        for row, entry in enumerate(index["entries"]):
+            h, w = entry["resized"]
+            np.array(images[row, :h, :w])
+        read = (time.perf_counter() - start) / len(index["entries"])
+        print(f"{split:6s} {len(index['entries'])} images, {size:.0f} MB store | "
+              f"decode+resize {decode * 1000:.2f}ms/image, store read {read * 1000:.2f}ms/image")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Pluggable CPU inference backends for the pupil YOLO model.
+
+Every backend takes a BGR frame and returns the detected boxes as a (k, 5)
+float32 array [x1, y1, x2, y2, conf] in frame pixels, best first - the same
+thing mousecontrol.py used to pull out of results[0].boxes. Variants are
+picked by name; export_models.py produces the files:
+
+    torch          yolo11m-seg-custom.pt                     Ultralytics (reference)
+    onnx           yolo11m-seg-custom.onnx                   ONNX Runtime FP32
+    onnx-int8      yolo11m-seg-custom_int8.onnx              ONNX Runtime INT8 (static, QDQ)
+    openvino       yolo11m-seg-custom_openvino_model/        OpenVINO FP32
+    openvino-int8  yolo11m-seg-custom_int8_openvino_model/   OpenVINO INT8 (NNCF)
+
+The distilled nano student (yolo11n-seg-distilled.pt, distill.py) gets the
+same variants under its own stem.
+
+    detector = load_backend("openvino-int8", imgsz=320, conf=0.4)
+    boxes = detector.detect(frame)
+
+The ONNX/OpenVINO backends letterbox into one preallocated uint8 canvas and
+one preallocated float32 input tensor (OpenVINO reads it in place), decode
+only the box head of the YOLO output (the mask prototypes are never
+touched) and run a warmup on load so the first real frame isn't slow.
+"""
+
+import os
+import time
+
+import cv2
+import numpy as np
+
+MODEL_PATH = "yolo11m-seg-custom.pt"
+STUDENT_PATH = "yolo11n-seg-distilled.pt"   # Nano student trained by distill.py
+MODELS = {"teacher": MODEL_PATH, "student": STUDENT_PATH}
+IMGSZ = 320
+CONF = 0.4
+IOU = 0.5
+WARMUP_RUNS = 3
+PAD_VALUE = 114     # Ultralytics letterbox grey
+MASK_COEFFS = 32    # Extra channels per candidate in a -seg model's output
+
+VARIANTS = {
+    "torch": "{stem}.pt",
+    "onnx": "{stem}.onnx",
+    "onnx-int8": "{stem}_int8.onnx",
+    "openvino": "{stem}_openvino_model",
+    "openvino-int8": "{stem}_int8_openvino_model",
+}
+
+
+def variant_path(variant, model_path=MODEL_PATH):
+    """File (or OpenVINO directory) of an exported variant of `model_path`."""
+    if variant not in VARIANTS:
+        raise ValueError(f"Unknown backend '{variant}', expected one of {', '.join(VARIANTS)}")
+    root, _ = os.path.splitext(model_path)
+    return VARIANTS[variant].format(stem=root)
+
+
+# ----------------------------
+# Pre/post-processing
+# ----------------------------
+class Letterbox:
+    """ Frame -> (1, 3, size, size) RGB float32 tensor, into preallocated buffers.
+
+        The scale/padding is recomputed only when the frame size changes.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.canvas = np.full((size, size, 3), PAD_VALUE, dtype=np.uint8)
+        self.tensor = np.empty((1, 3, size, size), dtype=np.float32)
+        self.shape = None
+
+    def __call__(self, frame):
+        h, w = frame.shape[:2]
+        if (h, w) != self.shape:
+            self.shape = (h, w)
+            self.scale = min(self.size / h, self.size / w)
+            self.new_w, self.new_h = round(w * self.scale), round(h * self.scale)
+            self.dx = (self.size - self.new_w) // 2
+            self.dy = (self.size - self.new_h) // 2
+            self.resized = np.empty((self.new_h, self.new_w, 3), dtype=np.uint8)
+            self.canvas[:] = PAD_VALUE
+
+        cv2.resize(frame, (self.new_w, self.new_h), dst=self.resized, interpolation=cv2.INTER_LINEAR)
+        self.canvas[self.dy:self.dy + self.new_h, self.dx:self.dx + self.new_w] = self.resized
+        # HWC BGR uint8 -> CHW RGB float32 / 255, written straight into the tensor
+        np.multiply(self.canvas[..., ::-1].transpose(2, 0, 1), np.float32(1 / 255), out=self.tensor[0])
+        return self.tensor
+
+    def unmap(self, boxes):
+        """Letterbox pixels -> frame pixels (in place on the x1, y1, x2, y2 columns)."""
+        boxes[:, [0, 2]] = (boxes[:, [0, 2]] - self.dx) / self.scale
+        boxes[:, [1, 3]] = (boxes[:, [1, 3]] - self.dy) / self.scale
+        boxes[:, [0, 2]] = boxes[:, [0, 2]].clip(0, self.shape[1])
+        boxes[:, [1, 3]] = boxes[:, [1, 3]].clip(0, self.shape[0])
+        return boxes
+
+
+def decode_yolo(output, conf, iou=IOU, masks=True):
+    """ Raw YOLO head (1, 4 + classes [+ 32], candidates) -> (k, 5) boxes after NMS,
+        in letterbox pixels, best first.
+    """
+    pred = output[0]
+    classes = pred.shape[0] - 4 - (MASK_COEFFS if masks else 0)
+    scores = pred[4:4 + classes].max(0)
+    keep = np.flatnonzero(scores > conf)
+    if not len(keep):
+        return np.empty((0, 5), dtype=np.float32)
+
+    cx, cy, w, h = pred[:4, keep]
+    scores = scores[keep]
+    indices = cv2.dnn.NMSBoxes(np.stack([cx - w / 2, cy - h / 2, w, h], 1).tolist(),
+                               scores.tolist(), conf, iou)
+    indices = np.asarray(indices, dtype=np.int64).reshape(-1)
+    indices = indices[np.argsort(-scores[indices])]
+    boxes = np.empty((len(indices), 5), dtype=np.float32)
+    boxes[:, 0] = cx[indices] - w[indices] / 2
+    boxes[:, 1] = cy[indices] - h[indices] / 2
+    boxes[:, 2] = cx[indices] + w[indices] / 2
+    boxes[:, 3] = cy[indices] + h[indices] / 2
+    boxes[:, 4] = scores[indices]
+    return boxes
+
+
+# ----------------------------
+# Backends
+# ----------------------------
+class PupilBackend:
+    """ Base: detect(frame) -> (k, 5) [x1, y1, x2, y2, conf], best first. """
+
+    name = "base"
+    masks = True    # Output has mask coefficients after the class scores
+
+    def __init__(self, path, imgsz=IMGSZ, conf=CONF):
+        self.path = path
+        self.imgsz = imgsz
+        self.conf = conf
+        self.letterbox = Letterbox(imgsz)
+        self.calls = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def infer(self, tensor):
+        """Run the network on the letterboxed tensor; returns the raw box head."""
+        raise NotImplementedError
+
+    def detect(self, frame):
+        start = time.perf_counter()
+        output = self.infer(self.letterbox(frame))
+        boxes = self.letterbox.unmap(decode_yolo(output, self.conf, masks=self.masks))
+        self.last_time = time.perf_counter() - start
+        self.total_time += self.last_time
+        self.calls += 1
+        return boxes
+
+    def warmup(self, runs=WARMUP_RUNS):
+        frame = np.zeros((self.imgsz, self.imgsz, 3), dtype=np.uint8)
+        for _ in range(runs):
+            self.detect(frame)
+        self.calls = 0
+        self.total_time = 0.0
+        return self
+
+    def describe(self):
+        mean = self.total_time / self.calls * 1000 if self.calls else 0.0
+        return f"{self.name} {os.path.basename(os.path.normpath(self.path))} {mean:.1f}ms/frame over {self.calls}"
+
+
+class UltralyticsBackend(PupilBackend):
+    """ The .pt model through Ultralytics (what the scripts used before). """
+
+    name = "torch"
+
+    def __init__(self, path, imgsz=IMGSZ, conf=CONF):
+        super().__init__(path, imgsz, conf)
+        from ultralytics import YOLO
+        self.model = YOLO(path)
+
+    def detect(self, frame):
+        start = time.perf_counter()
+        result = self.model.predict(frame, device="cpu", imgsz=self.imgsz, conf=self.conf, verbose=False)[0]
+        if result.boxes is not None and len(result.boxes):
+            boxes = np.concatenate([result.boxes.xyxy.numpy(), result.boxes.conf.numpy()[:, None]], 1)
+            boxes = boxes[np.argsort(-boxes[:, 4])].astype(np.float32)
+        else:
+            boxes = np.empty((0, 5), dtype=np.float32)
+        self.last_time = time.perf_counter() - start
+        self.total_time += self.last_time
+        self.calls += 1
+        return boxes
+
+
+class OnnxBackend(PupilBackend):
+    """ ONNX Runtime on the CPU execution provider (FP32 or INT8 QDQ models). """
+
+    name = "onnx"
+
+    def __init__(self, path, imgsz=IMGSZ, conf=CONF, threads=0):
+        super().__init__(path, imgsz, conf)
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        outputs = self.session.get_outputs()
+        self.output_names = [outputs[0].name]   # Box head only
+        self.masks = len(outputs) > 1
+
+        shape = self.session.get_inputs()[0].shape
+        if isinstance(shape[2], int) and shape[2] != imgsz:
+            raise ValueError(f"{path} was exported at {shape[2]}px, not {imgsz}px")
+
+    def infer(self, tensor):
+        return self.session.run(self.output_names, {self.input_name: tensor})[0]
+
+
+class OpenVinoBackend(PupilBackend):
+    """ OpenVINO on the CPU plugin, tuned for latency; input tensor shared with numpy. """
+
+    name = "openvino"
+
+    def __init__(self, path, imgsz=IMGSZ, conf=CONF):
+        super().__init__(path, imgsz, conf)
+        import openvino as ov
+
+        xml = path
+        if os.path.isdir(path):
+            xml = next(os.path.join(path, f) for f in sorted(os.listdir(path)) if f.endswith(".xml"))
+        core = ov.Core()
+        model = core.read_model(xml)
+        self.masks = len(model.outputs) > 1
+        compiled = core.compile_model(model, "CPU", {"PERFORMANCE_HINT": "LATENCY"})
+        self.request = compiled.create_infer_request()
+        # The letterbox writes straight into the request's input
+        self.request.set_input_tensor(ov.Tensor(self.letterbox.tensor, shared_memory=True))
+        self.output = compiled.outputs[0]
+
+    def infer(self, tensor):
+        self.request.infer()
+        return self.request.get_tensor(self.output).data
+
+
+BACKENDS = {
+    "torch": UltralyticsBackend,
+    "onnx": OnnxBackend,
+    "onnx-int8": OnnxBackend,
+    "openvino": OpenVinoBackend,
+    "openvino-int8": OpenVinoBackend,
+}
+
+
+def load_backend(variant, model_path=MODEL_PATH, imgsz=IMGSZ, conf=CONF, warmup=WARMUP_RUNS):
+    """Open an exported variant of `model_path` and warm it up."""
+    path = variant_path(variant, model_path)
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"{path} not found - run: python export_models.py {model_path}")
+    backend = BACKENDS[variant](path, imgsz=imgsz, conf=conf)
+    backend.name = variant
+    return backend.warmup(warmup) if warmup else backend
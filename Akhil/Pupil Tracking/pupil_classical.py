@@ -0,0 +1,347 @@
+"""
+Classical dark-pupil detector for IR eye-camera frames, with the YOLO model
+as a fallback and drift check.
+
+ClassicalPupil finds the pupil without a network: a half-size blurred grey
+image is thresholded a few levels above its darkest value, the dark blobs
+are cleaned up (opening removes lashes, the convex hull fills glints) and
+an ellipse is fitted to each. The confidence of an ellipse is how well it
+explains its blob: filled fraction x roundness x the share of its outline
+that is a dark-to-bright step x the pupil/iris contrast. The best blob is
+refitted at half contrast so the ellipse sits on the pupil's real edge.
+This takes about a millisecond on a 640x480 frame.
+
+HybridPupil puts the classical path in front of a pupil_backends backend:
+the network only runs when the classical confidence is below `min_conf`,
+and every `verify_every` frames to check the classical result hasn't
+drifted (IoU below `min_iou` counts as a disagreement and the network's
+box is used). Both expose detect(frame) -> (k, 5) [x1, y1, x2, y2, conf],
+so they drop into PupilTracker and mousecontrol like any backend.
+
+    python pupil_classical.py                        # classical only
+    python pupil_classical.py --model best.pt --backend openvino-int8
+"""
+
+import argparse
+import glob
+import os
+import time
+
+import cv2
+import numpy as np
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCALE = 0.5                     # Work on a half-size image
+BLUR = 5
+THRESHOLD_OFFSETS = (10, 25, 40)   # Grey levels above the darkest pixel
+MIN_AREA = 40                   # Blob area limits in half-size pixels
+MAX_AREA = 6000
+MIN_ROUNDNESS = 0.45            # Ellipse minor/major axis
+EDGE_CONTRAST = 10              # Grey levels from just inside to just outside the ellipse
+EDGE_SAMPLES = 24
+FULL_CONTRAST = 40              # Pupil-to-iris contrast that counts as certain
+REFINE_MARGIN = 2.0             # Refit window, in ellipse diameters
+REFINE_MAX_GROWTH = 1.6
+MIN_CONF = 0.7                  # Classical results below this go to the network
+VERIFY_EVERY = 30               # Network drift check every N frames (0 = never)
+MIN_IOU = 0.5                   # Classical vs network agreement
+
+OPEN_KERNEL = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (3, 3))
+ANGLES = np.linspace(0, 2 * np.pi, EDGE_SAMPLES, endpoint=False)
+EMPTY = np.empty((0, 5), dtype=np.float32)
+
+
+# ----------------------------
+# Classical detector
+# ----------------------------
+class ClassicalPupil:
+    """ Threshold + ellipse fit. detect() -> (k, 5) boxes; `ellipse` is the last fit. """
+
+    name = "classical"
+
+    def __init__(self, scale=SCALE, offsets=THRESHOLD_OFFSETS, conf=0.0):
+        self.scale = scale
+        self.offsets = offsets
+        self.conf = conf
+        self.ellipse = None     # ((cx, cy), (w, h), angle) in frame pixels
+        self.resized = None
+        self.small = None
+        self.mask = None
+        self.calls = 0
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def fit(self, gray):
+        """Best ellipse in a (small) grey image -> (ellipse, confidence) or (None, 0)."""
+        floor = int(gray.min())
+        best, best_conf = None, 0.0
+        for offset in self.offsets:
+            cv2.threshold(gray, floor + offset, 255, cv2.THRESH_BINARY_INV, dst=self.mask)
+            cv2.morphologyEx(self.mask, cv2.MORPH_OPEN, OPEN_KERNEL, dst=self.mask)
+            contours, _ = cv2.findContours(self.mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            for contour in contours:
+                area = cv2.contourArea(contour)
+                if not MIN_AREA <= area <= MAX_AREA:
+                    continue
+                hull = cv2.convexHull(contour)
+                if len(hull) < 5:
+                    continue
+                ellipse = cv2.fitEllipse(hull)
+                (_, _), (w, h), _ = ellipse
+                if min(w, h) <= 0:
+                    continue
+                roundness = min(w, h) / max(w, h)
+                if roundness < MIN_ROUNDNESS:
+                    continue
+                # Hull area vs ellipse area: 1 when the ellipse is the blob
+                ellipse_area = np.pi * w * h / 4
+                hull_area = cv2.contourArea(hull)
+                fill = min(hull_area, ellipse_area) / max(hull_area, ellipse_area)
+                shape = fill * min(1.0, roundness / 0.75)
+                if shape <= best_conf:
+                    continue    # Can't win even with a perfect edge
+                support, inside, outside = self.edge_samples(gray, ellipse)
+                if not len(inside):
+                    continue
+                contrast = np.median(outside.astype(np.int16) - inside)
+                conf = shape * support * min(1.0, contrast / FULL_CONTRAST)
+                if conf > best_conf:
+                    best, best_conf = ellipse, conf
+        return best, best_conf
+
+    @staticmethod
+    def edge_samples(gray, ellipse):
+        """ Grey levels just inside and just outside the ellipse, and the
+            fraction of directions where the edge is a dark-to-bright step.
+
+            A partial blob (a pupil split by a glint, a clump of lashes) has
+            dark pixels on both sides of part of its outline.
+        """
+        (cx, cy), (w, h), angle = ellipse
+        a = np.deg2rad(angle)
+        ex = w / 2 * np.cos(ANGLES)
+        ey = h / 2 * np.sin(ANGLES)
+        dx = ex * np.cos(a) - ey * np.sin(a)
+        dy = ex * np.sin(a) + ey * np.cos(a)
+        x_in, y_in = (cx + 0.7 * dx).astype(int), (cy + 0.7 * dy).astype(int)
+        x_out, y_out = (cx + 1.3 * dx).astype(int), (cy + 1.3 * dy).astype(int)
+        # Directions running off the frame say nothing about the edge
+        h_img, w_img = gray.shape
+        valid = ((x_out >= 0) & (x_out < w_img) & (y_out >= 0) & (y_out < h_img)
+                 & (x_in >= 0) & (x_in < w_img) & (y_in >= 0) & (y_in < h_img))
+        if valid.sum() < EDGE_SAMPLES // 2:
+            return 0.0, valid[:0], valid[:0]
+        inside = gray[y_in[valid], x_in[valid]]
+        outside = gray[y_out[valid], x_out[valid]]
+        return np.mean(outside.astype(np.int16) - inside > EDGE_CONTRAST), inside, outside
+
+    def refine(self, gray, ellipse):
+        """ Refit at half contrast: the thresholds that find the blob sit near
+            the darkest level and trace the pupil's core, inside its real edge.
+        """
+        _, inside, outside = self.edge_samples(gray, ellipse)
+        if not len(inside):
+            return ellipse
+        level = (int(np.median(inside)) + int(np.median(outside))) // 2
+        (cx, cy), (w, h), _ = ellipse
+        r = max(w, h) * REFINE_MARGIN / 2
+        x1, y1 = max(0, int(cx - r)), max(0, int(cy - r))
+        x2, y2 = min(gray.shape[1], int(cx + r) + 1), min(gray.shape[0], int(cy + r) + 1)
+        roi = gray[y1:y2, x1:x2]
+        mask = cv2.threshold(roi, level, 255, cv2.THRESH_BINARY_INV)[1]
+        contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)
+        center = (cx - x1, cy - y1)
+        for contour in contours:
+            if len(contour) >= 5 and cv2.pointPolygonTest(contour, center, False) >= 0:
+                hull = cv2.convexHull(contour)
+                if len(hull) < 5:
+                    break
+                (rx, ry), (rw, rh), angle = cv2.fitEllipse(hull)
+                # Half contrast can leak into a dark iris; keep the fit if it did
+                if max(rw, rh) > max(w, h) * REFINE_MAX_GROWTH:
+                    break
+                return (rx + x1, ry + y1), (rw, rh), angle
+        return ellipse
+
+    def detect(self, frame):
+        start = time.perf_counter()
+        height, width = frame.shape[:2]
+        size = (round(width * self.scale), round(height * self.scale))
+        if self.small is None or self.small.shape[::-1] != size:
+            self.resized = np.empty(size[::-1] + frame.shape[2:], dtype=np.uint8)
+            self.small = np.empty(size[::-1], dtype=np.uint8)
+            self.mask = np.empty(size[::-1], dtype=np.uint8)
+        # Shrink first, then convert: a quarter of the pixels to convert
+        cv2.resize(frame, size, dst=self.resized, interpolation=cv2.INTER_AREA)
+        if frame.ndim == 3:
+            cv2.cvtColor(self.resized, cv2.COLOR_BGR2GRAY, dst=self.small)
+        else:
+            self.small[:] = self.resized
+        cv2.GaussianBlur(self.small, (BLUR, BLUR), 0, dst=self.small)
+
+        ellipse, conf = self.fit(self.small)
+        if ellipse is not None:
+            ellipse = self.refine(self.small, ellipse)
+        boxes = EMPTY
+        self.ellipse = None
+        if ellipse is not None and conf >= self.conf:
+            (cx, cy), (w, h), angle = ellipse
+            s = 1 / self.scale
+            self.ellipse = ((cx * s, cy * s), (w * s, h * s), angle)
+            x1, y1, bw, bh = cv2.boundingRect(cv2.ellipse2Poly(
+                (round(cx * s), round(cy * s)), (round(w * s / 2), round(h * s / 2)), round(angle), 0, 360, 10))
+            boxes = np.array([[max(x1, 0), max(y1, 0), min(x1 + bw, width),
+                               min(y1 + bh, height), conf]], dtype=np.float32)
+
+        self.last_time = time.perf_counter() - start
+        self.total_time += self.last_time
+        self.calls += 1
+        return boxes
+
+    def describe(self):
+        mean = self.total_time / self.calls * 1000 if self.calls else 0.0
+        return f"{self.name} {mean:.2f}ms/frame over {self.calls}"
+
+
+def box_iou(a, b):
+    x1, y1 = max(a[0], b[0]), max(a[1], b[1])
+    x2, y2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, x2 - x1) * max(0.0, y2 - y1)
+    union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+    return inter / union if union > 0 else 0.0
+
+
+class HybridPupil:
+    """ Classical first; the network on low confidence and for periodic drift checks. """
+
+    name = "hybrid"
+
+    def __init__(self, network, min_conf=MIN_CONF, verify_every=VERIFY_EVERY, min_iou=MIN_IOU):
+        self.classical = ClassicalPupil()
+        self.network = network
+        self.min_conf = min_conf
+        self.verify_every = verify_every
+        self.min_iou = min_iou
+        self.frames = 0
+        self.fallbacks = 0      # Classical not confident, network asked
+        self.verifications = 0
+        self.disagreements = 0  # Drift check IoU below min_iou
+        self.total_time = 0.0
+        self.last_time = 0.0
+
+    def detect(self, frame):
+        start = time.perf_counter()
+        self.frames += 1
+        boxes = self.classical.detect(frame)
+        confident = len(boxes) and boxes[0, 4] >= self.min_conf
+        verify = self.verify_every and self.frames % self.verify_every == 0
+
+        if not confident:
+            self.fallbacks += 1
+            checked = self.network.detect(frame)
+            if len(checked):
+                boxes = checked
+        elif verify:
+            self.verifications += 1
+            checked = self.network.detect(frame)
+            if len(checked) and box_iou(boxes[0], checked[0]) < self.min_iou:
+                self.disagreements += 1
+                boxes = checked
+
+        self.last_time = time.perf_counter() - start
+        self.total_time += self.last_time
+        return boxes
+
+    def describe(self):
+        mean = self.total_time / self.frames * 1000 if self.frames else 0.0
+        return (f"{self.name} {mean:.2f}ms/frame over {self.frames}: "
+                f"{self.fallbacks} network fallbacks, {self.disagreements}/{self.verifications} "
+                f"drift checks disagreed | {self.classical.describe()} | {self.network.describe()}")
+
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+def load_labelled(directory):
+    """(image path, ground-truth box) for every image with a polygon label."""
+    samples = []
+    for path in sorted(glob.glob(os.path.join(directory, "images", "*"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        label = os.path.join(directory, "labels", stem + ".txt")
+        if not os.path.exists(label):
+            continue
+        with open(label) as f:
+            rows = [list(map(float, line.split()[1:])) for line in f if line.strip()]
+        if rows:
+            samples.append((path, np.array(rows[0]).reshape(-1, 2)))
+    return samples
+
+
+def evaluate(detector, samples):
+    """Latency and accuracy of one detector over (frame, polygon) samples."""
+    times, ious, errors = [], [], []
+    for frame, polygon in samples:
+        h, w = frame.shape[:2]
+        points = polygon * (w, h)
+        truth = (*points.min(0), *points.max(0))
+        start = time.perf_counter()
+        boxes = detector.detect(frame)
+        times.append(time.perf_counter() - start)
+        if len(boxes):
+            box = boxes[0]
+            ious.append(box_iou(box, truth))
+            errors.append(np.hypot((box[0] + box[2] - truth[0] - truth[2]) / 2,
+                                   (box[1] + box[3] - truth[1] - truth[3]) / 2))
+        else:
+            ious.append(0.0)
+    times = np.array(times) * 1000
+    found = len(errors)
+    return {
+        "ms": times.mean(),
+        "p95": np.percentile(times, 95),
+        "found": found,
+        "hit": sum(iou >= MIN_IOU for iou in ious),
+        "iou": np.mean(ious),
+        "error": np.median(errors) if found else float("nan"),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classical vs hybrid vs YOLO-only pupil detection")
+    parser.add_argument("--sets", nargs="+", default=["train", "val"])
+    parser.add_argument("--model", default="yolo11m-seg-custom.pt")
+    parser.add_argument("--backend", default="openvino-int8", help="pupil_backends variant for the network")
+    parser.add_argument("--imgsz", type=int, default=320)
+    parser.add_argument("--repeat", type=int, default=3, help="Passes over the images (timing)")
+    args = parser.parse_args()
+
+    samples = []
+    for name in args.sets:
+        samples += load_labelled(os.path.join(HERE, name))
+    samples = [(cv2.imread(p), polygon) for p, polygon in samples]
+    samples = [s for s in samples if s[0] is not None]
+    print(f"{len(samples)} labelled images from {', '.join(args.sets)}")
+
+    detectors = {"classical": ClassicalPupil()}
+    try:
+        from pupil_backends import load_backend
+        network = load_backend(args.backend, os.path.join(HERE, args.model), imgsz=args.imgsz)
+        detectors["hybrid"] = HybridPupil(network)
+        detectors[f"yolo ({args.backend})"] = network
+    except (FileNotFoundError, ImportError) as e:
+        print(f"Network skipped: {e}")
+
+    print(f"\n{'detector':24s} {'ms':>7s} {'p95':>7s} {'found':>7s} {'IoU>=' + str(MIN_IOU):>8s} "
+          f"{'mean IoU':>9s} {'center px':>10s}")
+    for name, detector in detectors.items():
+        result = evaluate(detector, samples * args.repeat)
+        n = len(samples) * args.repeat
+        print(f"{name:24s} {result['ms']:7.2f} {result['p95']:7.2f} {result['found'] / n:7.0%} "
+              f"{result['hit'] / n:8.0%} {result['iou']:9.3f} {result['error']:10.1f}")
+    if "hybrid" in detectors:
+        print(f"\n{detectors['hybrid'].describe()}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Detect-then-track for the pupil.
+
+The detector (any pupil_backends backend) runs on the full frame only when
+the pupil has to be (re)acquired or every `redetect_every` frames. In
+between, the pupil patch cut out at the last detection is followed with
+normalized cross-correlation (cv2.matchTemplate) in a small search window
+around the last box - well under a millisecond against a full inference.
+When the correlation peak drops below `min_score` the tracker gives up on
+that frame and runs the detector instead, so a blink or a fast saccade
+costs one detection, not a lost cursor.
+
+    tracker = PupilTracker(detector)
+    pupil = tracker.update(frame)      # Pupil(box, conf, mode) or None
+    print(tracker.describe())          # detect/track ratio, stage timings
+"""
+
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+REDETECT_EVERY = 15     # Full detection at least every N frames (0 = every frame)
+MIN_SCORE = 0.6         # Correlation peak below this -> detect instead
+SEARCH_MARGIN = 0.75    # Search window = box grown by this much of its size per side
+SEARCH_MIN_PX = 16      # ... but at least this many pixels per side
+MIN_TEMPLATE_STD = 2.0  # A flat patch can't be tracked by correlation
+
+# box: [x1, y1, x2, y2] float frame pixels; mode: "detect" or "track"
+Pupil = namedtuple("Pupil", "box conf mode")
+
+
+class StageTimes:
+    """ Mean time per named stage. """
+
+    def __init__(self):
+        self.totals = {}
+        self.counts = {}
+
+    def add(self, stage, seconds):
+        self.totals[stage] = self.totals.get(stage, 0.0) + seconds
+        self.counts[stage] = self.counts.get(stage, 0) + 1
+
+    def describe(self):
+        return " ".join(f"{stage} {self.totals[stage] / self.counts[stage] * 1000:.2f}ms"
+                        for stage in self.totals)
+
+
+class PupilTracker:
+    """ Full-frame detection on (re)acquisition, template tracking in between. """
+
+    def __init__(self, detector, redetect_every=REDETECT_EVERY, min_score=MIN_SCORE,
+                 search_margin=SEARCH_MARGIN):
+        self.detector = detector
+        self.redetect_every = redetect_every
+        self.min_score = min_score
+        self.search_margin = search_margin
+
+        self.template = None     # Grey pupil patch from the last detection
+        self.box = None          # Last box, int [x1, y1, x2, y2]
+        self.since_detect = 0
+
+        self.stages = StageTimes()
+        self.detections = 0
+        self.tracks = 0
+        self.fallbacks = 0       # Tracking gave up, detector ran instead
+        self.lost = 0            # Detector found nothing
+
+    def reset(self):
+        self.template = None
+        self.box = None
+
+    def update(self, frame):
+        """Pupil in this BGR frame, or None."""
+        start = time.perf_counter()
+        gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+        self.stages.add("gray", time.perf_counter() - start)
+
+        if self.template is not None and self.since_detect < self.redetect_every:
+            start = time.perf_counter()
+            box, score = self.track(gray)
+            self.stages.add("track", time.perf_counter() - start)
+            if score >= self.min_score:
+                self.box = box
+                self.since_detect += 1
+                self.tracks += 1
+                return Pupil(box.astype(np.float32), score, "track")
+            self.fallbacks += 1
+
+        start = time.perf_counter()
+        boxes = self.detector.detect(frame)
+        self.stages.add("detect", time.perf_counter() - start)
+        self.detections += 1
+        if not len(boxes):
+            self.lost += 1
+            self.reset()
+            return None
+
+        self.acquire(gray, boxes[0, :4])
+        return Pupil(boxes[0, :4], float(boxes[0, 4]), "detect")
+
+    def acquire(self, gray, box):
+        """Take the pupil patch under a detected box as the new template."""
+        x1, y1, x2, y2 = np.round(box).astype(int)
+        template = gray[y1:y2, x1:x2]
+        self.since_detect = 0
+        if template.shape[0] < 4 or template.shape[1] < 4 or template.std() < MIN_TEMPLATE_STD:
+            self.reset()
+            return
+        self.template = template.copy()
+        self.box = np.array([x1, y1, x2, y2])
+
+    def track(self, gray):
+        """Best template match around the last box -> (box, correlation peak)."""
+        x1, y1, x2, y2 = self.box
+        th, tw = self.template.shape
+        margin = max(SEARCH_MIN_PX, int(self.search_margin * max(tw, th)))
+        sx1, sy1 = max(0, x1 - margin), max(0, y1 - margin)
+        sx2, sy2 = min(gray.shape[1], x2 + margin), min(gray.shape[0], y2 + margin)
+        window = gray[sy1:sy2, sx1:sx2]
+        if window.shape[0] < th or window.shape[1] < tw:
+            return self.box, 0.0
+
+        scores = cv2.matchTemplate(window, self.template, cv2.TM_CCOEFF_NORMED)
+        _, score, _, (dx, dy) = cv2.minMaxLoc(scores)
+        box = np.array([sx1 + dx, sy1 + dy, sx1 + dx + tw, sy1 + dy + th])
+        return box, score
+
+    def describe(self):
+        frames = self.detections + self.tracks
+        ratio = self.detections / frames * 100 if frames else 0.0
+        return (f"pupil: {self.detections} detect / {self.tracks} track ({ratio:.0f}% detect), "
+                f"{self.fallbacks} fallbacks, {self.lost} lost | {self.stages.describe()}")
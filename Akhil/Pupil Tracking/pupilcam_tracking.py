@@ -1,8 +1,17 @@
+import os
+import sys
+
+# Shared frame source lives in "Tello Drone Control"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "Tello Drone Control"))
+
 from ultralytics import YOLO
 import cv2
 
-# Load your trained model
-model = YOLO("yolo11m-seg-custom.pt")   # <-- change path if your best.pt is elsewhere
+from frame_source import camera_source
+from pupil_backends import MODELS
+
+# Load your trained model (--student: the nano model from distill.py)
+model = YOLO(MODELS["student" if "--student" in sys.argv else "teacher"])   # <-- paths in pupil_backends.py
 
 # Open webcam
 cap = cv2.VideoCapture(0)
@@ -11,11 +20,15 @@ if not cap.isOpened():
     print("Camera not opening")
     exit()
 
-while True:
-    ret, frame = cap.read()
+source = camera_source(cap).start()  # Newest frame only, no buffered backlog
 
-    if not ret:
-        break
+while True:
+    captured = source.wait_next(timeout=1.0)
+    if captured is None:
+        if source.ended:
+            break
+        continue
+    frame = captured.image
 
     # Run detection (CPU)
     results = model.predict(source=frame, device="cpu", conf=0.8)
@@ -38,5 +51,6 @@ while True:
     if cv2.waitKey(1) & 0xFF == ord("q"):
         break
 
-cap.release()
+source.stop()  # releases the camera
+print(source.describe())
 cv2.destroyAllWindows()
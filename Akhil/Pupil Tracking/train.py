@@ -1,6 +1,19 @@
+import os
+
 from ultralytics import YOLO
 
+from prepare_dataset import CachedSegmentationTrainer, EpochTimer, prepare
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+DATA = os.path.join(HERE, "custom_dataset.yaml")   # train/val paths are relative to this file
+IMGSZ = 640
+
+# Decode + resize every image once into cache/ (skipped when it's current)
+prepare(DATA, IMGSZ)
+
 model=YOLO("yolo11m-seg.pt")
+timer = EpochTimer().attach(model)
 
-model.train(data="custom_dataset.yaml",imgsz=640,device="cpu",batch=8,epochs=100,workers=3)
+model.train(data=DATA,imgsz=IMGSZ,device="cpu",batch=8,epochs=100,workers=3,trainer=CachedSegmentationTrainer)
 
+print(timer.describe())
@@ -1,7 +1,18 @@
-from djitellopy import Tello
+import asyncio
+import os
+import sys
 import time
 import socket
-import threading
+
+# Shared modules live one level up in "Tello Drone Control"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import control_protocol
+from tello_sim import create_tello
+from yaw_controller import YawPID
+from flight_recorder import FlightRecorder, session_path
+from video_relay import FanoutRelay
+from latency_trace import ControlTracer
+from stream_recorder import StreamRecorder
 
 # ----------------------------
 # UDP config
@@ -17,6 +28,8 @@ COMMAND_UDP_PORT = 5015      # Port to receive flight commands
 
 STREAM_UDP_HOST = "127.0.0.1"  # Where to send camera stream
 STREAM_UDP_PORT = 5001         # Port to forward camera stream to (for GStreamer/Unity)
+RELAY_CONTROL_PORT = 5002      # Add/remove extra stream subscribers at runtime (see video_relay.py)
+RELAY_CONTROL_HOST = "127.0.0.1"  # "0.0.0.0" lets any LAN host redirect the stream (no authentication)
 
 TELLO_VIDEO_PORT = 11111  # Tello's video output port
 BUFFER_SIZE = 65536       # 64KB buffer for UDP packets
@@ -24,9 +37,22 @@ BUFFER_SIZE = 65536       # 64KB buffer for UDP packets
 # ----------------------------
 # Rates (IMPORTANT)
 # ----------------------------
-CONTROL_HZ = 40
-RC_HZ = 20
-YAW_HZ = 20
+CONTROL_HZ = 40   # PID tick when no yaw packets arrive (packets step it immediately)
+RC_HZ = 20        # Max rate of send_rc_control (Tello drops faster commands)
+STATUS_INTERVAL = 5  # Seconds between status lines
+
+# ----------------------------
+# Latency tracing (yaw packet -> send_rc_control)
+# ----------------------------
+TRACE_LATENCY = True  # Cheap enough to leave on; send '4' on port 5015 to print it
+
+# ----------------------------
+# Flight recorder (one record per PID step, see flight_recorder.py)
+# and camera recording (segmented .h264 + keyframe index, see stream_recorder.py)
+# ----------------------------
+RECORD_FLIGHT = True
+RECORD_VIDEO = True
+RECORD_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "flights")
 
 # ----------------------------
 # PID (for yaw control)
@@ -47,6 +73,7 @@ INTEGRAL_LIMIT = 120
 # Velocity Control
 # ----------------------------
 BASE_VELOCITY = 20  # Base velocity for directional movement
+MAX_VELOCITY = 100  # Clamp for analog velocities from binary packets
 
 # ----------------------------
 # Angle unwrap
@@ -60,54 +87,429 @@ def unwrap_angle(prev, current):
     return current
 
 
-def main():
-    global KP, KI, KD
-
-    # Shared state for RC control thread
-    control_state = {
-        'fb_velocity': 0,
-        'lr_velocity': 0,
-        'yaw_cmd': 0,
-        'is_flying': False,
-        'running': True
-    }
-    state_lock = threading.Lock()
+# ----------------------------
+# UDP endpoint (asyncio datagram protocol)
+# ----------------------------
+class UdpEndpoint(asyncio.DatagramProtocol):
+    """Hands every datagram to `handler` as soon as the event loop sees it."""
+
+    def __init__(self, name, handler):
+        self.name = name
+        self.handler = handler
+
+    def datagram_received(self, data, addr):
+        self.handler(data, addr)
+
+    def error_received(self, exc):
+        print(f"[{self.name} UDP] Error: {exc}")
+
+
+# ----------------------------
+# Control plane
+# ----------------------------
+class ControlPlane:
+    """ Event-driven VR control loop.
+
+        Every UDP port is an asyncio datagram endpoint, so packets are handled the
+        moment they arrive instead of on a polling tick. A yaw packet wakes the PID
+        step right away and a new command wakes the RC sender, which still honours
+        the Tello's RC_HZ limit. Blocking SDK calls (takeoff/land/emergency) run
+        in the default executor so they never stall the loop; takeoff and land
+        one at a time from a queue, emergency at once, ahead of them.
+    """
+
+    def __init__(self, tello, relay=None, recorder=None):
+        self.tello = tello
+        self.relay = relay
+        self.recorder = recorder
+        self.running = True
+        self.is_flying = False
+        self.landing = False   # Hold zero RC from the land command until tello.land returns
+        self.emergencies = 0   # Emergency stops so far (a takeoff in progress checks it)
+
+        # Yaw state
+        self.prev_raw_udp = None
+        self.target_yaw = 0.0
+        self.yaw_packets = 0
+        self.telemetry = tello.telemetry  # Pushed state (tello_telemetry.py)
+        self.prev_raw_drone = self.telemetry.state.yaw
+        self.drone_yaw = self.prev_raw_drone
+        self.state_seq = self.telemetry.state.seq
+
+        # PID (measured dt: steps come from yaw packets, not a fixed tick)
+        self.pid = YawPID(KP, KI, KD, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                          deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT,
+                          max_cmd_step=MAX_CMD_STEP, cmd_smoothing=CMD_SMOOTHING)
+
+        # Velocity state (RC units, from text "FBRL" or binary analog input)
+        self.fb_input = 0
+        self.lr_input = 0
+        self.ud_input = 0
+
+        # Latest command for the RC sender
+        self.fb_velocity = 0
+        self.lr_velocity = 0
+        self.ud_velocity = 0
+        self.yaw_cmd = 0
+
+        # Binary protocol: one sequence/staleness filter per port. Flight
+        # commands are never dropped for arriving late, only as duplicates
+        self.yaw_filter = control_protocol.SequenceFilter()
+        self.velocity_filter = control_protocol.SequenceFilter()
+        self.command_filter = control_protocol.SequenceFilter(stale_after=None)
+
+        # Yaw packet -> RC send latency histograms
+        self.tracer = ControlTracer(enabled=TRACE_LATENCY)
+
+        # Loop primitives (created in run() so they bind to the running loop)
+        self.loop = None
+        self.yaw_event = None
+        self.rc_event = None
+        self.commands = None
 
     # ----------------------------
-    # UDP Socket for yaw input (non-blocking)
+    # Binary packets (auto-detected next to the text format)
     # ----------------------------
-    yaw_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    yaw_sock.bind((YAW_UDP_IP, YAW_UDP_PORT))
-    yaw_sock.setblocking(False)  # Non-blocking mode
-    print(f"Yaw UDP listener started on {YAW_UDP_IP}:{YAW_UDP_PORT}")
+    @staticmethod
+    def decode_binary(data, seq_filter):
+        """Returns the message if it is current, None if it must be dropped."""
+        msg = control_protocol.unpack(data)
+        if msg is None or not seq_filter.accept(msg):
+            return None
+        return msg
 
     # ----------------------------
-    # UDP Socket for velocity control (non-blocking)
+    # UDP yaw input
     # ----------------------------
-    velocity_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    velocity_sock.bind((VELOCITY_UDP_IP, VELOCITY_UDP_PORT))
-    velocity_sock.setblocking(False)  # Non-blocking mode
-    print(f"Velocity UDP listener started on {VELOCITY_UDP_IP}:{VELOCITY_UDP_PORT}")
+    def on_yaw(self, data, addr):
+        recv_ns = time.perf_counter_ns()
+        if control_protocol.is_binary(data):
+            msg = self.decode_binary(data, self.yaw_filter)
+            if msg is None:
+                return
+            raw = msg.yaw
+        else:
+            try:
+                raw = float(data.decode().strip())
+            except (ValueError, UnicodeDecodeError):
+                return
+
+        if self.prev_raw_udp is None:
+            self.prev_raw_udp = raw
+            self.target_yaw = raw
+        else:
+            raw = unwrap_angle(self.prev_raw_udp, raw)
+            self.target_yaw += (raw - self.prev_raw_udp)
+            self.prev_raw_udp = raw
+        self.yaw_packets += 1
+
+        self.tracer.target_updated(recv_ns)
+        self.yaw_event.set()
 
     # ----------------------------
-    # UDP Socket for flight commands (non-blocking)
+    # UDP velocity input
+    # Format: 4-digit string "FBRL" (Forward, Back, Left, Right)
+    # Example: "1000" = forward, "0100" = back, "0010" = left, "0001" = right
+    # Example: "0000" = stop all
+    # Binary packets carry analog fb/lr/ud velocities instead
     # ----------------------------
-    command_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    command_sock.bind((COMMAND_UDP_IP, COMMAND_UDP_PORT))
-    command_sock.setblocking(False)  # Non-blocking mode
-    print(f"Command UDP listener started on {COMMAND_UDP_IP}:{COMMAND_UDP_PORT}")
+    def on_velocity(self, data, addr):
+        if control_protocol.is_binary(data):
+            msg = self.decode_binary(data, self.velocity_filter)
+            if msg is None:
+                if self.velocity_filter.stale and (self.fb_input or self.lr_input or self.ud_input):
+                    # The stream is running late: stop rather than hold the last velocity
+                    self.fb_input = self.lr_input = self.ud_input = 0
+                    self.publish()
+                return
+            self.fb_input = int(max(-MAX_VELOCITY, min(MAX_VELOCITY, msg.fb)))
+            self.lr_input = int(max(-MAX_VELOCITY, min(MAX_VELOCITY, msg.lr)))
+            self.ud_input = int(max(-MAX_VELOCITY, min(MAX_VELOCITY, msg.ud)))
+            self.publish()
+            return
+
+        try:
+            command = data.decode().strip()
+        except UnicodeDecodeError:
+            return
+        if len(command) != 4 or not command.isdigit():
+            return
+
+        # Set velocities based on input
+        forward = BASE_VELOCITY if command[0] == "1" else 0
+        back = BASE_VELOCITY if command[1] == "1" else 0
+        left = BASE_VELOCITY if command[2] == "1" else 0
+        right = BASE_VELOCITY if command[3] == "1" else 0
+
+        self.fb_input = forward - back
+        self.lr_input = right - left
+        self.ud_input = 0
+        self.publish()
 
+    # ----------------------------
+    # UDP flight commands
+    # Commands: 1=takeoff, 2=land, 3=emergency, 4=print latency trace
+    # ----------------------------
+    def on_command(self, data, addr):
+        if control_protocol.is_binary(data):
+            msg = self.decode_binary(data, self.command_filter)
+            if msg is None:
+                return
+            command_num = msg.command
+        else:
+            try:
+                command_num = int(data.decode().strip())
+            except (ValueError, UnicodeDecodeError):
+                return  # Ignore invalid data
+
+        if command_num == 0:  # No-op / idle
+            return  # Ignore 0 (can be used as heartbeat)
+
+        if command_num == 4:  # Latency trace (not a flight command: answer now)
+            print("\n" + self.tracer.report())
+            return
+
+        if command_num == 3:  # Emergency: never waits behind a takeoff or land
+            self.emergency()
+            return
+
+        self.commands.put_nowait(command_num)
+
+    def emergency(self):
+        print("\n→ EMERGENCY STOP (3)!")
+        # Nothing queued before the stop may run after it
+        while not self.commands.empty():
+            self.commands.get_nowait()
+        self.emergencies += 1
+        self.is_flying = False
+        self.landing = False
+        future = self.loop.run_in_executor(None, self.tello.emergency)
+        future.add_done_callback(self.emergency_done)
+
+    @staticmethod
+    def emergency_done(future):
+        if future.exception() is not None:
+            print(f"→ Emergency stop failed: {future.exception()}")
+        else:
+            print("→ Emergency stop executed. Send '1' to takeoff again.")
+
+    async def command_worker(self):
+        """Runs flight commands one at a time, off the packet path."""
+        while self.running:
+            command_num = await self.commands.get()
+
+            if command_num == 1:  # Takeoff
+                if self.is_flying:
+                    print("\n→ Takeoff (1): Already in flight, ignoring")
+                    continue
+                print("\n→ Takeoff command (1) received!")
+                emergencies = self.emergencies
+                await self.loop.run_in_executor(None, self.tello.takeoff)
+                if self.emergencies != emergencies:
+                    continue  # Stopped while taking off
+                self.is_flying = True
+                self.rc_event.set()
+                print("→ Drone is now flying")
+                await asyncio.sleep(2)
+
+            elif command_num == 2:  # Land
+                if not self.is_flying:
+                    print("\n→ Land (2): Already on ground, ignoring")
+                    continue
+                print("\n→ Land command (2) received!")
+                # Stop all movement first; publish() keeps it at zero while landing
+                self.landing = True
+                self.pid.reset()
+                self.publish()
+                emergencies = self.emergencies
+                await asyncio.sleep(0.5)
+                if self.emergencies != emergencies:
+                    continue  # Already stopped
+                await self.loop.run_in_executor(None, self.tello.land)
+                self.is_flying = False
+                self.landing = False
+                self.pid.reset()   # Don't carry the landing's yaw error into the next flight
+                print("→ Drone has landed. Send '1' to takeoff again.")
+
+            else:
+                print(f"\n→ Unknown command number: {command_num}")
+
+    # ----------------------------
+    # PID
+    # ----------------------------
+    def pid_step(self):
+        step_ns = self.tracer.pid_started()
+
+        # Drone yaw from the latest state datagram (unwrapped once per datagram)
+        state = self.telemetry.state
+        if state.seq != self.state_seq:
+            raw = unwrap_angle(self.prev_raw_drone, state.yaw)
+            self.drone_yaw = raw
+            self.prev_raw_drone = raw
+            self.state_seq = state.seq
+
+        error = self.target_yaw - self.drone_yaw
+        self.pid.step(error)
+
+        self.publish()
+        self.tracer.command_published(step_ns)
+
+        if self.recorder is not None:
+            pid = self.pid
+            self.recorder.record(
+                time.monotonic(), pid.dt, self.target_yaw, self.drone_yaw, error,
+                pid.p_term, pid.i_term, pid.d_term, pid.last_cmd,
+                self.fb_velocity, self.lr_velocity, self.ud_velocity, self.yaw_cmd,
+                self.is_flying, state.seq, self.yaw_packets, self.yaw_filter.dropped,
+                self.relay.packet_count if self.relay else 0)
+
+    def on_state(self, state):
+        """Telemetry thread: fresh drone yaw wakes the PID step too."""
+        self.loop.call_soon_threadsafe(self.yaw_event.set)
+
+    async def pid_loop(self):
+        """Steps the PID on every yaw packet and state datagram, and at CONTROL_HZ
+        when both are idle."""
+        period = 1 / CONTROL_HZ
+        while self.running:
+            try:
+                await asyncio.wait_for(self.yaw_event.wait(), timeout=period)
+            except asyncio.TimeoutError:
+                pass
+            self.yaw_event.clear()
+            self.pid_step()
+
+    # ----------------------------
+    # RC sender (prevents drifting with continuous commands)
+    # ----------------------------
+    def publish(self):
+        """Update the command the RC sender will send next and wake it."""
+        if self.landing:
+            self.fb_velocity = self.lr_velocity = self.ud_velocity = self.yaw_cmd = 0
+            self.rc_event.set()
+            return
+        self.fb_velocity = self.fb_input
+        self.lr_velocity = self.lr_input
+        self.ud_velocity = self.ud_input
+        self.yaw_cmd = int(self.pid.last_cmd)
+        self.rc_event.set()
+
+    async def rc_sender(self):
+        """Sends the latest command as soon as it changes, never faster than RC_HZ,
+        and re-sends it every RC period so the drone keeps a steady stream."""
+        print(f"[RC Control] Task started - sending commands at up to {RC_HZ}Hz")
+        period = 1 / RC_HZ
+        last_send_time = 0.0
+        last_sent = None
+
+        while self.running:
+            try:
+                await asyncio.wait_for(self.rc_event.wait(), timeout=period)
+            except asyncio.TimeoutError:
+                pass
+            self.rc_event.clear()
+            wake_ns = time.perf_counter_ns()
+
+            command = (self.lr_velocity, self.fb_velocity, self.ud_velocity, self.yaw_cmd)
+            now = time.monotonic()
+            if command == last_sent and now - last_send_time < period:
+                self.tracer.command_discarded()
+                continue
+
+            # Rate limiting (Tello ignores RC commands sent faster than RC_HZ)
+            wait = last_send_time + period - now
+            if wait > 0:
+                await asyncio.sleep(wait)
+                command = (self.lr_velocity, self.fb_velocity, self.ud_velocity, self.yaw_cmd)
+
+            if self.landing:
+                command = (0, 0, 0, 0)
+
+            # Only send RC commands if drone is flying
+            if self.is_flying:
+                read_ns = self.tracer.command_read(wake_ns)
+                # Send RC control: (left_right, forward_back, up_down, yaw)
+                self.tello.send_rc_control(*command)
+                self.tracer.command_sent(read_ns)
+            else:
+                self.tracer.command_discarded()
+
+            last_sent = command
+            last_send_time = time.monotonic()
+
+        print("[RC Control] Task stopped")
+
+    # ----------------------------
+    # Status
+    # ----------------------------
+    async def status_loop(self):
+        while self.running:
+            await asyncio.sleep(STATUS_INTERVAL)
+            packet_count, bytes_relayed = self.relay.stats() if self.relay else (0, 0)
+            mb_relayed = bytes_relayed / (1024 * 1024)
+            battery = self.telemetry.state.bat
+            flight_status = "FLYING" if self.is_flying else "LANDED"
+            line = f"[{flight_status}] Battery:{battery}% | Yaw T:{self.target_yaw:5.1f}° D:{self.drone_yaw:5.1f}° | Vel FB:{self.fb_velocity:3d} LR:{self.lr_velocity:3d} | Video:{packet_count}pkts {mb_relayed:.1f}MB"
+            if self.relay is not None and self.relay.stream is not None:
+                line += f" {self.relay.stream.describe()}"
+
+            # Binary senders: one-way input latency and dropped datagrams
+            yaw_filter = self.yaw_filter
+            if yaw_filter.accepted or yaw_filter.dropped:
+                line += f" | Yaw in:{yaw_filter.latency * 1000:.1f}ms drop:{yaw_filter.dropped}"
+            line += f" | State age:{self.telemetry.age() * 1000:.0f}ms"
+            print(line)
+
+    # ----------------------------
+    # Run
+    # ----------------------------
+    async def run(self):
+        self.loop = asyncio.get_running_loop()
+        self.yaw_event = asyncio.Event()
+        self.rc_event = asyncio.Event()
+        self.commands = asyncio.Queue()
+
+        endpoints = [
+            ("Yaw", YAW_UDP_IP, YAW_UDP_PORT, self.on_yaw),
+            ("Velocity", VELOCITY_UDP_IP, VELOCITY_UDP_PORT, self.on_velocity),
+            ("Command", COMMAND_UDP_IP, COMMAND_UDP_PORT, self.on_command),
+        ]
+
+        transports = []
+        self.telemetry.subscribe(self.on_state)
+        try:
+            for name, host, port, handler in endpoints:
+                transport, _ = await self.loop.create_datagram_endpoint(
+                    lambda name=name, handler=handler: UdpEndpoint(name, handler),
+                    local_addr=(host, port))
+                transports.append(transport)
+                print(f"{name} UDP listener started on {host}:{port}")
+
+            await asyncio.gather(
+                self.pid_loop(),
+                self.rc_sender(),
+                self.command_worker(),
+                self.status_loop(),
+            )
+        finally:
+            self.running = False
+            self.telemetry.unsubscribe(self.on_state)
+            for transport in transports:
+                transport.close()
+
+
+def main():
     # ----------------------------
     # Tello
     # ----------------------------
-    tello = Tello()
+    tello = create_tello(telemetry=True)
     print("Connecting to drone...")
     tello.connect()
     print("Battery:", tello.get_battery(), "%")
 
     print("\nStarting video stream...")
     tello.streamon()
-    
+
     # Wait for stream to start
     time.sleep(2)
 
@@ -115,352 +517,86 @@ def main():
     # Video relay setup
     # ----------------------------
     print(f"\nSetting up video UDP relay...")
-    
+
     # Socket to receive from Tello
     recv_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     recv_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_SIZE)
     recv_socket.bind(('0.0.0.0', TELLO_VIDEO_PORT))
-    recv_socket.settimeout(1.0)  # 1 second timeout
-    
-    # Socket to forward to receiver
-    send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-    send_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, BUFFER_SIZE)
-    
-    packet_count = 0
-    bytes_relayed = 0
-    relay_active = True
-    
-    # Relay thread
-    def video_relay():
-        nonlocal packet_count, bytes_relayed, relay_active
-        print("Video relay thread started")
-        
-        while relay_active:
-            try:
-                # Receive packet from Tello
-                data, addr = recv_socket.recvfrom(BUFFER_SIZE)
-                
-                # Forward immediately to output port
-                send_socket.sendto(data, (STREAM_UDP_HOST, STREAM_UDP_PORT))
-                
-                packet_count += 1
-                bytes_relayed += len(data)
-                
-            except socket.timeout:
-                continue
-            except Exception as e:
-                if relay_active:
-                    print(f"[Video Relay] Error: {e}")
-                break
-        
-        print("Video relay thread stopped")
-    
-    # Start relay thread
-    relay_thread = threading.Thread(target=video_relay, daemon=True)
-    relay_thread.start()
-    
+
+    # Relay thread (batched, preallocated buffers), Unity/GStreamer is the first subscriber
+    relay = FanoutRelay(recv_socket, [("unity", (STREAM_UDP_HOST, STREAM_UDP_PORT))],
+                        control_port=RELAY_CONTROL_PORT, control_host=RELAY_CONTROL_HOST)
+    relay.start()
+
     print(f"Video relay active: Tello (UDP:{TELLO_VIDEO_PORT}) -> GStreamer (UDP:{STREAM_UDP_PORT})")
     print("\nYour GStreamer receiver can connect with:")
     print(f"  gst-launch-1.0 udpsrc port={STREAM_UDP_PORT} \\")
     print("    ! h264parse ! avdec_h264 \\")
-    print("    ! videoconvert ! autovideosink sync=false\n")
+    print("    ! videoconvert ! autovideosink sync=false")
+    print(f"Add more stream subscribers with: python video_relay.py SUB <port> [name]  (control UDP:{RELAY_CONTROL_PORT})\n")
 
     # ----------------------------
-    # RC Control Thread (prevents drifting with continuous commands)
+    # Control plane
     # ----------------------------
-    def rc_control_thread():
-        """Continuously send RC commands at steady rate to keep drone stable"""
-        print("[RC Control] Thread started - sending commands at 20Hz")
-        last_send_time = time.time()
-        
-        while control_state['running']:
-            now = time.time()
-            
-            # Rate limiting
-            if now - last_send_time >= 1 / RC_HZ:
-                with state_lock:
-                    is_flying = control_state['is_flying']
-                    fb = control_state['fb_velocity']
-                    lr = control_state['lr_velocity']
-                    yaw = control_state['yaw_cmd']
-                
-                # Only send RC commands if drone is flying
-                if is_flying:
-                    # Send RC control: (left_right, forward_back, up_down, yaw)
-                    tello.send_rc_control(lr, fb, 0, yaw)
-                
-                last_send_time = now
-            
-            time.sleep(0.01)  # Small sleep to prevent CPU spinning
-        
-        # Stop the drone when thread exits
-        tello.send_rc_control(0, 0, 0, 0)
-        print("[RC Control] Thread stopped")
-    
-    # Start RC control thread
-    rc_thread = threading.Thread(target=rc_control_thread, daemon=True)
-    rc_thread.start()
+    session = os.path.splitext(session_path(RECORD_DIR))[0]
+    recorder = None
+    if RECORD_FLIGHT:
+        recorder = FlightRecorder(session + ".fdr").start()
+        print(f"Recording flight data to {recorder.path}")
+    if RECORD_VIDEO:
+        relay.add(StreamRecorder(session + "_video").start())
+        print(f"Recording camera stream to {session}_video_NNN.h264")
+
+    plane = ControlPlane(tello, relay=relay, recorder=recorder)
 
-    # ----------------------------
-    # Flight state tracking
-    # ----------------------------
-    is_flying = False  # Track if drone is currently in the air
-    
     print("\nDrone ready. Waiting for commands...")
     print("Send '1' on port 5015 to takeoff")
     print("Video stream is active")
 
-    # ----------------------------
-    # State
-    # ----------------------------
-    prev_raw_udp = None
-    target_yaw = 0.0
-
-    prev_raw_drone = tello.get_yaw()
-    drone_yaw = prev_raw_drone
-
-    prev_error = 0.0
-    integral = 0.0
-    last_cmd = 0.0
-
-    # Velocity state
-    forward_velocity = 0
-    back_velocity = 0
-    left_velocity = 0
-    right_velocity = 0
-
-    # Timers
-    last_yaw_time = 0
-    last_status_time = 0
-
-    running = True
-    
     print("\nSystem active! Video streaming to Unity/GStreamer")
     print("Send commands to control the drone:")
     print("  Port 5000: Yaw control")
     print("  Port 5005: Velocity control")
-    print("  Port 5015: Flight commands (1=takeoff, 2=land)")
+    print("  Port 5015: Flight commands (1=takeoff, 2=land, 3=emergency, 4=latency trace)")
     print("Press Ctrl+C to stop.\n")
-    
-    try:
-        while running:
-            now = time.time()
-            
-            # Sleep briefly to prevent CPU spinning
-            time.sleep(0.01)  # 100Hz loop is sufficient for reading UDP and computing
-
-            # ----------------------------
-            # UDP yaw input (NON-BLOCKING)
-            # ----------------------------
-            try:
-                while True:  # Process all available packets
-                    data, addr = yaw_sock.recvfrom(1024)
-                    try:
-                        line = data.decode().strip()
-                        raw = float(line)
-
-                        if prev_raw_udp is None:
-                            prev_raw_udp = raw
-                            target_yaw = raw
-                        else:
-                            raw = unwrap_angle(prev_raw_udp, raw)
-                            target_yaw += (raw - prev_raw_udp)
-                            prev_raw_udp = raw
-                    except ValueError:
-                        pass
-            except BlockingIOError:
-                pass
-
-            # ----------------------------
-            # UDP velocity input (NON-BLOCKING)
-            # Format: 4-digit string "FBRL" (Forward, Back, Left, Right)
-            # Example: "1000" = forward, "0100" = back, "0010" = left, "0001" = right
-            # Example: "0000" = stop all
-            # ----------------------------
-            try:
-                while True:  # Process all available packets (keep latest)
-                    data, addr = velocity_sock.recvfrom(1024)
-                    try:
-                        command = data.decode().strip()
-                        if len(command) == 4 and command.isdigit():
-                            # Parse the 4 digits
-                            forward = int(command[0])
-                            back = int(command[1])
-                            left = int(command[2])
-                            right = int(command[3])
-                            
-                            # Set velocities based on input
-                            forward_velocity = BASE_VELOCITY if forward == 1 else 0
-                            back_velocity = BASE_VELOCITY if back == 1 else 0
-                            left_velocity = BASE_VELOCITY if left == 1 else 0
-                            right_velocity = BASE_VELOCITY if right == 1 else 0
-                    except (ValueError, IndexError):
-                        pass
-            except BlockingIOError:
-                pass
-
-            # ----------------------------
-            # UDP flight commands (NON-BLOCKING)
-            # Commands: 1=takeoff, 2=land, 3=emergency
-            # ----------------------------
-            try:
-                while True:  # Process all available packets
-                    data, addr = command_sock.recvfrom(1024)
-                    try:
-                        command_str = data.decode().strip()
-                        command_num = int(command_str)
-                        
-                        if command_num == 1:  # Takeoff
-                            if is_flying:
-                                print("\n→ Takeoff (1): Already in flight, ignoring")
-                            else:
-                                print("\n→ Takeoff command (1) received!")
-                                tello.takeoff()
-                                is_flying = True
-                                with state_lock:
-                                    control_state['is_flying'] = True
-                                print("→ Drone is now flying")
-                                time.sleep(2)
-                        
-                        elif command_num == 2:  # Land
-                            if is_flying:
-                                print("\n→ Land command (2) received!")
-                                # Stop all movement first
-                                with state_lock:
-                                    control_state['fb_velocity'] = 0
-                                    control_state['lr_velocity'] = 0
-                                    control_state['yaw_cmd'] = 0
-                                time.sleep(0.5)
-                                tello.land()
-                                is_flying = False
-                                with state_lock:
-                                    control_state['is_flying'] = False
-                                print("→ Drone has landed. Send '1' to takeoff again.")
-                            else:
-                                print("\n→ Land (2): Already on ground, ignoring")
-                        
-                        elif command_num == 3:  # Emergency
-                            print("\n→ EMERGENCY STOP (3)!")
-                            tello.emergency()
-                            is_flying = False
-                            with state_lock:
-                                control_state['is_flying'] = False
-                            print("→ Emergency stop executed. Send '1' to takeoff again.")
-                        
-                        elif command_num == 0:  # No-op / idle
-                            pass  # Ignore 0 (can be used as heartbeat)
-                        
-                        else:
-                            print(f"\n→ Unknown command number: {command_num}")
-                            
-                    except (ValueError, UnicodeDecodeError):
-                        pass  # Ignore invalid data
-            except BlockingIOError:
-                pass
 
-            # ----------------------------
-            # Drone yaw (rate-limited)
-            # ----------------------------
-            if now - last_yaw_time > 1 / YAW_HZ:
-                raw = tello.get_yaw()
-                raw = unwrap_angle(prev_raw_drone, raw)
-                drone_yaw = raw
-                prev_raw_drone = raw
-                last_yaw_time = now
-
-            # ----------------------------
-            # PID
-            # ----------------------------
-            error = target_yaw - drone_yaw
-            derivative = (error - prev_error) * CONTROL_HZ
-            prev_error = error
-
-            integral += error / CONTROL_HZ
-            integral = max(-INTEGRAL_LIMIT, min(INTEGRAL_LIMIT, integral))
-
-            cmd = KP * error + KD * derivative + KI * integral
-
-            if abs(error) < DEADBAND:
-                cmd = 0
-                integral *= 0.9
-
-            cmd = max(-MAX_SPEED, min(MAX_SPEED, cmd))
-
-            if cmd > 0:
-                cmd = max(MIN_SPEED, cmd)
-            elif cmd < 0:
-                cmd = min(-MIN_SPEED, cmd)
-
-            if cmd > last_cmd + MAX_CMD_STEP:
-                cmd = last_cmd + MAX_CMD_STEP
-            elif cmd < last_cmd - MAX_CMD_STEP:
-                cmd = last_cmd - MAX_CMD_STEP
-
-            cmd = (1 - CMD_SMOOTHING) * last_cmd + CMD_SMOOTHING * cmd
-            last_cmd = cmd
-
-            # ----------------------------
-            # Update control state for RC thread
-            # ----------------------------
-            # Calculate net forward/back and left/right velocities
-            fb_velocity = forward_velocity - back_velocity
-            lr_velocity = right_velocity - left_velocity
-            
-            # Update shared state (RC thread will send these values)
-            with state_lock:
-                control_state['fb_velocity'] = fb_velocity
-                control_state['lr_velocity'] = lr_velocity
-                control_state['yaw_cmd'] = int(cmd)
-            
-            # Print status every 5 seconds
-            if now - last_status_time > 5:
-                mb_relayed = bytes_relayed / (1024 * 1024)
-                fb_vel = forward_velocity - back_velocity
-                lr_vel = right_velocity - left_velocity
-                battery = tello.get_battery()
-                flight_status = "FLYING" if is_flying else "LANDED"
-                print(f"[{flight_status}] Battery:{battery}% | Yaw T:{target_yaw:5.1f}° D:{drone_yaw:5.1f}° | Vel FB:{fb_vel:3d} LR:{lr_vel:3d} | Video:{packet_count}pkts {mb_relayed:.1f}MB")
-                last_status_time = now
-    
+    try:
+        asyncio.run(plane.run())
     except KeyboardInterrupt:
         print("\n\nStopping (Ctrl+C detected)...")
-        running = False
 
     # ----------------------------
     # Cleanup
     # ----------------------------
     print("\nCleaning up...")
-    
-    # Stop control state
-    with state_lock:
-        control_state['running'] = False
-        control_state['fb_velocity'] = 0
-        control_state['lr_velocity'] = 0
-        control_state['yaw_cmd'] = 0
-    
-    # Wait for threads to finish
-    relay_active = False
-    relay_thread.join(timeout=2)
-    rc_thread.join(timeout=2)
-    
+    plane.running = False
+
+    # Wait for relay thread to finish
+    relay.stop()
+
+    # Stop the drone
+    tello.send_rc_control(0, 0, 0, 0)
+
+    if TRACE_LATENCY:
+        print(plane.tracer.report())
+
+    if recorder is not None:
+        recorder.close()
+        print(f"Flight data: {recorder.describe()} (python flight_recorder.py info <file>)")
+
     # Land if still flying
-    if is_flying:
+    if plane.is_flying:
         print("Landing drone...")
-        tello.send_rc_control(0, 0, 0, 0)
         tello.land()
     else:
         print("Drone already on ground")
-    
+
     print("Stopping video stream...")
     tello.streamoff()
     tello.end()
-    
-    yaw_sock.close()
-    velocity_sock.close()
-    command_sock.close()
+
     recv_socket.close()
-    send_socket.close()
-    
+
     print("Done.")
 
 
@@ -1,7 +1,13 @@
-from djitellopy import Tello
+import os
+import sys
 import time
 import socket
-import threading
+
+# Shared modules live one level up in "Tello Drone Control"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tello_sim import create_tello
+
+from video_relay import RelayEngine
 
 # ----------------------------
 # Stream config
@@ -16,7 +22,7 @@ def main():
     # ----------------------------
     # Tello
     # ----------------------------
-    tello = Tello()
+    tello = create_tello()
     print("Connecting to drone...")
     tello.connect()
     print("Battery:", tello.get_battery(), "%")
@@ -42,45 +48,14 @@ def main():
     recv_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     recv_socket.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, BUFFER_SIZE)
     recv_socket.bind(('0.0.0.0', TELLO_VIDEO_PORT))
-    recv_socket.settimeout(1.0)  # 1 second timeout for checking stop condition
     
     # Socket to forward to receiver
     send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
     send_socket.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, BUFFER_SIZE)
     
-    packet_count = 0
-    bytes_relayed = 0
-    relay_active = True
-    
-    # Relay thread
-    def udp_relay():
-        nonlocal packet_count, bytes_relayed, relay_active
-        print("UDP relay thread started")
-        
-        while relay_active:
-            try:
-                # Receive packet from Tello (blocking with timeout)
-                data, addr = recv_socket.recvfrom(BUFFER_SIZE)
-                
-                # Forward immediately to output port (zero processing)
-                send_socket.sendto(data, (UDP_HOST, UDP_PORT))
-                
-                packet_count += 1
-                bytes_relayed += len(data)
-                
-            except socket.timeout:
-                # Timeout is normal, just continue
-                continue
-            except Exception as e:
-                if relay_active:  # Only print if we haven't stopped intentionally
-                    print(f"[Relay] Error: {e}")
-                break
-        
-        print("UDP relay thread stopped")
-    
-    # Start relay thread
-    relay_thread = threading.Thread(target=udp_relay, daemon=True)
-    relay_thread.start()
+    # Relay thread (batched recv_into into preallocated buffers)
+    relay = RelayEngine(recv_socket, (UDP_HOST, UDP_PORT), send_socket, name="UDP relay")
+    relay.start()
     
     # Give relay a moment to start
     time.sleep(0.5)
@@ -90,7 +65,7 @@ def main():
     print("\nZERO OVERHEAD MODE:")
     print("  - Raw packet forwarding (no processing)")
     print("  - No compression/decompression")
-    print("  - No buffering or delays")
+    print("  - No per-packet allocation (preallocated, batched receive)")
     print("  - Same quality as Tello's original stream")
     print("\nYour GStreamer receiver can now connect with:")
     print(f"  gst-launch-1.0 udpsrc port={UDP_PORT} \\")
@@ -110,12 +85,13 @@ def main():
             time.sleep(5)
             
             # Check if relay thread is still alive
-            if not relay_thread.is_alive():
+            if not relay.is_alive():
                 print("\nWARNING: Relay thread died unexpectedly!")
                 break
             
             # Print status
             runtime = int(time.time() - start_time)
+            packet_count, bytes_relayed = relay.stats()
             packets_per_sec = (packet_count - last_packet_count) / 5.0
             mbps = (bytes_relayed * 8) / (runtime * 1_000_000) if runtime > 0 else 0
             
@@ -134,9 +110,8 @@ def main():
     print("\nCleaning up...")
     
     # Stop relay thread
-    relay_active = False
     print("Stopping UDP relay...")
-    relay_thread.join(timeout=2)
+    relay.stop()
     
     # Close sockets
     recv_socket.close()
@@ -146,6 +121,7 @@ def main():
     tello.streamoff()
     tello.end()
     
+    packet_count, bytes_relayed = relay.stats()
     print(f"\nSession stats:")
     print(f"  Total packets relayed: {packet_count}")
     print(f"  Total data relayed: {bytes_relayed / 1_000_000:.2f} MB")
@@ -0,0 +1,212 @@
+"""
+Incremental H.264 Annex-B parser for the relayed Tello stream.
+
+The Tello sends a raw H.264 byte stream cut into ~1460-byte datagrams, with
+no framing. StreamParser scans each datagram for start codes (00 00 01) in
+place - start codes split across two datagrams are caught by probing the last
+few bytes of the previous one - and never reassembles frames. From the NAL
+unit types it:
+
+- caches the latest SPS/PPS + IDR keyframe ("keyframe group"), so a new
+  subscriber can be primed and decode its first frame immediately
+- counts frames (slices with first_mb_in_slice == 0) for frame-level stats:
+  frames/sec, keyframe interval and bytes per frame
+
+Only keyframe datagrams are copied (for the cache); everything else is read
+straight out of the relay's receive buffers.
+"""
+
+import time
+
+START_CODE = b"\x00\x00\x01"
+FULL_START_CODE = b"\x00\x00\x00\x01"
+PROBE_BYTES = 4  # Bytes kept from the previous datagram to catch split start codes
+
+# NAL unit types
+NAL_SLICE = 1
+NAL_IDR = 5
+NAL_SEI = 6
+NAL_SPS = 7
+NAL_PPS = 8
+NAL_AUD = 9
+
+FPS_SMOOTHING = 0.1        # EMA weight for the frame interval
+MAX_GROUP_BYTES = 1 << 20  # Give up caching a keyframe group larger than this
+
+
+class StreamParser:
+    """ Feed every relayed datagram with feed(buf, length).
+
+        priming_packets() returns the cached keyframe group (SPS, PPS, IDR ...)
+        as a list of datagram-sized bytes, ready to send to a new subscriber.
+
+        After each feed(), `nals` lists the NAL units that start in that
+        datagram as (header offset, nal type), in stream order. The offset is
+        -1..2 for a start code split across the previous datagram.
+    """
+
+    def __init__(self):
+        self.tail = b""          # Last PROBE_BYTES of the previous datagram
+        self.position = 0        # Absolute stream offset of the current datagram
+        self.nals = []           # (header offset, nal type) in the last datagram
+
+        # Keyframe cache
+        self.group = None        # Keyframe group being collected (list of bytes)
+        self.group_bytes = 0
+        self.keyframe = []       # Last complete keyframe group
+        self.in_keyframe = False  # Inside SPS/PPS/IDR, before the next P-frame
+        self.group_started = False  # Group began in the current datagram
+        self.group_offset = 0       # ... at this header offset
+
+        # Frame stats
+        self.frames = 0
+        self.keyframes = 0
+        self.frame_start_pos = None
+        self.frame_time = None
+        self.frame_interval = 0.0
+        self.last_frame_bytes = 0
+        self.avg_frame_bytes = 0.0
+        self.frames_since_keyframe = 0
+        self.keyframe_interval = 0    # Frames between the last two IDRs
+        self.keyframe_time = None
+        self.keyframe_period = 0.0    # Seconds between the last two IDRs
+        self.last_keyframe_bytes = 0
+
+    # ----------------------------
+    # Parsing
+    # ----------------------------
+    def feed(self, buf, length, now=None):
+        """Scan one datagram. `buf` is a bytes/bytearray (e.g. a relay slot)."""
+        if now is None:
+            now = time.monotonic()
+
+        tail = self.tail
+        tail_len = len(tail)
+        self.group_started = False
+        self.nals = []
+
+        # Start codes beginning in the previous datagram's last bytes
+        if tail_len:
+            probe = tail + bytes(buf[:PROBE_BYTES])
+            p = probe.find(START_CODE)
+            while 0 <= p < tail_len:
+                header = p + 3
+                if header + 1 < len(probe):
+                    # Offset of the NAL header inside this datagram (0..3)
+                    self.on_nal(probe[header], probe[header + 1], buf, length,
+                                header - tail_len, now, split=tail_len - p)
+                p = probe.find(START_CODE, p + 1)
+
+        # Start codes fully inside this datagram (with header and next byte)
+        i = buf.find(START_CODE, 0, length)
+        while i != -1 and i + 4 < length:
+            self.on_nal(buf[i + 3], buf[i + 4], buf, length, i + 3, now)
+            i = buf.find(START_CODE, i + 3, length)
+
+        # Keep collecting the keyframe group
+        if self.in_keyframe and not self.group_started:
+            self.append_group(bytes(buf[:length]))
+
+        self.tail = bytes(buf[max(0, length - PROBE_BYTES):length])
+        self.position += length
+
+    def on_nal(self, header, next_byte, buf, length, offset, now, split=0):
+        """Handle one NAL start. `offset` is the header index in `buf` (may be
+        negative when the header itself is in the previous datagram)."""
+        nal_type = header & 0x1F
+        self.nals.append((offset, nal_type))
+
+        if nal_type in (NAL_SPS, NAL_PPS, NAL_IDR) and not self.in_keyframe:
+            # A new keyframe group: start at this NAL, dropping the tail of the
+            # previous frame that shares the datagram
+            if offset < 0:
+                chunk = FULL_START_CODE + self.tail[offset:] + bytes(buf[:length])
+            else:
+                chunk = FULL_START_CODE + bytes(buf[offset:length])
+            self.in_keyframe = True
+            self.group = []
+            self.group_bytes = 0
+            self.group_started = True
+            self.group_offset = offset
+            self.append_group(chunk)
+
+        elif nal_type == NAL_SLICE and self.in_keyframe:
+            # First P-frame after the keyframe: the group is complete
+            self.finish_group(buf, length, offset, split)
+
+        if nal_type in (NAL_SLICE, NAL_IDR) and next_byte & 0x80:
+            # first_mb_in_slice == 0 (ue(v) "1" bit): a new frame starts here
+            self.on_frame(nal_type == NAL_IDR, self.position + offset - 4, now)
+
+    def append_group(self, chunk):
+        self.group.append(chunk)
+        self.group_bytes += len(chunk)
+        if self.group_bytes > MAX_GROUP_BYTES:
+            # Not a sane keyframe (lost P-frame start?): stop collecting
+            self.group = None
+            self.in_keyframe = False
+
+    def finish_group(self, buf, length, offset, split):
+        group = self.group
+        self.in_keyframe = False
+        self.group = None
+        if not group:
+            return
+        start = offset - 3  # Start code of the P-frame slice in this datagram
+        if self.group_started:
+            # Whole group inside this datagram: cut it at the P-frame start code
+            group[-1] = group[-1][:len(group[-1]) - (length - start)]
+        elif start > 0:
+            # IDR tail that shares the datagram with the next frame
+            group.append(bytes(buf[:start]))
+        elif split and not self.group_started:
+            # Start code began in the previous datagram: trim its prefix bytes
+            group[-1] = group[-1][:-split]
+        self.keyframe = [chunk for chunk in group if chunk]
+        self.last_keyframe_bytes = sum(len(chunk) for chunk in group)
+
+    def on_frame(self, is_keyframe, position, now):
+        if self.frame_start_pos is not None:
+            self.last_frame_bytes = position - self.frame_start_pos
+            self.avg_frame_bytes += FPS_SMOOTHING * (self.last_frame_bytes - self.avg_frame_bytes)
+        if self.frame_time is not None:
+            interval = now - self.frame_time
+            if self.frame_interval:
+                self.frame_interval += FPS_SMOOTHING * (interval - self.frame_interval)
+            else:
+                self.frame_interval = interval
+        self.frame_start_pos = position
+        self.frame_time = now
+        self.frames += 1
+
+        if is_keyframe:
+            if self.keyframes:
+                self.keyframe_interval = self.frames_since_keyframe
+                self.keyframe_period = now - self.keyframe_time
+            self.keyframes += 1
+            self.keyframe_time = now
+            self.frames_since_keyframe = 0
+        self.frames_since_keyframe += 1
+
+    # ----------------------------
+    # Output
+    # ----------------------------
+    def priming_packets(self):
+        """Latest SPS/PPS/IDR as datagrams (empty until the first keyframe)."""
+        return list(self.keyframe)
+
+    def stats(self):
+        return {
+            "frames": self.frames,
+            "fps": 1.0 / self.frame_interval if self.frame_interval > 0 else 0.0,
+            "keyframes": self.keyframes,
+            "keyframe_interval": self.keyframe_interval,
+            "keyframe_period": self.keyframe_period,
+            "avg_frame_bytes": self.avg_frame_bytes,
+            "keyframe_bytes": self.last_keyframe_bytes,
+        }
+
+    def describe(self):
+        s = self.stats()
+        return (f"{s['fps']:.1f}fps GOP:{s['keyframe_interval']}f/{s['keyframe_period']:.1f}s "
+                f"frame:{s['avg_frame_bytes'] / 1024:.1f}KB key:{s['keyframe_bytes'] / 1024:.1f}KB")
@@ -0,0 +1,189 @@
+"""
+Low-overhead latency tracing for the VR yaw control path.
+
+A yaw packet is timestamped (time.perf_counter_ns) at each hop on its way to
+tello.send_rc_control, and every hop-to-hop interval is recorded into an
+HDR-style log-linear histogram:
+
+    receive     packet receipt       -> target_yaw updated
+    target      target_yaw updated   -> PID step starts (event wake)
+    pid         PID step starts      -> command published to the RC sender
+    handoff     command published    -> RC sender wakes
+    rc_gate     RC sender wakes      -> command read (waiting out the RC_HZ gate)
+    send        command read         -> send_rc_control returned
+    end_to_end  packet receipt       -> send_rc_control returned
+
+Recording is a handful of integer operations and one list increment, so it
+can stay on during real flights. Call report() (or send command 4 to
+VR_Drone.py) to print p50/p99/p99.9/max for every stage.
+"""
+
+import time
+
+# ----------------------------
+# HDR-style histogram
+# ----------------------------
+SUB_BUCKET_BITS = 5              # 32 sub-buckets per power of two: ~3% precision
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 32                # Values up to ~2**37 ns (~2 minutes)
+
+STAGES = ("receive", "target", "pid", "handoff", "rc_gate", "send", "end_to_end")
+
+
+class LatencyHistogram:
+    """ Log-linear histogram of nanosecond values (fixed memory, O(1) record).
+
+        Values below 2 * SUB_BUCKETS are exact; above that each power-of-two
+        range is split into SUB_BUCKETS linear buckets, as in HdrHistogram.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (SUB_BUCKETS * (MAX_EXPONENT + 2))
+        self.count = 0
+        self.total = 0
+        self.max = 0
+
+    @staticmethod
+    def index(value):
+        if value < 2 * SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - SUB_BUCKET_BITS - 1
+        return (shift + 1) * SUB_BUCKETS + (value >> shift) - SUB_BUCKETS
+
+    @staticmethod
+    def value_at(index):
+        """Upper bound of bucket `index`."""
+        if index < 2 * SUB_BUCKETS:
+            return index
+        shift = index // SUB_BUCKETS - 1
+        return ((index % SUB_BUCKETS + SUB_BUCKETS + 1) << shift) - 1
+
+    def record(self, value):
+        if value < 0:
+            value = 0
+        index = self.index(value)
+        if index >= len(self.counts):
+            index = len(self.counts) - 1
+        self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, p):
+        if not self.count:
+            return 0
+        target = max(1, int(self.count * p / 100 + 0.5))
+        seen = 0
+        for index, n in enumerate(self.counts):
+            seen += n
+            if seen >= target:
+                return min(self.value_at(index), self.max)
+        return self.max
+
+    def mean(self):
+        return self.total / self.count if self.count else 0.0
+
+    def reset(self):
+        self.__init__()
+
+
+# ----------------------------
+# Control path tracer
+# ----------------------------
+class ControlTracer:
+    """ Follows the newest yaw input through the control path.
+
+        Only timestamps are stored per hop; if several packets arrive before
+        the PID step, the oldest unconsumed one is traced (worst case).
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.hist = {name: LatencyHistogram() for name in STAGES}
+        self.started = time.monotonic()
+
+        self.recv_ns = 0       # Oldest packet not yet consumed by a PID step
+        self.target_ns = 0
+        self.pub_recv_ns = 0   # Packet carried by the published command
+        self.pub_ns = 0
+
+    # Hooks, in path order
+    def target_updated(self, recv_ns):
+        if not self.enabled:
+            return
+        now = time.perf_counter_ns()
+        self.hist["receive"].record(now - recv_ns)
+        if not self.recv_ns:
+            self.recv_ns = recv_ns
+            self.target_ns = now
+
+    def pid_started(self):
+        """Returns the step start time to pass to command_published()."""
+        if not self.enabled or not self.recv_ns:
+            return 0
+        now = time.perf_counter_ns()
+        self.hist["target"].record(now - self.target_ns)
+        return now
+
+    def command_published(self, step_ns):
+        if not step_ns:
+            return
+        now = time.perf_counter_ns()
+        self.hist["pid"].record(now - step_ns)
+        self.pub_recv_ns = self.recv_ns
+        self.pub_ns = now
+        self.recv_ns = 0
+
+    def command_read(self, wake_ns):
+        """RC sender read the command. Returns the read time for command_sent()."""
+        if not self.enabled or not self.pub_ns:
+            return 0
+        now = time.perf_counter_ns()
+        # Published while the sender was already waiting out the gate: no handoff
+        wake_ns = max(wake_ns, self.pub_ns)
+        self.hist["handoff"].record(wake_ns - self.pub_ns)
+        self.hist["rc_gate"].record(now - wake_ns)
+        return now
+
+    def command_discarded(self):
+        """The published command was not sent (unchanged, or not flying)."""
+        self.pub_ns = 0
+
+    def command_sent(self, read_ns):
+        if not read_ns:
+            return
+        now = time.perf_counter_ns()
+        self.hist["send"].record(now - read_ns)
+        self.hist["end_to_end"].record(now - self.pub_recv_ns)
+        self.pub_ns = 0
+
+    # ----------------------------
+    # Output
+    # ----------------------------
+    def summary(self):
+        return {
+            name: {
+                "count": h.count,
+                "p50_ms": h.percentile(50) / 1e6,
+                "p99_ms": h.percentile(99) / 1e6,
+                "p999_ms": h.percentile(99.9) / 1e6,
+                "max_ms": h.max / 1e6,
+                "mean_ms": h.mean() / 1e6,
+            }
+            for name, h in self.hist.items()
+        }
+
+    def report(self):
+        elapsed = time.monotonic() - self.started
+        lines = [f"Control latency ({elapsed:.0f}s window, ms)",
+                 f"  {'stage':<11} {'count':>7} {'p50':>8} {'p99':>8} {'p99.9':>8} {'max':>8}"]
+        for name, s in self.summary().items():
+            lines.append(f"  {name:<11} {s['count']:>7} {s['p50_ms']:8.3f} {s['p99_ms']:8.3f} "
+                         f"{s['p999_ms']:8.3f} {s['max_ms']:8.3f}")
+        return "\n".join(lines)
+
+    def reset(self):
+        for h in self.hist.values():
+            h.reset()
+        self.started = time.monotonic()
@@ -0,0 +1,175 @@
+"""
+Loopback benchmark for the video relay: packets/sec and forward latency.
+
+Runs a sender that replays Tello-like traffic (1460-byte datagrams, with IDR
+bursts) into the relay and a sink that timestamps every forwarded packet.
+Compares the original recvfrom()/sendto() loop against RelayEngine.
+
+    python relay_bench.py [--packets 200000] [--burst 40] [--rate 0]
+
+--rate 0 sends as fast as possible (throughput); a rate in packets/sec paces
+the sender so the latency numbers reflect a realistic stream.
+"""
+
+import argparse
+import socket
+import struct
+import threading
+import time
+
+from video_relay import RelayEngine
+
+HOST = "127.0.0.1"
+RELAY_PORT = 16111
+SINK_PORT = 16001
+PACKET_SIZE = 1460
+BUFFER_SIZE = 65536
+SOCKET_BUFFER = 4 * 1024 * 1024
+
+STAMP = struct.Struct("<Qq")  # sequence, perf_counter_ns at send
+
+
+# ----------------------------
+# Original relay loop (for comparison)
+# ----------------------------
+class LegacyRelay:
+    def __init__(self, recv_socket, destination):
+        self.recv_socket = recv_socket
+        self.destination = destination
+        self.send_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.packet_count = 0
+        self.bytes_relayed = 0
+        self.active = False
+
+    def run(self):
+        self.recv_socket.settimeout(0.5)
+        while self.active:
+            try:
+                data, addr = self.recv_socket.recvfrom(BUFFER_SIZE)
+                self.send_socket.sendto(data, self.destination)
+                self.packet_count += 1
+                self.bytes_relayed += len(data)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.active = False
+        self.thread.join(timeout=2)
+
+
+# ----------------------------
+# Helpers
+# ----------------------------
+def udp_socket(port=None):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFFER)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFFER)
+    if port is not None:
+        sock.bind((HOST, port))
+    return sock
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def sink(sock, expected, latencies, done):
+    sock.settimeout(1.0)
+    buf = bytearray(BUFFER_SIZE)
+    received = 0
+    while received < expected:
+        try:
+            n = sock.recv_into(buf)
+        except socket.timeout:
+            break
+        now = time.perf_counter_ns()
+        if n < STAMP.size:
+            continue  # Not one of ours (the buffer would still hold the last stamp)
+        seq, sent = STAMP.unpack_from(buf)
+        latencies.append(now - sent)
+        received += 1
+    done.append(received)
+
+
+def send_traffic(sock, packets, burst, rate):
+    payload = bytearray(PACKET_SIZE)
+    destination = (HOST, RELAY_PORT)
+    interval = burst / rate if rate else 0.0
+    next_burst = time.perf_counter()
+    seq = 0
+    while seq < packets:
+        # One IDR-like burst of back-to-back datagrams
+        for _ in range(min(burst, packets - seq)):
+            STAMP.pack_into(payload, 0, seq, time.perf_counter_ns())
+            sock.sendto(payload, destination)
+            seq += 1
+        if interval:
+            next_burst += interval
+            delay = next_burst - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+
+
+def run_case(name, make_relay, packets, burst, rate):
+    recv_socket = udp_socket(RELAY_PORT)
+    sink_socket = udp_socket(SINK_PORT)
+    sender = udp_socket()
+
+    relay = make_relay(recv_socket, (HOST, SINK_PORT)).start()
+    time.sleep(0.1)
+
+    latencies = []
+    done = []
+    sink_thread = threading.Thread(target=sink, args=(sink_socket, packets, latencies, done))
+    sink_thread.start()
+
+    start = time.perf_counter()
+    cpu_start = time.process_time()
+    send_traffic(sender, packets, burst, rate)
+    sink_thread.join()
+    elapsed = time.perf_counter() - start
+    cpu = time.process_time() - cpu_start
+
+    relay.stop()
+    for sock in (recv_socket, sink_socket, sender):
+        sock.close()
+
+    latencies.sort()
+    received = done[0] if done else 0
+    print(f"{name:8s} | {received / elapsed:10.0f} pkt/s | "
+          f"lost {packets - received:6d} | "
+          f"p50 {percentile(latencies, 50) / 1000:7.1f} us | "
+          f"p99 {percentile(latencies, 99) / 1000:7.1f} us | "
+          f"max {(latencies[-1] if latencies else 0) / 1000:8.1f} us | "
+          f"cpu {cpu / max(received, 1) * 1e6:5.2f} us/pkt")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video relay benchmark")
+    parser.add_argument("--packets", type=int, default=200000)
+    parser.add_argument("--burst", type=int, default=40, help="Datagrams per IDR-like burst")
+    parser.add_argument("--rate", type=float, default=0, help="Packets/sec (0 = unpaced)")
+    args = parser.parse_args()
+
+    print(f"Relay benchmark: {args.packets} x {PACKET_SIZE}B, burst {args.burst}, "
+          f"rate {'max' if not args.rate else f'{args.rate:.0f}/s'}")
+    print("(cpu = whole-process CPU per packet, including sender and sink)\n")
+
+    run_case("legacy", LegacyRelay, args.packets, args.burst, args.rate)
+    run_case("engine", lambda r, d: RelayEngine(r, d, name="Bench relay"),
+             args.packets, args.burst, args.rate)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,339 @@
+"""
+In-process recording of the relayed Tello H.264 stream.
+
+StreamRecorder is fed by FanoutRelay's stream parser pass: the relay thread
+copies each datagram, with the NAL starts the parser already found in it, into
+a bounded deque (append/popleft are atomic, no lock) and a dedicated writer
+thread drains it in large sequential writes. Recordings are split into time
+segments that always start at a keyframe, each with a sidecar index of
+keyframe timestamps and byte offsets:
+
+    flights/flight_20260101_120000_video_000.h264   raw H.264 (ffplay -f h264)
+    flights/flight_20260101_120000_video_000.idx    INDEX records (t, offset)
+
+If the disk stalls and the backlog passes HIGH_WATER, the recorder keeps
+only keyframes (SPS/PPS/IDR) until the writer has caught up, then resumes
+full recording at the next keyframe. The relay thread never waits on it.
+
+    python stream_recorder.py index flights/flight_20260101_120000_video
+    python stream_recorder.py seek flights/flight_20260101_120000_video 42 --duration 10 --out clip.h264
+    python stream_recorder.py seek flights/flight_20260101_120000_video 42 | ffplay -f h264 -
+"""
+
+import argparse
+import collections
+import glob
+import os
+import struct
+import sys
+import threading
+import time
+
+from h264_stream import PROBE_BYTES, NAL_SLICE, NAL_IDR, NAL_SPS, NAL_PPS
+
+SEGMENT_SECONDS = 60     # Start a new file at the first keyframe after this
+QUEUE_PACKETS = 4096     # Hard cap on queued datagrams (~6 MB)
+HIGH_WATER = 1024        # Backlog that switches to keyframes-only
+LOW_WATER = 64           # Backlog that allows full recording again
+WRITE_CHUNK = 1 << 20    # Max bytes per write() call
+POLL_INTERVAL = 0.02     # Writer sleep when the queue is empty
+
+INDEX = struct.Struct("<dQ")  # Seconds since recording start, byte offset in segment
+KEY_NALS = (NAL_SPS, NAL_PPS, NAL_IDR)
+
+
+class StreamRecorder:
+    """ Relay subscriber that archives the stream to `base`_NNN.h264 files.
+
+        relay.add(StreamRecorder("flights/flight_x_video").start())
+    """
+
+    def __init__(self, base, segment_seconds=SEGMENT_SECONDS, name="recorder"):
+        self.base = base
+        self.name = name
+        self.segment_seconds = segment_seconds
+        os.makedirs(os.path.dirname(os.path.abspath(base)), exist_ok=True)
+
+        self.queue = collections.deque()
+        self.started = time.monotonic()
+
+        # Relay-thread state
+        self.tail = b""             # Last bytes of the previous datagram
+        self.in_key = False         # Inside SPS/PPS/IDR, before the next P-slice
+        self.keys_only = True       # Start recording at the first keyframe
+        self.resume = True          # Writer caught up: go back to full recording
+
+        # Writer-thread state
+        self.file = None
+        self.index_file = None
+        self.segment = -1
+        self.segment_start = 0.0
+        self.position = 0           # Bytes in the current segment
+
+        # Counters
+        self.sent = 0
+        self.dropped = 0            # Queue full
+        self.skipped = 0            # Left out in keyframes-only mode
+        self.errors = 0
+        self.bytes_written = 0
+        self.keyframes = 0
+        self.max_backlog = 0
+
+        self.active = False
+        self.thread = None
+
+    # ----------------------------
+    # Relay thread (FanoutRelay parse pass)
+    # ----------------------------
+    def send_parsed(self, view, nals):
+        """`nals`: [(header offset, nal type)] of this datagram, from StreamParser."""
+        data = bytes(view)  # The relay reuses its slots
+        now = time.monotonic()
+        tail = self.tail
+        self.tail = data[-PROBE_BYTES - 1:]  # Split start code + its leading zero
+
+        # Keyframe group boundaries in this datagram, at their start codes
+        was_key = in_key = self.in_key
+        key_start = -1
+        key_end = -1
+        prefix = b""                # Start code bytes left in the previous datagram
+        for offset, nal_type in nals:
+            start = offset - 3
+            if start > 0 and data[start - 1] == 0:
+                start -= 1
+            elif start < 0 and start - 1 >= -len(tail) and tail[start - 1] == 0:
+                start -= 1
+            if nal_type in KEY_NALS and not in_key:
+                in_key = True
+                if start < 0:
+                    prefix = tail[start:]
+                key_start = max(start, 0)
+            elif nal_type == NAL_SLICE and in_key:
+                in_key = False
+                key_end = max(start, 0)
+        self.in_key = in_key
+
+        if self.keys_only:
+            if key_start >= 0 and self.resume:
+                # Caught up: full recording again, from this keyframe
+                self.keys_only = False
+                self.resume = False
+                data = prefix + data[key_start:]
+                key_start = 0
+            elif key_start >= 0:
+                if was_key and 0 <= key_end < key_start:
+                    # Tail of one keyframe, a short P-frame, then the next keyframe
+                    data = data[:key_end] + data[key_start:]
+                    key_start = key_end
+                else:
+                    data = prefix + (data[key_start:key_end] if key_end > key_start else data[key_start:])
+                    key_start = 0
+            elif was_key:
+                data = data[:key_end] if key_end >= 0 else data
+            else:
+                self.skipped += 1
+                return True
+            prefix = b""
+
+        queue = self.queue
+        backlog = len(queue)
+        if backlog >= QUEUE_PACKETS:
+            self.dropped += 1
+            self.keys_only = True
+            return False
+        # A split start code only needs its prefix when a new segment starts here
+        queue.append((now, data, key_start, prefix))
+        self.sent += 1
+
+        if backlog > self.max_backlog:
+            self.max_backlog = backlog
+        if backlog > HIGH_WATER and not self.keys_only:
+            self.keys_only = True
+        return True
+
+    def close(self):
+        self.stop()
+
+    def describe(self):
+        mode = "KEYFRAMES-ONLY" if self.keys_only else "recording"
+        return (f"{self.name} {mode} seg:{self.segment} {self.bytes_written / (1024 * 1024):.1f}MB "
+                f"keyframes={self.keyframes} queued={len(self.queue)} max={self.max_backlog} "
+                f"skipped={self.skipped} dropped={self.dropped}")
+
+    # ----------------------------
+    # Writer thread
+    # ----------------------------
+    def segment_path(self, segment, ext):
+        return f"{self.base}_{segment:03d}{ext}"
+
+    def open_segment(self, now):
+        self.close_segment()
+        self.segment += 1
+        self.segment_start = now
+        self.position = 0
+        self.file = open(self.segment_path(self.segment, ".h264"), "wb", buffering=0)
+        self.index_file = open(self.segment_path(self.segment, ".idx"), "wb", buffering=0)
+
+    def close_segment(self):
+        if self.file is not None:
+            self.file.close()
+            self.index_file.close()
+            self.file = None
+            self.index_file = None
+
+    def write(self, chunk, entries):
+        if chunk:
+            self.file.write(chunk)
+            self.position += len(chunk)
+            self.bytes_written += len(chunk)
+        # Index after data, so it never points past the end of the file
+        if entries:
+            self.index_file.write(b"".join(entries))
+
+    def run(self):
+        queue = self.queue
+        while self.active or queue:
+            if not queue:
+                time.sleep(POLL_INTERVAL)
+                continue
+
+            chunk = bytearray()
+            entries = []
+            try:
+                while queue and len(chunk) < WRITE_CHUNK:
+                    now, data, key_start, prefix = queue.popleft()
+                    if key_start >= 0:
+                        if self.file is None or now - self.segment_start >= self.segment_seconds:
+                            # New segment, starting exactly at the keyframe
+                            if self.file is not None:
+                                chunk += data[:key_start]
+                                self.write(chunk, entries)
+                            self.open_segment(now)
+                            chunk = bytearray()
+                            entries = []
+                            data = prefix + data[key_start:]
+                            key_start = 0
+                            prefix = b""
+                        # A split start code began in the bytes already written
+                        entries.append(INDEX.pack(now - self.started,
+                                                  self.position + len(chunk) + key_start - len(prefix)))
+                        self.keyframes += 1
+                    if self.file is not None:
+                        chunk += data
+                if self.file is not None:
+                    self.write(chunk, entries)
+            except OSError as e:
+                self.errors += 1
+                print(f"[{self.name}] Write error: {e}")
+                time.sleep(POLL_INTERVAL)
+
+            if self.keys_only and len(queue) <= LOW_WATER:
+                self.resume = True
+
+        self.close_segment()
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+
+# ----------------------------
+# Replay / seek
+# ----------------------------
+def segment_files(base):
+    return sorted(glob.glob(f"{glob.escape(base)}_[0-9][0-9][0-9].h264"))
+
+
+def load_index(base):
+    """[(t, segment_path, offset)] for every keyframe of the recording, in order."""
+    keyframes = []
+    for path in segment_files(base):
+        with open(path[:-len(".h264")] + ".idx", "rb") as f:
+            data = f.read()
+        usable = len(data) - len(data) % INDEX.size  # Ignore a torn last record
+        for t, offset in INDEX.iter_unpack(data[:usable]):
+            keyframes.append((t, path, offset))
+    return keyframes
+
+
+def seek(base, seconds, out, duration=None):
+    """ Copy the recording from the last keyframe at or before `seconds` to
+        `out` (a binary file), for `duration` seconds or to the end.
+        Returns the timestamp it started from.
+    """
+    keyframes = load_index(base)
+    if not keyframes:
+        raise ValueError(f"No keyframes indexed for {base}")
+
+    start = 0
+    for i, (t, _, _) in enumerate(keyframes):
+        if t > seconds:
+            break
+        start = i
+    start_t, path, offset = keyframes[start]
+
+    # Stop at the first keyframe past the requested window
+    end_path, end_offset = None, None
+    if duration is not None:
+        for t, p, o in keyframes[start + 1:]:
+            if t >= start_t + duration:
+                end_path, end_offset = p, o
+                break
+
+    paths = segment_files(base)
+    for p in paths[paths.index(path):]:
+        with open(p, "rb") as f:
+            f.seek(offset if p == path else 0)
+            remaining = end_offset - f.tell() if p == end_path else None
+            while remaining is None or remaining > 0:
+                block = f.read(WRITE_CHUNK if remaining is None else min(WRITE_CHUNK, remaining))
+                if not block:
+                    break
+                out.write(block)
+                if remaining is not None:
+                    remaining -= len(block)
+        if p == end_path:
+            break
+    return start_t
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recorded stream tools")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("index", help="List segments and keyframes")
+    p.add_argument("base")
+    p = sub.add_parser("seek", help="Extract from a given second")
+    p.add_argument("base")
+    p.add_argument("seconds", type=float)
+    p.add_argument("--duration", type=float)
+    p.add_argument("--out", default="-", help="Output file, '-' for stdout")
+    args = parser.parse_args()
+
+    if args.command == "index":
+        keyframes = load_index(args.base)
+        for path in segment_files(args.base):
+            times = [t for t, p, _ in keyframes if p == path]
+            span = f"{times[0]:7.1f}s - {times[-1]:7.1f}s" if times else "no keyframes"
+            print(f"{os.path.basename(path)}  {os.path.getsize(path) / (1024 * 1024):7.1f}MB  "
+                  f"{len(times):4d} keyframes  {span}")
+        return
+
+    out = sys.stdout.buffer if args.out == "-" else open(args.out, "wb")
+    try:
+        start_t = seek(args.base, args.seconds, out, args.duration)
+    finally:
+        if out is not sys.stdout.buffer:
+            out.close()
+    print(f"Started at keyframe {start_t:.2f}s", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,476 @@
+"""
+Batched, zero-copy UDP relay for the Tello H.264 stream.
+
+RelayEngine forwards to one destination; FanoutRelay forwards every datagram
+to a runtime-editable table of subscribers (see SUBSCRIBER CONTROL below).
+
+Packets are received with recv_into() into a preallocated pool of bytearray
+slots and forwarded straight from memoryviews of those slots, so the relay
+allocates no payload buffers per packet. Each wakeup drains every queued
+datagram (up to BATCH_SIZE) before forwarding, and the counters are updated
+once per batch instead of once per packet.
+
+Python has no recvmmsg/sendmmsg, so the batching is done with a non-blocking
+socket drained after a single selector wakeup; under an IDR burst that is
+one wakeup (and one GIL handoff) for the whole burst.
+"""
+
+import errno
+import selectors
+import socket
+import sys
+import threading
+
+from h264_stream import StreamParser
+
+BATCH_SIZE = 64      # Max datagrams drained per wakeup
+SLOT_SIZE = 2048     # Tello video datagrams are <= 1460 bytes; a full slot means truncated
+WAKEUP_TIMEOUT = 0.5  # Seconds between stop-flag checks when idle
+
+CONTROL_PORT = 5002           # Default subscriber control port
+CONTROL_HOST = "127.0.0.1"    # Control is unauthenticated: local only unless asked ("0.0.0.0" = LAN)
+SUBSCRIBER_SNDBUF = 256 * 1024  # Per-subscriber send buffer
+CONTROL_BUFFER = 1024         # Longest control command
+
+# Receive errors for a datagram larger than the buffer (Windows: WSAEMSGSIZE;
+# Linux truncates instead). The datagram is discarded, the socket is fine.
+MSGSIZE_ERRNOS = {errno.EMSGSIZE, 10040}
+
+# Send errors that mean "this subscriber is backed up", not "it is gone"
+BACKPRESSURE_ERRNOS = {errno.EAGAIN, errno.EWOULDBLOCK, errno.ENOBUFS}
+
+
+class RelayEngine:
+    """ Forwards every datagram from `recv_socket` to `destination`.
+
+        Usage:
+            relay = RelayEngine(recv_socket, ("127.0.0.1", 5001), send_socket)
+            relay.start()
+            packets, bytes_relayed = relay.stats()
+            relay.stop()
+    """
+
+    def __init__(self, recv_socket, destination, send_socket=None,
+                 batch_size=BATCH_SIZE, slot_size=SLOT_SIZE, name="Video Relay"):
+        self.recv_socket = recv_socket
+        self.destination = destination
+        self.send_socket = send_socket or socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.name = name
+
+        # Preallocated receive pool
+        self.slots = [bytearray(slot_size) for _ in range(batch_size)]
+        self.views = [memoryview(slot) for slot in self.slots]
+        self.lengths = [0] * batch_size
+
+        # Counters (updated once per batch)
+        self.packet_count = 0
+        self.bytes_relayed = 0
+        self.batch_count = 0
+        self.max_batch = 0
+        self.send_errors = 0
+        self.oversized = 0       # Datagrams dropped for not fitting a slot
+
+        self.active = False
+        self.thread = None
+
+        # Extra sockets serviced by the relay thread: socket -> callback()
+        self.handlers = {}
+
+    # ----------------------------
+    # Batch I/O
+    # ----------------------------
+    def drain(self):
+        """Receive queued datagrams into the pool. Returns (count, total_bytes)."""
+        recv_into = self.recv_socket.recv_into
+        views = self.views
+        lengths = self.lengths
+        count = 0
+        total = 0
+        while count < len(views):
+            view = views[count]
+            try:
+                n = recv_into(view)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as e:
+                if e.errno not in MSGSIZE_ERRNOS:
+                    raise
+                self.oversized += 1
+                continue
+            if n == len(view):
+                # Truncated: forwarding part of a datagram would corrupt the stream
+                self.oversized += 1
+                continue
+            lengths[count] = n
+            total += n
+            count += 1
+        return count, total
+
+    def forward(self, count):
+        """Send the first `count` slots of the pool. Override to change routing."""
+        sendto = self.send_socket.sendto
+        destination = self.destination
+        views = self.views
+        lengths = self.lengths
+        errors = 0
+        for i in range(count):
+            try:
+                sendto(views[i][:lengths[i]], destination)
+            except OSError:
+                errors += 1
+        if errors:
+            self.send_errors += errors
+
+    def on_batch(self, count, total):
+        self.packet_count += count
+        self.bytes_relayed += total
+        self.batch_count += 1
+        if count > self.max_batch:
+            self.max_batch = count
+
+    # ----------------------------
+    # Thread
+    # ----------------------------
+    def run(self):
+        print(f"{self.name} thread started")
+        self.recv_socket.setblocking(False)
+        selector = selectors.DefaultSelector()
+        selector.register(self.recv_socket, selectors.EVENT_READ)
+        for sock, callback in self.handlers.items():
+            sock.setblocking(False)
+            selector.register(sock, selectors.EVENT_READ, callback)
+
+        try:
+            while self.active:
+                for key, _ in selector.select(WAKEUP_TIMEOUT):
+                    if key.data is not None:
+                        key.data()
+                        continue
+                    count, total = self.drain()
+                    if count:
+                        self.forward(count)
+                        self.on_batch(count, total)
+        except OSError as e:
+            if self.active:
+                print(f"[{self.name}] Error: {e}")
+        finally:
+            selector.close()
+
+        print(f"{self.name} thread stopped")
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def stats(self):
+        return self.packet_count, self.bytes_relayed
+
+
+# ----------------------------
+# Fan-out
+# ----------------------------
+def resolve_address(host, port):
+    """(ip, port) for a subscriber; ValueError for a bad port or unknown host."""
+    if not 0 < port < 65536:
+        raise ValueError(f"port {port} out of range 1-65535")
+    try:
+        info = socket.getaddrinfo(host, port, socket.AF_INET, socket.SOCK_DGRAM)
+    except (socket.gaierror, UnicodeError) as e:
+        raise ValueError(f"can't resolve {host}: {e}")
+    return info[0][4][:2]
+
+
+class UdpSubscriber:
+    """ One fan-out destination with its own non-blocking socket.
+
+        `address` must already be resolved (resolve_address), so sendto never
+        does a name lookup per packet.
+
+        A separate socket (and send buffer) per subscriber means a backed-up
+        consumer only fills its own buffer; its datagrams are dropped and
+        counted instead of stalling the relay or the other subscribers.
+    """
+
+    def __init__(self, name, address, sndbuf=SUBSCRIBER_SNDBUF):
+        self.name = name
+        self.address = address
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, sndbuf)
+        self.sock.setblocking(False)
+        self.sendto = self.sock.sendto
+
+        self.sent = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def send(self, view):
+        try:
+            self.sendto(view, self.address)
+            return True
+        except OSError as e:
+            if e.errno in BACKPRESSURE_ERRNOS:
+                self.dropped += 1
+            else:
+                self.errors += 1
+            return False
+        except Exception:
+            # Not a network condition (bad address...): the relay drops this subscriber
+            self.errors += 1
+            raise
+
+    def on_batch(self, sent):
+        self.sent += sent
+
+    def close(self):
+        self.sock.close()
+
+    def describe(self):
+        host, port = self.address
+        return f"{self.name} {host}:{port} sent={self.sent} dropped={self.dropped} errors={self.errors}"
+
+
+class FanoutRelay(RelayEngine):
+    """ Relay that sends every datagram to all subscribers from one buffer.
+
+        The subscriber table is a tuple replaced copy-on-write, so the relay
+        thread iterates it without locks while subscribe()/unsubscribe() (from
+        the control socket or any other thread) swap in a new one.
+
+        With parse_stream=True (default) the relay runs StreamParser over the
+        forwarded datagrams and primes every new subscriber - or an existing
+        one that sends SUB again after a reconnect - with the latest SPS/PPS/IDR,
+        so its decoder shows a frame immediately instead of waiting for the
+        next keyframe. In-process consumers that need the NAL boundaries (the
+        stream recorder) are fed from that parse pass instead of the live one.
+
+        SUBSCRIBER CONTROL (UDP text on `control_port`, one command per datagram):
+            SUB <port> [name]              subscribe <sender ip>:<port>
+            SUB <host> <port> [name]       subscribe host:port
+            UNSUB <port> | UNSUB <host> <port>
+            LIST                           reply with one line per subscriber
+                                           and the stream's frame stats
+        Every command is answered with "OK ...", "ERR ..." or the LIST table.
+        The control socket has no authentication, so it binds to localhost
+        unless `control_host` explicitly opens it to the network.
+    """
+
+    def __init__(self, recv_socket, subscribers=(), control_port=CONTROL_PORT,
+                 control_host=CONTROL_HOST, parse_stream=True, **kwargs):
+        super().__init__(recv_socket, None, **kwargs)
+        self.table_lock = threading.Lock()
+        self.subscribers = ()
+        self.parsed = ()         # Fed after the parser, see add()
+        self.stream = StreamParser() if parse_stream else None
+
+        for name, address in subscribers:
+            self.subscribe(address, name)
+
+        self.control_socket = None
+        if control_port is not None:
+            self.control_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.control_socket.bind((control_host, control_port))
+            self.handlers[self.control_socket] = self.on_control
+            print(f"[{self.name}] Subscriber control on UDP {control_host}:{control_port}")
+
+    # ----------------------------
+    # Subscriber table
+    # ----------------------------
+    def find(self, address):
+        for subscriber in self.subscribers:
+            if subscriber.address == address:
+                return subscriber
+        return None
+
+    def add(self, subscriber):
+        """ Add any object with send(view)/on_batch(sent)/close()/describe().
+
+            An object with send_parsed(view, nals) instead of send() gets each
+            datagram after the stream parser, with its StreamParser.nals.
+        """
+        with self.table_lock:
+            if hasattr(subscriber, "send_parsed"):
+                if self.stream is None:
+                    raise ValueError(f"{subscriber.describe()} needs parse_stream=True")
+                self.parsed = self.parsed + (subscriber,)
+            else:
+                self.subscribers = self.subscribers + (subscriber,)
+        return subscriber
+
+    def remove(self, subscriber):
+        with self.table_lock:
+            self.subscribers = tuple(s for s in self.subscribers if s is not subscriber)
+            self.parsed = tuple(s for s in self.parsed if s is not subscriber)
+        subscriber.close()
+
+    def prime(self, subscriber):
+        """Send the cached keyframe group so the subscriber can decode at once."""
+        if self.stream is None:
+            return 0
+        packets = self.stream.priming_packets()
+        for packet in packets:
+            subscriber.send(packet)
+        return len(packets)
+
+    def subscribe(self, address, name=None):
+        address = resolve_address(*address)
+        subscriber = self.find(address)
+        if subscriber is None:
+            subscriber = UdpSubscriber(name or f"sub{len(self.subscribers)}", address)
+            self.prime(subscriber)
+            return self.add(subscriber)
+        # Re-subscribe (receiver restarted): prime it again
+        self.prime(subscriber)
+        return subscriber
+
+    def unsubscribe(self, address):
+        subscriber = self.find(resolve_address(*address))
+        if subscriber is None:
+            return False
+        self.remove(subscriber)
+        return True
+
+    # ----------------------------
+    # Forwarding
+    # ----------------------------
+    def forward(self, count):
+        views = self.views
+        lengths = self.lengths
+        packets = [views[i][:lengths[i]] for i in range(count)]
+
+        # Subscribers in table order: the first (Unity) gets the whole batch first
+        for subscriber in self.subscribers:
+            send = subscriber.send
+            sent = 0
+            try:
+                for packet in packets:
+                    if send(packet):
+                        sent += 1
+                subscriber.on_batch(sent)
+            except Exception as e:
+                # One broken subscriber must not stop the relay for the others
+                print(f"[{self.name}] Dropping {subscriber.describe()}: {e!r}")
+                self.remove(subscriber)
+
+        # Parse after forwarding so the live feed never waits on it
+        stream = self.stream
+        if stream is not None:
+            slots = self.slots
+            parsed = self.parsed
+            for i in range(count):
+                stream.feed(slots[i], lengths[i])
+                for subscriber in parsed:
+                    try:
+                        subscriber.send_parsed(packets[i], stream.nals)
+                    except Exception as e:
+                        print(f"[{self.name}] Dropping {subscriber.describe()}: {e!r}")
+                        self.remove(subscriber)
+                        parsed = self.parsed
+
+    # ----------------------------
+    # Control socket
+    # ----------------------------
+    def on_control(self):
+        while True:
+            try:
+                data, addr = self.control_socket.recvfrom(CONTROL_BUFFER)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                if e.errno in MSGSIZE_ERRNOS:
+                    continue  # Oversized command, already discarded
+                return
+            try:
+                if len(data) == CONTROL_BUFFER:
+                    raise ValueError("command too long")
+                reply = self.handle_command(data.decode().split(), addr)
+            except (ValueError, UnicodeDecodeError):
+                reply = "ERR usage: SUB [host] port [name] | UNSUB [host] port | LIST"
+            except Exception as e:    # Never let a datagram take the relay thread down
+                reply = f"ERR {e}"
+            try:
+                self.control_socket.sendto(reply.encode(), addr)
+            except OSError:
+                pass
+
+    def handle_command(self, words, addr):
+        if not words:
+            raise ValueError
+        verb = words[0].upper()
+
+        if verb == "LIST":
+            lines = [subscriber.describe() for subscriber in self.subscribers + self.parsed]
+            if not lines:
+                lines.append("(no subscribers)")
+            if self.stream is not None:
+                lines.append(f"stream {self.stream.describe()}")
+            if self.oversized:
+                lines.append(f"oversized datagrams dropped: {self.oversized}")
+            return "\n".join(lines)
+
+        if verb not in ("SUB", "UNSUB"):
+            raise ValueError
+
+        # Host is optional: default to the sender of the command
+        if len(words) >= 3 and not words[1].isdigit():
+            host, port, rest = words[1], int(words[2]), words[3:]
+        else:
+            host, port, rest = addr[0], int(words[1]), words[2:]
+        try:
+            address = resolve_address(host, port)
+        except ValueError as e:
+            return f"ERR {e}"
+
+        if verb == "SUB":
+            subscriber = self.subscribe(address, rest[0] if rest else None)
+            print(f"[{self.name}] + {subscriber.name} {host}:{port}")
+            return f"OK {subscriber.describe()}"
+
+        if self.unsubscribe(address):
+            print(f"[{self.name}] - {host}:{port}")
+            return f"OK removed {host}:{port}"
+        return f"ERR not subscribed {host}:{port}"
+
+    def stop(self, timeout=2):
+        super().stop(timeout)
+        for subscriber in self.subscribers + self.parsed:
+            subscriber.close()
+        self.subscribers = ()
+        self.parsed = ()
+        if self.control_socket is not None:
+            self.control_socket.close()
+
+
+# ----------------------------
+# Control client
+#   python video_relay.py SUB 5003 recorder
+#   python video_relay.py LIST
+# ----------------------------
+def send_control(words, host="127.0.0.1", port=CONTROL_PORT, timeout=1.0):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.settimeout(timeout)
+    try:
+        sock.sendto(" ".join(words).encode(), (host, port))
+        return sock.recv(65536).decode()
+    finally:
+        sock.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python video_relay.py SUB [host] port [name] | UNSUB [host] port | LIST")
+        sys.exit(1)
+    try:
+        print(send_control(sys.argv[1:]))
+    except socket.timeout:
+        print(f"No reply from relay on UDP {CONTROL_PORT}")
+        sys.exit(1)
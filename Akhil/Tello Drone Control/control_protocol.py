@@ -0,0 +1,163 @@
+"""
+Binary UDP control protocol shared by VR_Drone.py and the command senders.
+
+Every message is a fixed 32-byte little-endian record:
+
+    magic     2s  b"VD"
+    version   B   PROTOCOL_VERSION
+    command   B   flight command code (CMD_NONE, CMD_TAKEOFF, ..., CMD_TRACE)
+    seq       I   sender sequence number (wraps at 2**32)
+    sent_at   d   sender time.monotonic() when the message was packed
+    yaw       f   target yaw in degrees
+    fb        f   forward(+)/back(-) velocity, RC units (-100..100)
+    lr        f   right(+)/left(-) velocity, RC units
+    ud        f   up(+)/down(-) velocity, RC units
+
+The text formats ("12.5", "1000", "1") never start with the magic bytes, so a
+receiver can accept both on the same port with is_binary().
+"""
+
+import collections
+import struct
+import time
+
+MAGIC = b"VD"
+PROTOCOL_VERSION = 1
+
+MESSAGE = struct.Struct("<2sBBIdffff")
+MESSAGE_SIZE = MESSAGE.size
+
+# ----------------------------
+# Command codes (same numbers as the text protocol on port 5015)
+# ----------------------------
+CMD_NONE = 0
+CMD_TAKEOFF = 1
+CMD_LAND = 2
+CMD_EMERGENCY = 3
+CMD_TRACE = 4     # Print VR_Drone.py's control latency histograms
+
+# ----------------------------
+# Receiver defaults
+# ----------------------------
+STALE_AFTER = 0.25   # Drop datagrams this much later than the fastest recent one (s)
+BASELINE_WINDOW = 2.0  # "Recent": the fastest offset is kept for 1-2 windows (s)
+RESYNC_AFTER = 1.0   # Sender clock jumping back this far means it restarted (s)
+
+SEQ_MASK = 0xFFFFFFFF
+SEQ_HALF = 0x80000000
+
+ControlMessage = collections.namedtuple(
+    "ControlMessage", "command seq sent_at yaw fb lr ud")
+
+
+def is_binary(data):
+    """True if the datagram is a binary control message (any version)."""
+    return len(data) == MESSAGE_SIZE and data[:2] == MAGIC
+
+
+def pack(seq, command=CMD_NONE, yaw=0.0, fb=0.0, lr=0.0, ud=0.0, sent_at=None):
+    if sent_at is None:
+        sent_at = time.monotonic()
+    return MESSAGE.pack(MAGIC, PROTOCOL_VERSION, command, seq & SEQ_MASK,
+                        sent_at, yaw, fb, lr, ud)
+
+
+def unpack(data):
+    """Decode a binary message. Returns None for an unknown protocol version."""
+    magic, version, command, seq, sent_at, yaw, fb, lr, ud = MESSAGE.unpack(data)
+    if version != PROTOCOL_VERSION:
+        return None
+    return ControlMessage(command, seq, sent_at, yaw, fb, lr, ud)
+
+
+class Sender:
+    """Packs messages with an increasing sequence number."""
+
+    def __init__(self):
+        self.seq = 0
+
+    def pack(self, **fields):
+        data = pack(self.seq, **fields)
+        self.seq = (self.seq + 1) & SEQ_MASK
+        return data
+
+
+class SequenceFilter:
+    """ Drops out-of-order and stale datagrams from one sender stream.
+
+        A message is out of order if its sequence number is not newer than the
+        last accepted one (serial-number arithmetic, so wraparound is fine) and
+        its timestamp is not newer either. Staleness is measured against the
+        smallest receive-minus-send offset of the last one to two
+        `baseline_window`s, which works even when sender and receiver clocks
+        are on different machines, and follows the offset back up when one
+        clock drifts or the network path gets slower for good. On the same
+        machine time.monotonic() is shared, so `latency` is the true one-way
+        input latency.
+
+        stale_after=None only filters on the sequence number (commands must
+        never be dropped for arriving late).
+    """
+
+    def __init__(self, stale_after=STALE_AFTER, resync_after=RESYNC_AFTER,
+                 baseline_window=BASELINE_WINDOW):
+        self.stale_after = stale_after
+        self.resync_after = resync_after
+        self.baseline_window = baseline_window
+        self.reset()
+        self.accepted = 0
+        self.dropped_reordered = 0
+        self.dropped_stale = 0
+        self.stale = False       # The last message was dropped as stale
+
+    def reset(self):
+        self.last_seq = None
+        self.last_sent_at = None
+        self.window_start = None
+        self.window_min = None      # Fastest offset in the current window
+        self.previous_min = None    # ... and in the one before it
+        self.latency = 0.0
+
+    def accept(self, msg, now=None):
+        if now is None:
+            now = time.monotonic()
+
+        # Sender restarted (its clock went backwards by a lot): start over
+        if self.last_sent_at is not None and self.last_sent_at - msg.sent_at > self.resync_after:
+            self.reset()
+
+        offset = now - msg.sent_at
+        if self.window_start is None or now - self.window_start >= self.baseline_window:
+            # One rotation per message, so a long silence still compares the
+            # first messages after it with the offsets from before it
+            self.previous_min = self.window_min
+            self.window_min = offset
+            self.window_start = now
+        elif offset < self.window_min:
+            self.window_min = offset
+
+        self.stale = False
+        if self.last_seq is not None:
+            newer = 0 < ((msg.seq - self.last_seq) & SEQ_MASK) < SEQ_HALF
+            if not newer and msg.sent_at <= self.last_sent_at:
+                self.dropped_reordered += 1
+                return False
+
+        if self.stale_after is not None:
+            baseline = self.window_min
+            if self.previous_min is not None and self.previous_min < baseline:
+                baseline = self.previous_min
+            if offset - baseline > self.stale_after:
+                self.dropped_stale += 1
+                self.stale = True
+                return False
+
+        self.last_seq = msg.seq
+        self.last_sent_at = msg.sent_at
+        self.latency = offset
+        self.accepted += 1
+        return True
+
+    @property
+    def dropped(self):
+        return self.dropped_reordered + self.dropped_stale
@@ -1,8 +1,14 @@
-from djitellopy import Tello
 import serial
 import pygame
+import os
+import sys
 import time
 
+# Shared modules live one level up in "Tello Drone Control"
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from tello_sim import create_tello
+from yaw_controller import YawPID
+
 # ------------------------
 # IMU Serial
 # ------------------------
@@ -40,15 +46,13 @@ def angle_diff(target, current):
 
 # ------------------------
 def main():
-    global KP, KI, KD
-
     pygame.init()
     screen = pygame.display.set_mode((400, 300))
     pygame.display.set_caption("IMU Yaw → Tello Control")
 
     font = pygame.font.SysFont(None, 28)
 
-    tello = Tello()
+    tello = create_tello()
     tello.connect()
     print("Battery:", tello.get_battery(), "%")
 
@@ -58,9 +62,9 @@ def main():
     yaw_offset = 0
     target_yaw = 0
 
-    prev_error = 0
-    prev_time = time.time()
-    integral = 0
+    # No slew/smoothing and no integral decay in the deadband, as before
+    pid = YawPID(KP, KI, KD, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                 deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT, deadband_decay=1.0)
 
     running = True
     while running:
@@ -88,27 +92,7 @@ def main():
         current_yaw = imu_yaw - yaw_offset
         error = angle_diff(target_yaw, current_yaw)
 
-        now = time.time()
-        dt = now - prev_time
-        prev_time = now
-
-        derivative = (error - prev_error) / dt if dt > 0 else 0
-        prev_error = error
-
-        integral += error * dt
-        integral = max(-INTEGRAL_LIMIT, min(INTEGRAL_LIMIT, integral))
-
-        cmd = KP*error + KD*derivative + KI*integral
-
-        if abs(error) < DEADBAND:
-            cmd = 0
-
-        cmd = max(-MAX_SPEED, min(MAX_SPEED, cmd))
-
-        if cmd > 0:
-            cmd = max(cmd, MIN_SPEED)
-        elif cmd < 0:
-            cmd = min(cmd, -MIN_SPEED)
+        cmd = pid.step(error)
 
         tello.send_rc_control(0, 0, 0, int(cmd))
 
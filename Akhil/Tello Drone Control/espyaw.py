@@ -1,9 +1,13 @@
-from djitellopy import Tello
+from tello_sim import create_tello
+import collections
 import pygame
 import time
-import cv2
 import serial
 
+from yaw_controller import YawPID
+from frame_source import tello_source
+from yaw_runtime import ControlLoop, VideoView, Hud, RENDER_FPS
+
 # ----------------------------
 # ESP32 serial config
 # ----------------------------
@@ -13,9 +17,8 @@ ESP_BAUD = 115200
 # ----------------------------
 # Rates (IMPORTANT)
 # ----------------------------
-CONTROL_HZ = 40
+CONTROL_HZ = 40     # Control thread (serial, PID)
 RC_HZ = 20
-YAW_HZ = 20
 
 # ----------------------------
 # Window
@@ -38,6 +41,9 @@ CMD_SMOOTHING = 0.3
 MAX_CMD_STEP = 6
 INTEGRAL_LIMIT = 120
 
+# What the control thread publishes for the display
+Snapshot = collections.namedtuple("Snapshot", "target_yaw drone_yaw error cmd")
+
 # ----------------------------
 # Angle unwrap
 # ----------------------------
@@ -51,8 +57,6 @@ def unwrap_angle(prev, current):
 
 
 def main():
-    global KP, KI, KD
-
     # ----------------------------
     # Serial (ESP)
     # ----------------------------
@@ -72,12 +76,12 @@ def main():
     # ----------------------------
     # Tello
     # ----------------------------
-    tello = Tello()
+    tello = create_tello(telemetry=True)
     tello.connect()
     print("Battery:", tello.get_battery(), "%")
 
     tello.streamon()
-    frame_read = tello.get_frame_read()
+    source = tello_source(tello.get_frame_read()).start()
 
     tello.takeoff()
     time.sleep(2)
@@ -88,30 +92,23 @@ def main():
     prev_raw_esp = None
     target_yaw = 0.0
 
-    prev_raw_drone = tello.get_yaw()
+    telemetry = tello.telemetry
+    prev_raw_drone = telemetry.state.yaw
+    state_seq = telemetry.state.seq
     drone_yaw = prev_raw_drone
 
-    prev_error = 0.0
-    integral = 0.0
-    last_cmd = 0.0
+    pid = YawPID(KP, KI, KD, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                 deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT,
+                 max_cmd_step=MAX_CMD_STEP, cmd_smoothing=CMD_SMOOTHING)
 
     # Timers
     last_rc_time = 0
-    last_yaw_time = 0
-
-    running = True
-    while running:
-        clock.tick(CONTROL_HZ)
-        now = time.time()
 
-        # ----------------------------
-        # Events
-        # ----------------------------
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT:
-                running = False
-            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
-                running = False
+    # ----------------------------
+    # Control thread: ESP, drone yaw, PID, RC
+    # ----------------------------
+    def control_step(now):
+        nonlocal prev_raw_esp, target_yaw, prev_raw_drone, state_seq, drone_yaw, last_rc_time
 
         # ----------------------------
         # ESP yaw (NON-BLOCKING, latest only)
@@ -132,45 +129,20 @@ def main():
                 pass
 
         # ----------------------------
-        # Drone yaw (rate-limited)
+        # Drone yaw (pushed by telemetry, unwrapped once per state datagram)
         # ----------------------------
-        if now - last_yaw_time > 1 / YAW_HZ:
-            raw = tello.get_yaw()
-            raw = unwrap_angle(prev_raw_drone, raw)
+        state = telemetry.state
+        if state.seq != state_seq:
+            raw = unwrap_angle(prev_raw_drone, state.yaw)
             drone_yaw = raw
             prev_raw_drone = raw
-            last_yaw_time = now
+            state_seq = state.seq
 
         # ----------------------------
         # PID
         # ----------------------------
         error = target_yaw - drone_yaw
-        derivative = (error - prev_error) * CONTROL_HZ
-        prev_error = error
-
-        integral += error / CONTROL_HZ
-        integral = max(-INTEGRAL_LIMIT, min(INTEGRAL_LIMIT, integral))
-
-        cmd = KP * error + KD * derivative + KI * integral
-
-        if abs(error) < DEADBAND:
-            cmd = 0
-            integral *= 0.9
-
-        cmd = max(-MAX_SPEED, min(MAX_SPEED, cmd))
-
-        if cmd > 0:
-            cmd = max(MIN_SPEED, cmd)
-        elif cmd < 0:
-            cmd = min(-MIN_SPEED, cmd)
-
-        if cmd > last_cmd + MAX_CMD_STEP:
-            cmd = last_cmd + MAX_CMD_STEP
-        elif cmd < last_cmd - MAX_CMD_STEP:
-            cmd = last_cmd - MAX_CMD_STEP
-
-        cmd = (1 - CMD_SMOOTHING) * last_cmd + CMD_SMOOTHING * cmd
-        last_cmd = cmd
+        cmd = pid.step(error, now=now)  # measured dt, not 1 / CONTROL_HZ
 
         # ----------------------------
         # RC command (RATE-LIMITED)
@@ -179,28 +151,52 @@ def main():
             tello.send_rc_control(0, 0, 0, int(cmd))
             last_rc_time = now
 
+        return Snapshot(target_yaw, drone_yaw, error, int(cmd))
+
+    control = ControlLoop(control_step, hz=CONTROL_HZ).start()
+
+    # ----------------------------
+    # Render loop (display rate, reads snapshots only)
+    # ----------------------------
+    video = VideoView((WIDTH, HEIGHT))
+    hud = Hud(font, line_height=24)
+
+    running = True
+    while running:
         # ----------------------------
-        # Video
+        # Events
         # ----------------------------
-        frame = frame_read.frame
-        frame = cv2.resize(frame, (WIDTH, HEIGHT))
-        frame = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
-        screen.blit(frame, (0, 0))
-
-        info = [
-            f"Target yaw : {target_yaw:7.1f}",
-            f"Drone yaw  : {drone_yaw:7.1f}",
-            f"Error      : {error:7.1f}",
-            f"Cmd        : {int(cmd)}",
-            "ESC = land"
-        ]
-
-        y = 20
-        for line in info:
-            screen.blit(font.render(line, True, (255, 255, 255)), (20, y))
-            y += 24
-
-        pygame.display.flip()
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+            if event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE:
+                running = False
+
+        snap = control.snapshot
+        if snap is not None:
+            info = [
+                f"Target yaw : {snap.target_yaw:7.1f}",
+                f"Drone yaw  : {snap.drone_yaw:7.1f}",
+                f"Error      : {snap.error:7.1f}",
+                f"Cmd        : {snap.cmd}",
+                "ESC = land"
+            ]
+
+            # ----------------------------
+            # Video (only when something changed)
+            # ----------------------------
+            new_frame = video.update(source.latest())
+            if hud.update(info) or new_frame:
+                video.draw(screen)
+                hud.draw(screen, (20, 20))
+                pygame.display.flip()
+
+        clock.tick(RENDER_FPS)
+
+    control.stop()
+    source.stop()
+    print(control.describe())
+    print(source.describe())
 
     # ----------------------------
     # Cleanup
@@ -0,0 +1,326 @@
+"""
+Always-on binary flight data recorder.
+
+Every control step appends one fixed-width record to a memory-mapped,
+column-oriented file: each column is a contiguous typed array, so recording
+is a handful of stores into mapped memory (no formatting, no write() calls)
+and loading is zero-parse - the columns are NumPy views of the file.
+
+File layout (.fdr):
+    0     4s   magic b"FDR1"
+    4     I    header length (HEADER_SIZE)
+    8     Q    rows written (updated after every record)
+    16    Q    capacity (rows per column)
+    24    ...  JSON column spec [[name, dtype], ...], NUL padded
+    HEADER_SIZE   column 0 (capacity * itemsize bytes), column 1, ...
+
+A background thread msyncs the mapping once a second, so the control loop
+never waits on the disk. Writes to the mapping survive a crash of the Python
+process; the flusher bounds what an OS crash can lose. A full file rolls over
+to the next segment (flight_..._001.fdr, ...): the flusher creates and maps
+that segment ahead of time (once the current one is half full), so the
+control loop only swaps array views and hands the full one back to be
+flushed and closed.
+
+    python flight_recorder.py info flights/flight_20260101_120000.fdr
+    python flight_recorder.py replay flights/flight_20260101_120000.fdr [--kp 0.8 --kd 0.25]
+"""
+
+import argparse
+import glob
+import json
+import os
+import struct
+import threading
+import time
+
+import numpy as np
+
+MAGIC = b"FDR1"
+HEADER_SIZE = 4096
+HEADER = struct.Struct("<4sIQQ")
+ROWS_OFFSET = 8
+
+CAPACITY = 60000        # Rows per segment: 10 minutes at 100 Hz
+FLUSH_INTERVAL = 1.0    # Seconds between msyncs
+SPARE_AT = 0.5          # Pre-create the next segment once the current one is this full
+RECORD_DIR = "flights"
+
+# ----------------------------
+# VR_Drone.py control step record
+# ----------------------------
+CONTROL_COLUMNS = [
+    ("t", "<f8"),             # time.monotonic()
+    ("dt", "<f4"),            # PID step dt
+    ("target_yaw", "<f4"),
+    ("drone_yaw", "<f4"),
+    ("error", "<f4"),
+    ("p_term", "<f4"),
+    ("i_term", "<f4"),
+    ("d_term", "<f4"),
+    ("pid_cmd", "<f4"),       # Shaped PID output before int()
+    ("fb", "<i1"),            # RC command published to the sender
+    ("lr", "<i1"),
+    ("ud", "<i1"),
+    ("yaw_cmd", "<i1"),
+    ("flying", "<u1"),
+    ("state_seq", "<u4"),     # Telemetry datagrams received
+    ("yaw_packets", "<u4"),   # Yaw input packets accepted
+    ("yaw_dropped", "<u4"),   # Binary yaw packets dropped (stale/reordered)
+    ("video_packets", "<u4"),
+]
+
+
+class Segment:
+    """ One segment file, mapped, with its column views. """
+
+    def __init__(self, path, spec, capacity):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        spec_json = json.dumps(spec).encode()
+        if HEADER.size + len(spec_json) > HEADER_SIZE:
+            raise ValueError("Too many columns for the header")
+        size = HEADER_SIZE + sum(np.dtype(d).itemsize for _, d in spec) * capacity
+
+        mm = np.memmap(path, dtype=np.uint8, mode="w+", shape=(size,))
+        mm[:HEADER.size] = np.frombuffer(HEADER.pack(MAGIC, HEADER_SIZE, 0, capacity), np.uint8)
+        mm[HEADER.size:HEADER.size + len(spec_json)] = np.frombuffer(spec_json, np.uint8)
+
+        self.mm = mm
+        self.path = path
+        self.row_count = np.ndarray((1,), "<u8", buffer=mm, offset=ROWS_OFFSET)
+        self.arrays = tuple(column_views(mm, spec, capacity).values())
+
+    def flush(self):
+        self.mm.flush()
+
+    def close(self):
+        self.mm.flush()
+        self.row_count = self.arrays = self.mm = None
+
+
+class FlightRecorder:
+    """ Appends records to memory-mapped columnar segment files.
+
+        recorder = FlightRecorder("flights/flight_x.fdr", CONTROL_COLUMNS).start()
+        recorder.record(t, dt, target_yaw, ...)   # values in column order
+        recorder.close()
+    """
+
+    def __init__(self, path, columns=CONTROL_COLUMNS, capacity=CAPACITY,
+                 flush_interval=FLUSH_INTERVAL):
+        self.base_path = path
+        self.spec = [(name, np.dtype(dtype).str) for name, dtype in columns]
+        self.capacity = capacity
+        self.flush_interval = flush_interval
+
+        self.segment = 0
+        self.rows = 0            # Rows in the current segment
+        self.total_rows = 0
+        self.lock = threading.Lock()  # Spare segment: flusher creates, record() takes
+        self.spare = None        # Next segment, mapped ahead of time
+        self.retired = []        # Full segments waiting for their final flush
+        self.wake = threading.Event()
+        self.active = False
+        self.thread = None
+        self.current = Segment(self.segment_path(0), self.spec, capacity)
+        self.use(self.current)
+
+    # ----------------------------
+    # Segments
+    # ----------------------------
+    def segment_path(self, segment):
+        if segment == 0:
+            return self.base_path
+        root, ext = os.path.splitext(self.base_path)
+        return f"{root}_{segment:03d}{ext}"
+
+    def use(self, segment):
+        self.current = segment
+        self.path = segment.path
+        self.row_count = segment.row_count
+        self.arrays = segment.arrays
+        self.rows = 0
+
+    def make_spare(self):
+        """Create + map the next segment (flusher thread; record() only if it's late)."""
+        with self.lock:
+            if self.spare is None:
+                self.spare = Segment(self.segment_path(self.segment + 1), self.spec, self.capacity)
+
+    def roll(self):
+        """Swap to the spare segment; the flusher flushes and closes the full one."""
+        if self.spare is None:
+            self.make_spare()   # Flusher not running or capacity tiny: pay for it here
+        with self.lock:
+            spare, self.spare = self.spare, None
+            self.segment += 1
+        self.retired.append(self.current)
+        self.use(spare)
+        self.wake.set()
+
+    # ----------------------------
+    # Hot path
+    # ----------------------------
+    def record(self, *values):
+        """Append one row; `values` in column order."""
+        row = self.rows
+        if row >= self.capacity:
+            self.roll()
+            row = 0
+        for array, value in zip(self.arrays, values):
+            array[row] = value
+        self.rows = row + 1
+        self.row_count[0] = row + 1  # After the data, so a reader never sees a partial row
+        self.total_rows += 1
+
+    # ----------------------------
+    # Background flush
+    # ----------------------------
+    def retire(self):
+        while self.retired:
+            self.retired.pop(0).close()
+
+    def run(self):
+        while self.active:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.retire()
+            self.current.flush()
+            if self.spare is None and self.rows >= self.capacity * SPARE_AT:
+                self.make_spare()
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def close(self):
+        self.active = False
+        self.wake.set()
+        if self.thread is not None:
+            self.thread.join(timeout=self.flush_interval + 1)
+        self.retire()
+        self.current.close()
+        if self.spare is not None:
+            # Never written: don't leave an empty segment behind
+            path = self.spare.path
+            self.spare.close()
+            self.spare = None
+            os.remove(path)
+
+    def describe(self):
+        return f"{os.path.basename(self.path)} {self.total_rows} rows"
+
+
+def session_path(directory=RECORD_DIR, prefix="flight"):
+    return os.path.join(directory, time.strftime(f"{prefix}_%Y%m%d_%H%M%S.fdr"))
+
+
+# ----------------------------
+# Loading
+# ----------------------------
+def column_views(buffer, spec, capacity, rows=None):
+    """{name: array} views of the columns inside a mapped file."""
+    views = {}
+    offset = HEADER_SIZE
+    length = capacity if rows is None else rows
+    for name, dtype in spec:
+        dtype = np.dtype(dtype)
+        views[name] = np.ndarray((length,), dtype, buffer=buffer, offset=offset)
+        offset += dtype.itemsize * capacity
+    return views
+
+
+def load_segment(path):
+    """Columns of one segment as read-only NumPy views of the file (no parsing)."""
+    mm = np.memmap(path, dtype=np.uint8, mode="r")
+    magic, header_size, rows, capacity = HEADER.unpack(mm[:HEADER.size].tobytes())
+    if magic != MAGIC or header_size != HEADER_SIZE:
+        raise ValueError(f"{path}: not a flight recording")
+    spec = json.loads(mm[HEADER.size:HEADER_SIZE].tobytes().rstrip(b"\0"))
+    return column_views(mm, spec, capacity, rows)
+
+
+def load(path):
+    """ Columns of a whole session: the first segment's views as-is, or the
+        segments concatenated when the session rolled over.
+    """
+    root, ext = os.path.splitext(path)
+    segments = [path] + sorted(glob.glob(f"{glob.escape(root)}_[0-9][0-9][0-9]{ext}"))
+    parts = [load_segment(p) for p in segments]
+    if len(parts) == 1:
+        return parts[0]
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
+
+
+# ----------------------------
+# Tools
+# ----------------------------
+def info(columns):
+    t = columns["t"]
+    if not len(t):
+        print("Empty recording")
+        return
+    duration = t[-1] - t[0]
+    error = np.abs(columns["error"])
+    flying = columns["flying"].astype(bool)
+    print(f"Rows      : {len(t)} over {duration:.1f}s ({len(t) / max(duration, 1e-9):.0f} Hz)")
+    print(f"Flying    : {flying.mean() * 100:.0f}% of steps")
+    if flying.any():
+        print(f"|Error|   : mean {error[flying].mean():.2f}  p99 {np.percentile(error[flying], 99):.2f}  "
+              f"max {error[flying].max():.2f} deg (flying)")
+    gaps = np.diff(t)
+    if len(gaps):
+        print(f"Step gap  : p50 {np.median(gaps) * 1000:.1f}ms  max {gaps.max() * 1000:.1f}ms")
+    print(f"Inputs    : {columns['yaw_packets'][-1]} yaw packets, {columns['yaw_dropped'][-1]} dropped, "
+          f"{columns['state_seq'][-1]} state datagrams, {columns['video_packets'][-1]} video packets")
+
+
+def replay(columns, kp, ki, kd, **options):
+    """ Feed the recorded errors and dts back through YawPID. Returns the
+        replayed command array (open loop: the recorded drone yaw is kept).
+    """
+    from yaw_controller import YawPID
+
+    pid = YawPID(kp, ki, kd, **options)
+    error = columns["error"].astype(np.float64)
+    dt = columns["dt"].astype(np.float64)
+    out = np.empty(len(error))
+    for i in range(len(error)):
+        out[i] = pid.step(error[i], dt=dt[i])
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Flight recorder tools")
+    parser.add_argument("command", choices=["info", "replay"])
+    parser.add_argument("path")
+    # Defaults match VR_Drone.py
+    parser.add_argument("--kp", type=float, default=0.6)
+    parser.add_argument("--ki", type=float, default=0.0)
+    parser.add_argument("--kd", type=float, default=0.3)
+    parser.add_argument("--max-cmd-step", type=float, default=6)
+    parser.add_argument("--cmd-smoothing", type=float, default=0.3)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    columns = load(args.path)
+    print(f"Loaded {len(columns['t'])} rows x {len(columns)} columns in "
+          f"{(time.perf_counter() - start) * 1000:.1f}ms\n")
+
+    if args.command == "info":
+        info(columns)
+        return
+
+    replayed = replay(columns, args.kp, args.ki, args.kd,
+                      max_cmd_step=args.max_cmd_step, cmd_smoothing=args.cmd_smoothing)
+    recorded = columns["pid_cmd"].astype(np.float64)
+    diff = np.abs(replayed - recorded)
+    print(f"Replayed {len(replayed)} steps with Kp={args.kp} Ki={args.ki} Kd={args.kd}")
+    print(f"Command difference vs recorded: mean {diff.mean():.3f}  max {diff.max():.3f}")
+    print(f"Mean |cmd|: recorded {np.abs(recorded).mean():.1f}  replayed {np.abs(replayed).mean():.1f}")
+
+
+if __name__ == "__main__":
+    main()
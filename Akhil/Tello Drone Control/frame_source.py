@@ -0,0 +1,175 @@
+"""
+Latest-frame-wins video source shared by the Tello and webcam scripts.
+
+A capture thread grabs frames as fast as the camera delivers them into a
+triple buffer: one slot being written, one holding the newest complete
+frame, one held by the consumer. Consumers never see a backlog of stale
+frames - they get the newest one with its capture time and sequence number,
+and frames that were overwritten before anyone took them are counted as
+dropped.
+
+    source = camera_source(cv2.VideoCapture(0)).start()   # webcam
+    source = tello_source(tello.get_frame_read()).start() # Tello stream
+
+    frame = source.latest()                    # Frame(image, t, seq) or None
+    frame = source.wait_next(frame.seq, 1.0)   # block until a newer frame
+    print(source.describe())                   # fps, age, dropped
+
+The image handed out stays valid until the consumer's next latest() or
+wait_next() call (its slot is then recycled); copy it to keep it longer.
+One consumer per source.
+"""
+
+import collections
+import threading
+import time
+
+TELLO_POLL = 0.002   # Seconds between checks of djitellopy's frame attribute
+
+# image: the frame array, t: time.monotonic() at capture, seq: 1, 2, ...
+Frame = collections.namedtuple("Frame", "image t seq")
+
+
+class FrameSource:
+    """ Capture thread + triple buffer around a grab(buffer) function.
+
+        grab(buffer) returns the next frame (filling `buffer` in place when it
+        can; buffer is None until that slot has been used once) or None when
+        the stream has ended.
+    """
+
+    def __init__(self, grab, name="camera", on_stop=None):
+        self.grab = grab
+        self.name = name
+        self.on_stop = on_stop
+
+        self.slots = [None, None, None]  # Frame per slot
+        self.back = 0                    # Being written by the capture thread
+        self.ready = 1                   # Newest complete frame
+        self.front = 2                   # Held by the consumer
+        self.fresh = False               # `ready` not taken yet
+        self.current = None              # Frame last handed out
+
+        self.cond = threading.Condition()
+        self.seq = 0
+        self.dropped = 0                 # Overwritten before being taken
+        self.interval = 0.0              # Smoothed time between frames (s)
+        self.last_t = 0.0
+
+        self.active = False
+        self.ended = False
+        self.thread = None
+
+    # ----------------------------
+    # Capture thread
+    # ----------------------------
+    def run(self):
+        while self.active:
+            slot = self.slots[self.back]
+            image = self.grab(slot.image if slot is not None else None)
+            now = time.monotonic()
+            if image is None:
+                break
+
+            with self.cond:
+                self.seq += 1
+                if self.last_t:
+                    self.interval += 0.1 * ((now - self.last_t) - self.interval)
+                self.last_t = now
+                self.slots[self.back] = Frame(image, now, self.seq)
+                if self.fresh:
+                    self.dropped += 1
+                self.back, self.ready = self.ready, self.back
+                self.fresh = True
+                self.cond.notify_all()
+
+        with self.cond:
+            self.ended = True
+            self.cond.notify_all()
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+        if self.on_stop is not None:
+            self.on_stop()
+
+    # ----------------------------
+    # Consumer
+    # ----------------------------
+    def take(self):
+        # Caller holds self.cond
+        if self.fresh:
+            self.front, self.ready = self.ready, self.front
+            self.fresh = False
+            self.current = self.slots[self.front]
+        return self.current
+
+    def latest(self):
+        """Newest frame (None before the first one). Never blocks on the camera."""
+        with self.cond:
+            return self.take()
+
+    def wait_next(self, seq=None, timeout=None):
+        """ Block until a frame newer than `seq` (default: the last one handed
+            out) is available and return it. None on timeout or end of stream.
+        """
+        if seq is None:
+            seq = self.current.seq if self.current is not None else 0
+        with self.cond:
+            if not self.cond.wait_for(lambda: self.seq > seq or self.ended, timeout):
+                return None
+            if self.seq <= seq:
+                return None
+            return self.take()
+
+    def age(self, now=None):
+        """Seconds since the newest frame was captured (inf before the first one)."""
+        if not self.last_t:
+            return float("inf")
+        if now is None:
+            now = time.monotonic()
+        return now - self.last_t
+
+    def fps(self):
+        return 1.0 / self.interval if self.interval > 0 else 0.0
+
+    def describe(self):
+        age = self.age()
+        age_text = f"{age * 1000:.0f}ms" if age != float("inf") else "-"
+        return f"{self.name} {self.fps():.1f}fps age:{age_text} frames={self.seq} dropped={self.dropped}"
+
+
+# ----------------------------
+# Sources
+# ----------------------------
+def camera_source(cap, name="camera"):
+    """FrameSource reading a cv2.VideoCapture into recycled buffers (released on stop)."""
+    def grab(buffer):
+        ok, image = cap.read(buffer)
+        return image if ok else None
+    return FrameSource(grab, name, on_stop=cap.release)
+
+
+def tello_source(frame_read, name="tello", poll=TELLO_POLL):
+    """ FrameSource over djitellopy's BackgroundFrameRead. The decoder swaps
+        in a new array per frame, so a change of identity is a new frame.
+    """
+    last = [None]
+
+    def grab(buffer):
+        while not frame_read.stopped:
+            image = frame_read.frame
+            if image is not last[0]:
+                last[0] = image
+                return image
+            time.sleep(poll)
+        return None
+    return FrameSource(grab, name)
@@ -0,0 +1,218 @@
+"""
+Landmark-feature gesture classifier.
+
+Each hand's 21 MediaPipe landmarks become one row of a (n, 21, 3) array;
+features for all hands are computed together with array ops and matched
+against the gesture templates in gestures.json by weighted distance
+(nearest template, or a vote among the k nearest):
+
+    extended   5  thumb..pinky extension, 0 curled .. 1 extended
+                  (tip distance from the wrist vs its middle joint)
+    straight   5  straightness at the middle joint, 0 bent .. 1 straight
+    direction  2  index finger direction (unit x, y in image pixels)
+
+Extension and straightness don't depend on hand orientation or size.
+Templates only constrain the feature groups they list ("straight"
+defaults to "extended"), may be restricted to one hand, and carry the
+drone command for the gesture, so adding a gesture is an edit to the JSON:
+
+    {"name": "Descend", "extended": [0, 1, 0, 0, 0], "direction": [0, 1], "rc": [0, 0, -1, 0]}
+
+    classifier = GestureClassifier()
+    names, distances = classifier.classify(points, ["Right", "Left"])
+
+    python gesture_classifier.py            # list gestures, time classify()
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+GESTURE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "gestures.json")
+UNKNOWN = "Unknown"
+
+# Landmark indices, thumb..pinky
+WRIST = 0
+MCP = [2, 5, 9, 13, 17]
+PIP = [3, 6, 10, 14, 18]
+TIP = [4, 8, 12, 16, 20]
+INDEX_MCP, INDEX_TIP, PINKY_MCP = 5, 8, 17
+
+# Every vector the features need, as (to, from) landmark pairs, so they come
+# out of one gather and one subtraction:
+#   0-3   finger tips - wrist          4-7   finger PIPs - wrist
+#   8     thumb tip - pinky MCP        9     thumb MCP - pinky MCP
+#   10-14 PIP - MCP (all five)         15-19 tip - PIP (all five)
+#   20    index tip - index MCP
+VECTOR_TO = np.array(TIP[1:] + PIP[1:] + [TIP[0], MCP[0]] + PIP + TIP + [INDEX_TIP])
+VECTOR_FROM = np.array([WRIST] * 8 + [PINKY_MCP] * 2 + MCP + PIP + [INDEX_MCP])
+
+# Extension ratio mapped to 0..1 over these ranges (overridable in the JSON)
+FINGER_RANGE = (0.95, 1.25)   # |tip - wrist| / |pip - wrist|
+THUMB_RANGE = (1.0, 1.5)      # |tip - pinky mcp| / |thumb mcp - pinky mcp|
+
+GROUPS = (("extended", 5), ("straight", 5), ("direction", 2))
+FEATURES = sum(size for _, size in GROUPS)
+HANDS = {None: 0, "Right": 1, "Left": 2}
+
+
+# ----------------------------
+# Landmarks -> arrays
+# ----------------------------
+def landmarks_array(hand_landmarks_list, width=1, height=1):
+    """MediaPipe multi_hand_landmarks -> (n, 21, 3) array (x, y scaled to pixels)."""
+    points = np.array([[(p.x, p.y, p.z) for p in hand.landmark] for hand in hand_landmarks_list],
+                      dtype=np.float32).reshape(-1, 21, 3)
+    points[..., 0] *= width
+    points[..., 1] *= height
+    return points
+
+
+def norm(v):
+    return np.sqrt((v * v).sum(-1))
+
+
+def ramp(x, lo, hi):
+    # np.clip costs more than the arithmetic on arrays this small
+    return np.minimum(np.maximum((x - lo) * (1.0 / (hi - lo)), 0.0), 1.0)
+
+
+def hand_features(points, finger_range=FINGER_RANGE, thumb_range=THUMB_RANGE):
+    """(n, 21, 2+) landmarks -> (n, FEATURES) feature rows. Uses x and y only."""
+    p = np.asarray(points, dtype=np.float32)[..., :2]
+    features = np.empty((len(p), FEATURES), dtype=np.float32)
+
+    v = p[:, VECTOR_TO] - p[:, VECTOR_FROM]      # (n, 21, 2)
+    length = norm(v) + 1e-6                      # (n, 21)
+
+    # Fingers: how far the tip reaches past the middle joint, seen from the wrist.
+    # Thumb: how far the tip is from the far side of the palm.
+    features[:, 1:5] = length[:, 0:4] / length[:, 4:8]
+    features[:, 0] = length[:, 8] / length[:, 9]
+    features[:, 0] = ramp(features[:, 0], *thumb_range)
+    features[:, 1:5] = ramp(features[:, 1:5], *finger_range)
+
+    # Cosine of the bend at the middle joint of every finger
+    cos = (v[:, 10:15] * v[:, 15:20]).sum(-1) / (length[:, 10:15] * length[:, 15:20])
+    features[:, 5:10] = np.minimum(np.maximum(cos, 0.0), 1.0)
+
+    features[:, 10:12] = v[:, 20] / length[:, 20, None]
+    return features
+
+
+# ----------------------------
+# Classifier
+# ----------------------------
+class GestureClassifier:
+    """ Gesture templates from a JSON table, matched in one batched call. """
+
+    def __init__(self, path=GESTURE_FILE):
+        with open(path) as f:
+            table = json.load(f)
+
+        self.path = path
+        self.k = int(table.get("k", 1))
+        self.max_distance = float(table.get("max_distance", 0.1))
+        self.finger_range = tuple(table.get("finger_range", FINGER_RANGE))
+        self.thumb_range = tuple(table.get("thumb_range", THUMB_RANGE))
+        group_weights = table.get("weights", {})
+
+        gestures = table["gestures"]
+        self.names = [g["name"] for g in gestures]
+        self.templates = np.zeros((len(gestures), FEATURES), dtype=np.float32)
+        self.weights = np.zeros((len(gestures), FEATURES), dtype=np.float32)
+        self.hands = np.zeros(len(gestures), dtype=np.int8)
+
+        # name -> {"rc": [lr, fb, ud, yaw] in units of speed, "action": ...}
+        self.commands = {}
+
+        for i, g in enumerate(gestures):
+            values = dict(g)
+            if "straight" not in values and "extended" in values:
+                values["straight"] = values["extended"]
+            start = 0
+            for group, size in GROUPS:
+                if group in values:
+                    if len(values[group]) != size:
+                        raise ValueError(f"{path}: {g['name']} '{group}' needs {size} values")
+                    self.templates[i, start:start + size] = values[group]
+                    self.weights[i, start:start + size] = group_weights.get(group, 1.0)
+                start += size
+            if not self.weights[i].any():
+                raise ValueError(f"{path}: {g['name']} has no features")
+            self.hands[i] = HANDS[g.get("hand")]
+            self.commands.setdefault(g["name"], {k: v for k, v in g.items() if k in ("rc", "action")})
+
+        self.weight_sums = self.weights.sum(1)
+        self.names_array = np.array(self.names + [UNKNOWN], dtype=object)
+
+    def distances(self, features, labels):
+        """(n, templates) weighted mean squared distance; inf where the hand doesn't match."""
+        diff = features[:, None, :] - self.templates[None]
+        d = (diff * diff * self.weights[None]).sum(-1) / self.weight_sums
+        hands = np.array([HANDS.get(label, 0) for label in labels], dtype=np.int8)
+        mismatch = (self.hands[None] != 0) & (self.hands[None] != hands[:, None])
+        d[mismatch] = np.inf
+        return d
+
+    def classify(self, points, labels):
+        """ points: (n, 21, 3) landmarks, labels: handedness per hand.
+            Returns (names, distances): a gesture name (or "Unknown") and the
+            best template distance per hand.
+        """
+        if not len(points):
+            return [], np.empty(0, dtype=np.float32)
+        d = self.distances(hand_features(points, self.finger_range, self.thumb_range), labels)
+        best = d.argmin(1)
+        best_d = d[np.arange(len(d)), best]
+
+        if self.k > 1:
+            # Vote among the k nearest templates; ties go to the nearest
+            nearest = np.argsort(d, 1)[:, :self.k]
+            for row, candidates in enumerate(nearest):
+                votes = {}
+                for j in candidates:
+                    if np.isfinite(d[row, j]):
+                        votes[self.names[j]] = votes.get(self.names[j], 0) + 1
+                if votes:
+                    winner = max(votes, key=lambda name: (votes[name], -d[row, self.names.index(name)]))
+                    best[row] = self.names.index(winner)
+
+        best[best_d > self.max_distance] = len(self.names)
+        return self.names_array[best].tolist(), best_d
+
+
+# ----------------------------
+# Benchmark
+# ----------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Gesture table and classifier timing")
+    parser.add_argument("--table", default=GESTURE_FILE)
+    parser.add_argument("--hands", type=int, default=2)
+    parser.add_argument("--runs", type=int, default=20000)
+    args = parser.parse_args()
+
+    classifier = GestureClassifier(args.table)
+    print(f"{len(classifier.names)} templates from {args.table} (k={classifier.k}, "
+          f"max distance {classifier.max_distance})")
+    for name, command in classifier.commands.items():
+        print(f"  {name:10s} {command}")
+
+    rng = np.random.default_rng(0)
+    points = rng.uniform(0, 480, (args.hands, 21, 3)).astype(np.float32)
+    labels = ["Right", "Left"] * args.hands
+    labels = labels[:args.hands]
+    classifier.classify(points, labels)
+
+    start = time.perf_counter()
+    for _ in range(args.runs):
+        classifier.classify(points, labels)
+    elapsed = (time.perf_counter() - start) / args.runs
+    print(f"\nclassify({args.hands} hands): {elapsed * 1e6:.1f} us per call")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,11 @@
 import cv2
 import mediapipe as mp
 import math
-from collections import deque
-from djitellopy import Tello
+import threading
+from collections import deque, namedtuple
+from tello_sim import create_tello
+from frame_source import camera_source
+from gesture_classifier import GestureClassifier, landmarks_array, UNKNOWN
 import time
 
 # =============================
@@ -10,6 +13,18 @@ import time
 # =============================
 USE_TELLO = True      # <-- change to False for testing without drone
 SPEED = 30            # Drone speed (20–40 is safe)
+MAX_HANDS = 2         # Hands classified per frame (gestures.json holds the gesture table)
+
+RC_HZ = 20            # RC commands go out on this fixed schedule
+HOVER_TIMEOUT = 0.5   # No hand for this long -> hover
+
+DETECT_WIDTH = 320    # Full-frame detection runs on a frame downscaled to this width
+ROI_SIZE = 192        # Tracked hand crop is resized to ROI_SIZE x ROI_SIZE
+ROI_MARGIN = 0.5      # Crop = hand box grown by this fraction on each side
+ROI_MIN = 64          # Smallest crop side (pixels of the camera frame)
+
+VOTE_WINDOW = 10      # Stabilizer: a gesture needs VOTE_MIN of the last VOTE_WINDOW
+VOTE_MIN = 7
 
 # =============================
 # Utils
@@ -21,10 +36,17 @@ def distance(a, b):
 # MediaPipe Setup
 # =============================
 mp_hands = mp.solutions.hands
-mp_draw = mp.solutions.drawing_utils
 
-hands = mp_hands.Hands(
-    max_num_hands=1,
+# Full-frame search (downscaled); each call is independent
+detector = mp_hands.Hands(
+    static_image_mode=True,
+    max_num_hands=MAX_HANDS,
+    min_detection_confidence=0.75
+)
+
+# Follows the hand inside a crop around its last position
+tracker = mp_hands.Hands(
+    max_num_hands=MAX_HANDS,
     min_detection_confidence=0.75,
     min_tracking_confidence=0.75
 )
@@ -41,11 +63,14 @@ if not cap.isOpened():
 
 print("✅ Camera ready")
 
+# Capture thread: the inference stage always gets the newest frame
+source = camera_source(cap).start()
+
 # =============================
 # Tello Setup
 # =============================
 if USE_TELLO:
-    tello = Tello()
+    tello = create_tello()
     tello.connect()
     print("Battery:", tello.get_battery())
     tello.send_rc_control(0, 0, 0, 0)
@@ -57,136 +82,297 @@ else:
 # =============================
 # Stabilizer
 # =============================
-history = deque(maxlen=10)
-
-def stabilize(g):
-    history.append(g)
-    if history.count(g) > 6:
-        return g
-    return "Detecting..."
+class Stabilizer:
+    """ Majority vote over the last VOTE_WINDOW gestures with rolling counts (O(1) per frame). """
+
+    def __init__(self, window=VOTE_WINDOW, needed=VOTE_MIN):
+        self.window = window
+        self.needed = needed
+        self.history = deque()
+        self.counts = {}
+
+    def update(self, g):
+        if len(self.history) == self.window:
+            old = self.history.popleft()
+            self.counts[old] -= 1
+        self.history.append(g)
+        count = self.counts.get(g, 0) + 1
+        self.counts[g] = count
+        if count >= self.needed:
+            return g
+        return "Detecting..."
 
 # =============================
-# Gesture detection
+# Gesture classification (gestures.json)
 # =============================
-def detect_gesture(lm, hand_label):
-
-    thumb_tip, thumb_ip = lm[4], lm[3]
-    index_tip, index_pip = lm[8], lm[6]
-    middle_tip, middle_pip = lm[12], lm[10]
-    ring_tip, ring_pip = lm[16], lm[14]
-    pinky_tip, pinky_pip = lm[20], lm[18]
-
-    index_up = index_tip.y < index_pip.y
-    middle_up = middle_tip.y < middle_pip.y
-    ring_up = ring_tip.y < ring_pip.y
-    pinky_up = pinky_tip.y < pinky_pip.y
-
-    if hand_label == "Right":
-        thumb_up = thumb_tip.x < thumb_ip.x
-    else:
-        thumb_up = thumb_tip.x > thumb_ip.x
-
-    fingers = [thumb_up, index_up, middle_up, ring_up, pinky_up]
-
-    if fingers == [0,0,0,0,0]:
-        return "Hover"
-    if fingers == [0,1,0,0,0]:
-        return "Up"
-    if fingers == [1,1,1,1,1]:
-        return "Forward"
-    if fingers == [1,0,0,0,0]:
-        return "Right" if hand_label == "Right" else "Left"
-    if fingers == [0,1,1,0,0]:
-        return "Land"
-
-    return "Unknown"
+classifier = GestureClassifier()
 
 # =============================
-# Send command to Tello
+# Inference stage
 # =============================
-def send_command(gesture):
-    global flying
-
-    if not USE_TELLO:
-        print("Gesture:", gesture)
-        return
-
-    if not flying and gesture != "Land":
-        tello.send_rc_control(0, 0, 0, 0)
-        return
-
-    if gesture == "Hover":
-        tello.send_rc_control(0, 0, 0, 0)
-
-    elif gesture == "Up":
-        tello.send_rc_control(0, 0, SPEED, 0)
-
-    elif gesture == "Forward":
-        tello.send_rc_control(0, SPEED, 0, 0)
-
-    elif gesture == "Left":
-        tello.send_rc_control(-SPEED, 0, 0, 0)
-
-    elif gesture == "Right":
-        tello.send_rc_control(SPEED, 0, 0, 0)
+# gesture: stabilized, raw: per-hand gestures, labels: handedness per hand,
+# points: (hands, 21, 3) or None, box: (x, y, side) crop for the next frame or None,
+# t/seq: capture time/number of the frame, view: mirrored frame for display,
+# infer: seconds spent in MediaPipe
+GestureResult = namedtuple("GestureResult", "gesture raw labels points box t seq view infer")
+
+
+def hand_box(pts, width, height):
+    """Square crop (x, y, side) around all hands' landmarks, in mirrored frame pixels."""
+    x_min, y_min = pts[..., 0].min(), pts[..., 1].min()
+    x_max, y_max = pts[..., 0].max(), pts[..., 1].max()
+    side = max(x_max - x_min, y_max - y_min) * (1 + 2 * ROI_MARGIN)
+    side = int(min(max(side, ROI_MIN), width, height))
+    x = int((x_min + x_max) / 2 - side / 2)
+    y = int((y_min + y_max) / 2 - side / 2)
+    return (min(max(x, 0), width - side), min(max(y, 0), height - side), side)
+
+
+def run_hands(hands, image, x0, y0, sx, sy):
+    """ MediaPipe on a small BGR image (mirrored here). Returns ((hands, 21, 3)
+        points in mirrored frame pixels, labels) or (None, None).
+    """
+    rgb = cv2.cvtColor(cv2.flip(image, 1), cv2.COLOR_BGR2RGB)
+    result = hands.process(rgb)
+    if not (result.multi_hand_landmarks and result.multi_handedness):
+        return None, None
+    pts = landmarks_array(result.multi_hand_landmarks, sx, sy)
+    pts[..., 0] += x0
+    pts[..., 1] += y0
+    return pts, [h.classification[0].label for h in result.multi_handedness]
+
+
+class GestureEngine:
+    """ Inference thread: newest frame -> landmarks -> stabilized gesture.
+
+        While a hand is tracked only a ROI_SIZE crop around it is processed;
+        when it is lost the next frame is searched whole at DETECT_WIDTH.
+        Frames that arrive while a frame is being processed are skipped.
+    """
+
+    def __init__(self, source):
+        self.source = source
+        self.stabilizer = Stabilizer()
+        self.result = None
+        self.infer_time = 0.0     # Smoothed seconds per processed frame
+        self.processed = 0
+        self.searches = 0         # Full-frame detections
+        self.active = False
+        self.thread = None
+
+    def process(self, frame):
+        image = frame.image
+        height, width = image.shape[:2]
+        previous = self.result
+        box = previous.box if previous is not None else None
+
+        start = time.perf_counter()
+        pts = None
+        if box is not None:
+            # Crop in mirrored coordinates = the same columns counted from the right
+            x, y, side = box
+            crop = image[y:y + side, width - x - side:width - x]
+            pts, labels = run_hands(tracker, cv2.resize(crop, (ROI_SIZE, ROI_SIZE), interpolation=cv2.INTER_AREA),
+                                    x, y, side, side)
+        if pts is None:
+            self.searches += 1
+            small = cv2.resize(image, (DETECT_WIDTH, DETECT_WIDTH * height // width), interpolation=cv2.INTER_AREA)
+            pts, labels = run_hands(detector, small, 0, 0, width, height)
+        infer = time.perf_counter() - start
+
+        if pts is None:
+            gesture = "None"
+            raw = labels = box = None
+        else:
+            # All hands in one call; the first recognised one drives the drone
+            raw, _ = classifier.classify(pts, labels)
+            gesture = next((g for g in raw if g != UNKNOWN), UNKNOWN)
+            gesture = self.stabilizer.update(gesture)
+            box = hand_box(pts, width, height)
+
+        self.infer_time += 0.1 * (infer - self.infer_time)
+        self.processed += 1
+        # Publish for actuation first, the display copy after
+        self.result = GestureResult(gesture, raw, labels, pts, box, frame.t, frame.seq, None, infer)
+        self.result = self.result._replace(view=cv2.flip(image, 1))
+
+    def run(self):
+        while self.active:
+            frame = self.source.wait_next(timeout=0.5)
+            if frame is None:
+                if self.source.ended:
+                    break
+                continue
+            self.process(frame)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
 
-    elif gesture == "Land" and flying:
-        tello.land()
-        flying = False
+# =============================
+# Actuation stage
+# =============================
+# From gestures.json: "rc" is [lr, fb, ud, yaw] in units of SPEED
+RC_COMMANDS = {name: tuple(int(v * SPEED) for v in command["rc"])
+               for name, command in classifier.commands.items() if "rc" in command}
+LAND_GESTURES = {name for name, command in classifier.commands.items() if command.get("action") == "land"}
+
+
+class Actuator:
+    """ Sends RC at RC_HZ from the newest stabilized gesture.
+
+        Ambiguous frames ("Detecting...", "Unknown") keep the last command;
+        no hand for HOVER_TIMEOUT hovers. takeoff/land also run here, so all
+        drone commands leave from one thread. Land is acted on once, and
+        both land and takeoff reset the held gesture to Hover, so a stale
+        command never carries over into the next flight.
+    """
+
+    def __init__(self, engine, hz=RC_HZ):
+        self.engine = engine
+        self.period = 1.0 / hz
+        self.rc = (0, 0, 0, 0)
+        self.gesture = "None"
+        self.printed = None       # USE_TELLO = False: last gesture printed
+        self.last_hand = 0.0
+        self.seq = 0
+        self.takeoff_requested = False
+        self.latency = 0.0        # Smoothed frame capture -> command sent (s)
+        self.sent = 0
+        self.active = False
+        self.thread = None
+
+    def step(self, now):
+        global flying
+
+        result = self.engine.result
+        new_result = result is not None and result.seq != self.seq
+        if new_result:
+            self.seq = result.seq
+            if result.points is not None:
+                self.last_hand = now
+            if result.gesture in RC_COMMANDS or result.gesture in LAND_GESTURES:
+                self.gesture = result.gesture
+
+        if self.takeoff_requested:
+            self.takeoff_requested = False
+            if USE_TELLO and not flying:
+                tello.takeoff()
+                flying = True
+            self.gesture = "Hover"
+            return
+
+        if now - self.last_hand > HOVER_TIMEOUT:
+            self.gesture = "Hover"
+
+        if not USE_TELLO:
+            if new_result and result.gesture != self.printed and result.gesture != "Detecting...":
+                self.printed = result.gesture
+                print("Gesture:", result.gesture)
+        elif self.gesture in LAND_GESTURES:
+            if flying:
+                tello.land()
+                flying = False
+            self.gesture = "Hover"   # Land only on the tick that acts on it
+            self.rc = (0, 0, 0, 0)
+            tello.send_rc_control(*self.rc)
+        else:
+            self.rc = RC_COMMANDS.get(self.gesture, (0, 0, 0, 0)) if flying else (0, 0, 0, 0)
+            tello.send_rc_control(*self.rc)
+        self.sent += 1
+
+        if new_result:
+            self.latency += 0.2 * ((time.monotonic() - result.t) - self.latency)
+
+    def run(self):
+        deadline = time.monotonic()
+        while self.active:
+            self.step(time.monotonic())
+            deadline += self.period
+            now = time.monotonic()
+            if now > deadline:
+                deadline = now
+            time.sleep(deadline - now)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=2)
 
 # =============================
-# Main Loop
+# Main Loop (display + keys)
 # =============================
 print("Press T = Takeoff | Q = Quit")
 
-while True:
-    ret, frame = cap.read()
-    if not ret:
-        break
+engine = GestureEngine(source).start()
+actuator = Actuator(engine).start()
 
-    frame = cv2.flip(frame, 1)
-    rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-    result = hands.process(rgb)
-
-    gesture = "None"
-
-    if result.multi_hand_landmarks and result.multi_handedness:
-        for lm_set, hand_info in zip(result.multi_hand_landmarks,
-                                     result.multi_handedness):
-
-            lm = lm_set.landmark
-            hand_label = hand_info.classification[0].label
-
-            gesture = detect_gesture(lm, hand_label)
-            gesture = stabilize(gesture)
+shown = 0
+while True:
+    result = engine.result
+    if result is not None and result.seq != shown and result.view is not None:
+        shown = result.seq
+        frame = result.view
 
-            send_command(gesture)
+        if result.points is not None:
+            for hand, label, name in zip(result.points[..., :2].astype(int), result.labels, result.raw):
+                for a, b in mp_hands.HAND_CONNECTIONS:
+                    cv2.line(frame, tuple(hand[a]), tuple(hand[b]), (255, 255, 255), 2)
+                for x, y in hand:
+                    cv2.circle(frame, (x, y), 3, (0, 0, 255), -1)
+                cv2.putText(frame, f"{label}: {name}", (int(hand[0, 0]) - 40, int(hand[0, 1]) + 25),
+                            cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 255, 255), 2)
+            x, y, side = result.box
+            cv2.rectangle(frame, (x, y), (x + side, y + side), (255, 0, 255), 1)
 
-            mp_draw.draw_landmarks(frame, lm_set, mp_hands.HAND_CONNECTIONS)
+        cv2.putText(frame, f"Gesture: {result.gesture}", (30, 60),
+                    cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0,255,0), 3)
 
-    cv2.putText(frame, f"Gesture: {gesture}", (30, 60),
-                cv2.FONT_HERSHEY_SIMPLEX, 1.2, (0,255,0), 3)
+        cv2.putText(frame, "T=Takeoff  Q=Quit", (30, 100),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,0), 2)
 
-    cv2.putText(frame, "T=Takeoff  Q=Quit", (30, 100),
-                cv2.FONT_HERSHEY_SIMPLEX, 0.8, (255,255,0), 2)
+        cv2.putText(frame, f"Infer {engine.infer_time * 1000:.0f}ms  Latency {actuator.latency * 1000:.0f}ms  "
+                    f"Dropped {source.dropped}", (30, 135),
+                    cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255,255,255), 1)
 
-    cv2.imshow("Gesture Tello Control", frame)
+        cv2.imshow("Gesture Tello Control", frame)
 
-    key = cv2.waitKey(1) & 0xFF
+    key = cv2.waitKey(5) & 0xFF
 
     if key == ord('t') and USE_TELLO and not flying:
-        tello.takeoff()
-        flying = True
+        actuator.takeoff_requested = True
 
     if key == ord('q'):
         break
 
+    if source.ended:
+        break
+
 # =============================
 # Cleanup
 # =============================
+actuator.stop()
+engine.stop()
+
 if USE_TELLO:
     tello.send_rc_control(0, 0, 0, 0)
     tello.end()
 
-cap.release()
+source.stop()  # releases the camera
+print(source.describe())
+print(f"Processed {engine.processed} frames, {engine.searches} full-frame searches, "
+      f"infer {engine.infer_time * 1000:.1f}ms, latency {actuator.latency * 1000:.1f}ms")
 cv2.destroyAllWindows()
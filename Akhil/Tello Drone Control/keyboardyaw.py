@@ -1,7 +1,11 @@
-from djitellopy import Tello
+from tello_sim import create_tello
+import collections
 import pygame
 import time
-import cv2
+
+from yaw_controller import YawPID
+from frame_source import tello_source
+from yaw_runtime import ControlLoop, VideoView, Hud, RENDER_FPS
 
 # ----------------------------
 # Window
@@ -31,6 +35,14 @@ MAX_CMD_STEP = 6
 
 INTEGRAL_LIMIT = 120
 
+# ----------------------------
+# Rates
+# ----------------------------
+CONTROL_HZ = 40      # PID + RC, on the control thread
+
+# What the control thread publishes for the display
+Snapshot = collections.namedtuple("Snapshot", "target_yaw drone_yaw error cmd bat")
+
 
 # ----------------------------
 # Angle unwrap helper
@@ -56,8 +68,6 @@ def get_target_yaw_from_source(target_yaw):
 
 
 def main():
-    global KP, KI, KD
-
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Tello Continuous Yaw PID (360°)")
@@ -68,13 +78,13 @@ def main():
     # ----------------------------
     # Tello setup
     # ----------------------------
-    tello = Tello()
+    tello = create_tello(telemetry=True)
     tello.connect()
     print("Battery:", tello.get_battery(), "%")
 
     tello.streamoff()
     tello.streamon()
-    frame_read = tello.get_frame_read()
+    source = tello_source(tello.get_frame_read()).start()
 
     tello.takeoff()
     time.sleep(2)
@@ -89,15 +99,46 @@ def main():
     filtered_yaw = unwrapped_yaw
     target_yaw = unwrapped_yaw   # start tracking current heading
 
-    prev_error = 0.0
-    prev_time = time.time()
-    integral = 0.0
-    last_cmd = 0.0
+    pid = YawPID(KP, KI, KD, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                 deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT,
+                 max_cmd_step=MAX_CMD_STEP, cmd_smoothing=CMD_SMOOTHING)
+
+    # ----------------------------
+    # Control thread: yaw feedback, PID, RC
+    # ----------------------------
+    def control_step(now):
+        nonlocal prev_raw_yaw, filtered_yaw
+
+        state = tello.telemetry.state  # Latest pushed state, no SDK call
+        target = get_target_yaw_from_source(target_yaw)
+
+        # Yaw feedback (unwrap)
+        raw_yaw = unwrap_angle(prev_raw_yaw, state.yaw)
+        prev_raw_yaw = raw_yaw
+
+        filtered_yaw = (
+            (1 - YAW_FILTER_ALPHA) * filtered_yaw
+            + YAW_FILTER_ALPHA * raw_yaw
+        )
+
+        error = target - filtered_yaw
+
+        # PID (measured dt)
+        cmd = pid.step(error, now=now)
+
+        tello.send_rc_control(0, 0, 0, int(cmd))
+        return Snapshot(target, filtered_yaw, error, int(cmd), state.bat)
+
+    control = ControlLoop(control_step, hz=CONTROL_HZ).start()
+
+    # ----------------------------
+    # Render loop (display rate, reads snapshots only)
+    # ----------------------------
+    video = VideoView((WIDTH, HEIGHT))
+    hud = Hud(font, line_height=26)
 
     running = True
     while running:
-        clock.tick(40)
-
         # ----------------------------
         # Events
         # ----------------------------
@@ -111,22 +152,22 @@ def main():
 
                 # PID tuning
                 elif event.key == pygame.K_q:
-                    KP += 0.05
+                    pid.kp += 0.05
                 elif event.key == pygame.K_a:
-                    KP = max(0, KP - 0.05)
+                    pid.kp = max(0, pid.kp - 0.05)
 
                 elif event.key == pygame.K_w:
-                    KD += 0.02
+                    pid.kd += 0.02
                 elif event.key == pygame.K_s:
-                    KD = max(0, KD - 0.02)
+                    pid.kd = max(0, pid.kd - 0.02)
 
                 elif event.key == pygame.K_e:
-                    KI += 0.002
+                    pid.ki += 0.002
                 elif event.key == pygame.K_d:
-                    KI = max(0, KI - 0.002)
+                    pid.ki = max(0, pid.ki - 0.002)
 
                 elif event.key == pygame.K_r:
-                    integral = 0.0
+                    pid.integral = 0.0
 
                 # Continuous target yaw (direction preserved)
                 elif event.key == pygame.K_UP:
@@ -135,98 +176,40 @@ def main():
                 elif event.key == pygame.K_DOWN:
                     target_yaw -= TARGET_STEP
 
-        # ----------------------------
-        # Target yaw interface
-        # ----------------------------
-        target_yaw = get_target_yaw_from_source(target_yaw)
-
-        # ----------------------------
-        # Yaw feedback (unwrap)
-        # ----------------------------
-        raw_yaw = tello.get_yaw()
-        raw_yaw = unwrap_angle(prev_raw_yaw, raw_yaw)
-        prev_raw_yaw = raw_yaw
-
-        unwrapped_yaw = raw_yaw
-
-        filtered_yaw = (
-            (1 - YAW_FILTER_ALPHA) * filtered_yaw
-            + YAW_FILTER_ALPHA * unwrapped_yaw
-        )
-
-        error = target_yaw - filtered_yaw
-
-        # ----------------------------
-        # Timing
-        # ----------------------------
-        now = time.time()
-        dt = max(0.001, now - prev_time)
-        prev_time = now
-
-        # ----------------------------
-        # PID
-        # ----------------------------
-        derivative = (error - prev_error) / dt
-        prev_error = error
-
-        integral += error * dt
-        integral = max(-INTEGRAL_LIMIT, min(INTEGRAL_LIMIT, integral))
-
-        cmd = KP * error + KD * derivative + KI * integral
-
-        if abs(error) < DEADBAND:
-            cmd = 0
-            integral *= 0.9
-
-        cmd = max(-MAX_SPEED, min(MAX_SPEED, cmd))
-
-        if cmd > 0:
-            cmd = max(MIN_SPEED, cmd)
-        elif cmd < 0:
-            cmd = min(-MIN_SPEED, cmd)
-
-        if cmd > last_cmd + MAX_CMD_STEP:
-            cmd = last_cmd + MAX_CMD_STEP
-        elif cmd < last_cmd - MAX_CMD_STEP:
-            cmd = last_cmd - MAX_CMD_STEP
-
-        cmd = (1 - CMD_SMOOTHING) * last_cmd + CMD_SMOOTHING * cmd
-        last_cmd = cmd
-
-        tello.send_rc_control(0, 0, 0, int(cmd))
-
-        # ----------------------------
-        # Video
-        # ----------------------------
-        frame = frame_read.frame
-        frame = cv2.resize(frame, (WIDTH, HEIGHT))
-        frame = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
-        screen.blit(frame, (0, 0))
-
-        # ----------------------------
-        # Overlay
-        # ----------------------------
-        info = [
-            f"Battery      : {tello.get_battery()}%",
-            f"Target yaw   : {target_yaw:7.1f} deg",
-            f"Drone yaw    : {filtered_yaw:7.1f} deg",
-            f"Error        : {error:7.1f}",
-            f"Yaw command  : {int(cmd)}",
-            "",
-            f"Kp: {KP:.3f} (Q/A)",
-            f"Kd: {KD:.3f} (W/S)",
-            f"Ki: {KI:.4f} (E/D)",
-            "UP/DOWN = rotate target (continuous)",
-            "ESC = land & exit"
-        ]
-
-        y = 20
-        for line in info:
-            txt = font.render(line, True, (255, 255, 255))
-            screen.blit(txt, (20, y))
-            y += 26
-
-        pygame.display.flip()
+        snap = control.snapshot
+        if snap is not None:
+            # ----------------------------
+            # Overlay
+            # ----------------------------
+            info = [
+                f"Battery      : {snap.bat}%",
+                f"Target yaw   : {snap.target_yaw:7.1f} deg",
+                f"Drone yaw    : {snap.drone_yaw:7.1f} deg",
+                f"Error        : {snap.error:7.1f}",
+                f"Yaw command  : {snap.cmd}",
+                "",
+                f"Kp: {pid.kp:.3f} (Q/A)",
+                f"Kd: {pid.kd:.3f} (W/S)",
+                f"Ki: {pid.ki:.4f} (E/D)",
+                "UP/DOWN = rotate target (continuous)",
+                "ESC = land & exit"
+            ]
+
+            # ----------------------------
+            # Video (only when something changed)
+            # ----------------------------
+            new_frame = video.update(source.latest())
+            if hud.update(info) or new_frame:
+                video.draw(screen)
+                hud.draw(screen, (20, 20))
+                pygame.display.flip()
+
+        clock.tick(RENDER_FPS)
+
+    control.stop()
+    source.stop()
+    print(control.describe())
+    print(source.describe())
 
     # ----------------------------
     # Cleanup
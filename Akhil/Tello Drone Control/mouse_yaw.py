@@ -1,8 +1,11 @@
-from djitellopy import Tello
+from tello_sim import create_tello
+import collections
 import pygame
 import time
-import cv2
-import numpy as np
+
+from yaw_controller import YawPID
+from frame_source import tello_source
+from yaw_runtime import ControlLoop, VideoView, Hud, RENDER_FPS
 
 # ----------------------------
 # Window
@@ -29,6 +32,11 @@ MAX_CMD_STEP = 6
 
 INTEGRAL_LIMIT = 100
 
+CONTROL_HZ = 40      # PID + RC, on the control thread
+
+# What the control thread publishes for the display
+Snapshot = collections.namedtuple("Snapshot", "target_yaw drone_yaw error cmd bat")
+
 
 def angle_diff(target, current):
     d = target - current
@@ -40,8 +48,6 @@ def angle_diff(target, current):
 
 
 def main():
-    global KP, KI, KD
-
     pygame.init()
     screen = pygame.display.set_mode((WIDTH, HEIGHT))
     pygame.display.set_caption("Tello PID Yaw Control + Video")
@@ -51,7 +57,7 @@ def main():
     # ----------------------------
     # Tello setup
     # ----------------------------
-    tello = Tello()
+    tello = create_tello(telemetry=True)
     tello.connect()
 
     print("Battery:", tello.get_battery(), "%")
@@ -59,7 +65,7 @@ def main():
     tello.streamoff()
     tello.streamon()
 
-    frame_read = tello.get_frame_read()
+    source = tello_source(tello.get_frame_read()).start()
 
     tello.takeoff()
     time.sleep(2)
@@ -69,16 +75,42 @@ def main():
     # ----------------------------
     clock = pygame.time.Clock()
 
-    prev_error = 0
-    prev_time = time.time()
+    pid = YawPID(KP, KI, KD, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                 deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT,
+                 max_cmd_step=MAX_CMD_STEP, cmd_smoothing=CMD_SMOOTHING)
     filtered_yaw = tello.get_yaw()
-    last_cmd = 0
-    integral = 0
+
+    # Written by the render loop (mouse), read by the control thread
+    target_yaw = 0.0
+
+    # ----------------------------
+    # Control thread: yaw feedback, PID, RC
+    # ----------------------------
+    def control_step(now):
+        nonlocal filtered_yaw
+
+        target = target_yaw
+        state = tello.telemetry.state  # Latest pushed state, no SDK call
+        filtered_yaw = (1 - YAW_FILTER_ALPHA) * filtered_yaw + YAW_FILTER_ALPHA * state.yaw
+
+        error = angle_diff(target, filtered_yaw)
+
+        # PID (measured dt)
+        cmd = pid.step(error, now=now)
+
+        tello.send_rc_control(0, 0, 0, int(cmd))
+        return Snapshot(target, filtered_yaw, error, int(cmd), state.bat)
+
+    control = ControlLoop(control_step, hz=CONTROL_HZ).start()
+
+    # ----------------------------
+    # Render loop (display rate, reads snapshots only)
+    # ----------------------------
+    video = VideoView((WIDTH, HEIGHT))
+    hud = Hud(font, line_height=28)
 
     running = True
     while running:
-        clock.tick(40)  # 40 Hz loop
-
         # ----------------------------
         # Events
         # ----------------------------
@@ -91,22 +123,22 @@ def main():
                     running = False
 
                 elif event.key == pygame.K_q:
-                    KP += 0.05
+                    pid.kp += 0.05
                 elif event.key == pygame.K_a:
-                    KP = max(0, KP - 0.05)
+                    pid.kp = max(0, pid.kp - 0.05)
 
                 elif event.key == pygame.K_w:
-                    KD += 0.02
+                    pid.kd += 0.02
                 elif event.key == pygame.K_s:
-                    KD = max(0, KD - 0.02)
+                    pid.kd = max(0, pid.kd - 0.02)
 
                 elif event.key == pygame.K_e:
-                    KI += 0.002
+                    pid.ki += 0.002
                 elif event.key == pygame.K_d:
-                    KI = max(0, KI - 0.002)
+                    pid.ki = max(0, pid.ki - 0.002)
 
                 elif event.key == pygame.K_r:
-                    integral = 0
+                    pid.integral = 0.0
 
         # ----------------------------
         # Mouse → target yaw
@@ -114,94 +146,39 @@ def main():
         mouse_x, _ = pygame.mouse.get_pos()
         target_yaw = ((mouse_x / WIDTH) * 2 - 1) * MAX_YAW
 
-        # ----------------------------
-        # Yaw feedback
-        # ----------------------------
-        raw_yaw = tello.get_yaw()
-        filtered_yaw = (1 - YAW_FILTER_ALPHA) * filtered_yaw + YAW_FILTER_ALPHA * raw_yaw
-
-        error = angle_diff(target_yaw, filtered_yaw)
-
-        # ----------------------------
-        # Timing
-        # ----------------------------
-        now = time.time()
-        dt = max(0.001, now - prev_time)
-        prev_time = now
-
-        # ----------------------------
-        # PID
-        # ----------------------------
-        derivative = (error - prev_error) / dt
-        prev_error = error
-
-        integral += error * dt
-        integral = max(-INTEGRAL_LIMIT, min(INTEGRAL_LIMIT, integral))
-
-        cmd = KP * error + KD * derivative + KI * integral
-
-        # Deadband
-        if abs(error) < DEADBAND:
-            cmd = 0
-            integral *= 0.9
-
-        # Clamp
-        cmd = max(-MAX_SPEED, min(MAX_SPEED, cmd))
-
-        # Minimum effective speed
-        if cmd > 0:
-            cmd = max(MIN_SPEED, cmd)
-        elif cmd < 0:
-            cmd = min(-MIN_SPEED, cmd)
-
-        # Slew rate
-        if cmd > last_cmd + MAX_CMD_STEP:
-            cmd = last_cmd + MAX_CMD_STEP
-        elif cmd < last_cmd - MAX_CMD_STEP:
-            cmd = last_cmd - MAX_CMD_STEP
-
-        # Smooth
-        cmd = (1 - CMD_SMOOTHING) * last_cmd + CMD_SMOOTHING * cmd
-        last_cmd = cmd
-
-        tello.send_rc_control(0, 0, 0, int(cmd))
-
-        # ----------------------------
-        # Video frame
-        # ----------------------------
-        frame = frame_read.frame
-        frame = cv2.resize(frame, (WIDTH, HEIGHT))
-        #frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-        # Convert directly to pygame surface (no rotation)
-        frame = pygame.surfarray.make_surface(frame.swapaxes(0, 1))
-        screen.blit(frame, (0, 0))
-
-        # ----------------------------
-        # Overlay text
-        # ----------------------------
-        battery = tello.get_battery()
-
-        info_lines = [
-            f"Battery: {battery}%",
-            f"Target yaw: {target_yaw:6.1f}",
-            f"Drone yaw : {filtered_yaw:6.1f}",
-            f"Error     : {error:6.1f}",
-            f"Cmd       : {int(cmd)}",
-            "",
-            f"Kp: {KP:.3f} (Q/A)",
-            f"Kd: {KD:.3f} (W/S)",
-            f"Ki: {KI:.4f} (E/D)",
-            "R = reset I   ESC = exit"
-        ]
-
-        y = 20
-        for line in info_lines:
-            txt = font.render(line, True, (255, 255, 255))
-            screen.blit(txt, (20, y))
-            y += 28
-
-        pygame.display.flip()
+        snap = control.snapshot
+        if snap is not None:
+            # ----------------------------
+            # Overlay text
+            # ----------------------------
+            info_lines = [
+                f"Battery: {snap.bat}%",
+                f"Target yaw: {snap.target_yaw:6.1f}",
+                f"Drone yaw : {snap.drone_yaw:6.1f}",
+                f"Error     : {snap.error:6.1f}",
+                f"Cmd       : {snap.cmd}",
+                "",
+                f"Kp: {pid.kp:.3f} (Q/A)",
+                f"Kd: {pid.kd:.3f} (W/S)",
+                f"Ki: {pid.ki:.4f} (E/D)",
+                "R = reset I   ESC = exit"
+            ]
+
+            # ----------------------------
+            # Video frame (only when something changed)
+            # ----------------------------
+            new_frame = video.update(source.latest())
+            if hud.update(info_lines) or new_frame:
+                video.draw(screen)
+                hud.draw(screen, (20, 20))
+                pygame.display.flip()
+
+        clock.tick(RENDER_FPS)
+
+    control.stop()
+    source.stop()
+    print(control.describe())
+    print(source.describe())
 
     # ----------------------------
     # Cleanup
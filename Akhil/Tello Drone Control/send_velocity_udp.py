@@ -1,18 +1,29 @@
 import socket
 import sys
 
+import control_protocol
+
 # UDP configuration
 TARGET_IP = "127.0.0.1"  # Change to drone controller's IP if on different machine
 TARGET_PORT = 5010       # Port that the receiver is listening on
 
+# Binary mode (python send_velocity_udp.py --binary): sends the timestamped,
+# sequenced control_protocol message instead of the 4-digit text
+BINARY = "--binary" in sys.argv
+BASE_VELOCITY = 20       # Velocity a "1" digit maps to in binary mode (matches VR_Drone.py)
+
 # Create UDP socket
 sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+sender = control_protocol.Sender()
 
 print("Velocity Command Sender")
 print("=" * 60)
 print(f"Sending commands to: {TARGET_IP}:{TARGET_PORT}")
+print(f"Mode: {'binary (control_protocol v%d)' % control_protocol.PROTOCOL_VERSION if BINARY else 'text'}")
 print("\nFormat: 4 digits [Forward][Back][Left][Right]")
 print("Each digit is 0 or 1")
+if BINARY:
+    print("Analog: v <fb> <lr> <ud>  (RC units, -100..100)")
 print("\nCommand Guide:")
 print("  1000 = Forward     |  0100 = Back")
 print("  0010 = Left        |  0001 = Right")
@@ -22,16 +33,31 @@ print("\nType 'quit' or 'q' to exit")
 print("=" * 60)
 print()
 
-def send_command(command):
-    """Send a 4-digit velocity command via UDP"""
+def encode_command(command):
+    """Text payload, or a binary message with the digits mapped to velocities"""
+    if not BINARY:
+        return command.encode()
+    forward, back, left, right = (BASE_VELOCITY * int(c) for c in command)
+    return sender.pack(fb=forward - back, lr=right - left)
+
+def send_payload(payload, label):
     try:
-        sock.sendto(command.encode(), (TARGET_IP, TARGET_PORT))
-        print(f"✓ Sent: {command}")
+        sock.sendto(payload, (TARGET_IP, TARGET_PORT))
+        print(f"✓ Sent: {label}")
         return True
     except Exception as e:
         print(f"✗ Error sending command: {e}")
         return False
 
+def send_command(command):
+    """Send a 4-digit velocity command via UDP"""
+    return send_payload(encode_command(command), command)
+
+def send_analog(fb, lr, ud):
+    """Send analog velocities (binary mode only)"""
+    label = f"fb={fb:g} lr={lr:g} ud={ud:g} (seq {sender.seq})"
+    return send_payload(sender.pack(fb=fb, lr=lr, ud=ud), label)
+
 # Main loop
 try:
     while True:
@@ -44,6 +70,16 @@ try:
             print("✓ Exiting")
             break
         
+        # Analog velocity command (binary mode)
+        if BINARY and user_input.startswith("v "):
+            try:
+                fb, lr, ud = (float(v) for v in user_input.split()[1:])
+            except ValueError:
+                print("✗ Invalid format. Use: v <fb> <lr> <ud>")
+                continue
+            send_analog(fb, lr, ud)
+            continue
+
         # Validate velocity command
         if len(user_input) == 4 and user_input.isdigit():
             # Check that each digit is 0 or 1
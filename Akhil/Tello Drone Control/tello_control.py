@@ -1,8 +1,6 @@
-from djitellopy import Tello
-import cv2
+from tello_sim import create_tello
+from frame_source import tello_source
 import pygame
-import numpy as np
-import time
 
 # Speed of the drone
 # 无人机的速度
@@ -12,6 +10,10 @@ S = 60
 # pygame窗口显示的帧数
 # 较低的帧数会导致输入延迟，因为一帧只会处理一次输入信息
 FPS = 120
+# Battery text colour and font size
+# 电量文字颜色与字号
+TEXT_COLOR = (0, 0, 255)
+FONT_SIZE = 36
 
 
 class FrontEnd(object):
@@ -47,7 +49,7 @@ class FrontEnd(object):
 
         # Init Tello object that interacts with the Tello drone
         # 初始化与Tello交互的Tello对象
-        self.tello = Tello()
+        self.tello = create_tello(telemetry=True)
 
         # Drone velocities between -100~100
         # 无人机各方向速度在-100~100之间
@@ -73,7 +75,18 @@ class FrontEnd(object):
         self.tello.streamoff()
         self.tello.streamon()
 
-        frame_read = self.tello.get_frame_read()
+        # Newest decoded frame with its capture time and sequence number
+        # 最新解码帧，附带采集时间与序号
+        source = tello_source(self.tello.get_frame_read()).start()
+
+        # One persistent video surface, refilled in place for each new frame
+        # 固定的视频画面Surface，每个新帧原地刷新
+        video = None
+        last_seq = 0
+        font = pygame.font.Font(None, FONT_SIZE)
+        battery = None
+        battery_text = None
+        clock = pygame.time.Clock()
 
         should_stop = False
         while not should_stop:
@@ -91,25 +104,36 @@ class FrontEnd(object):
                 elif event.type == pygame.KEYUP:
                     self.keyup(event.key)
 
-            if frame_read.stopped:
+            if source.ended:
                 break
 
-            self.screen.fill([0, 0, 0])
-
-            frame = frame_read.frame
-            # battery n. 电池
-            text = "Battery: {}%".format(self.tello.get_battery())
-            cv2.putText(frame, text, (5, 720 - 5),
-                cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 0, 255), 2)
-            #frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-            frame = np.rot90(frame)
-            frame = np.flipud(frame)
-
-            frame = pygame.surfarray.make_surface(frame)
-            self.screen.blit(frame, (0, 0))
-            pygame.display.update()
-
-            time.sleep(1 / FPS)
+            # Redraw only when a new frame has been captured
+            # 只在有新帧时重绘
+            frame = source.latest()
+            if frame is not None and frame.seq != last_seq:
+                last_seq = frame.seq
+                frame = frame.image
+                height, width = frame.shape[:2]
+                if video is None or video.get_size() != (width, height):
+                    video = pygame.Surface((width, height), depth=24)
+                    self.screen.fill([0, 0, 0])
+                # surfarray is (x, y): a transposed view, copied once into the surface
+                # surfarray按(x, y)排列：转置视图，只拷贝一次到Surface
+                pygame.surfarray.blit_array(video, frame.swapaxes(0, 1))
+                self.screen.blit(video, (0, 0))
+
+                # battery n. 电池
+                bat = self.tello.telemetry.state.bat
+                if bat != battery:
+                    battery = bat
+                    battery_text = font.render("Battery: {}%".format(bat), True, TEXT_COLOR)
+                self.screen.blit(battery_text, (5, 720 - 5 - battery_text.get_height()))
+                pygame.display.update()
+
+            clock.tick(FPS)
+
+        source.stop()
+        print(source.describe())
 
         # Call it always before finishing. To deallocate resources.
         # 通常在结束前调用它以释放资源
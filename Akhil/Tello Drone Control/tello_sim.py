@@ -0,0 +1,478 @@
+"""
+Local Tello stand-in for offline benchmarking and regression runs.
+
+    python tello_sim.py [--video flight.h264] [--latency 20] [--jitter 5] [--loss 2]
+
+Then run any control script with TELLO_SIM set, e.g.
+    TELLO_SIM=127.0.0.1 python "VR Drone Control/VR_Drone.py"
+
+What it does:
+- answers the SDK command port ("command", "takeoff", "battery?", ... -> "ok"/value)
+- applies "rc a b c d" to a simple dynamics model (first-order yaw rate and
+  velocity response, takeoff/land height) and pushes state datagrams to the
+  client's port 8890 at STATE_HZ, formatted like the real drone's
+- after "streamon", replays a recorded H.264 elementary stream to the client's
+  port 11111, one access unit per frame interval, in 1460-byte datagrams
+- optionally adds latency/jitter to everything it sends and drops a share of
+  incoming commands and outgoing state/video datagrams
+
+djitellopy binds its own socket to port 8889 on this machine, so the simulator
+listens on SIM_COMMAND_PORT instead; create_tello() points a Tello object at it.
+"""
+
+import argparse
+import heapq
+import itertools
+import math
+import os
+import random
+import socket
+import threading
+import time
+
+# ----------------------------
+# Ports
+# ----------------------------
+SIM_COMMAND_PORT = 9889   # Simulator SDK command port (the real drone uses 8889)
+CLIENT_STATE_PORT = 8890  # djitellopy listens for state here
+CLIENT_VIDEO_PORT = 11111  # ... and for video here
+SIM_ENV = "TELLO_SIM"     # "host" or "host:port" of a running simulator
+
+# ----------------------------
+# Timing
+# ----------------------------
+STATE_HZ = 10          # State datagram rate
+PHYSICS_HZ = 100       # Dynamics integration rate
+VIDEO_FPS = 30         # Replay frame rate
+VIDEO_CHUNK = 1460     # Datagram size, like the real stream
+TAKEOFF_TIME = 2.0     # Seconds before "takeoff" answers "ok"
+LAND_TIME = 2.0
+RC_TIMEOUT = 0.5       # Drone stops if no rc command arrives for this long
+
+# ----------------------------
+# Dynamics model
+# ----------------------------
+MAX_YAW_RATE = 100.0   # deg/s at rc yaw = 100
+YAW_TAU = 0.15         # Yaw rate time constant (s)
+MAX_VELOCITY = 100.0   # cm/s at rc = 100
+VELOCITY_TAU = 0.4
+TAKEOFF_HEIGHT = 80    # cm
+BATTERY_DRAIN = 0.05   # % per second while flying
+
+
+# ----------------------------
+# Client side
+# ----------------------------
+def create_tello(telemetry=False, **kwargs):
+    """ Tello() for the real drone, or one aimed at a running simulator when
+        $TELLO_SIM is set ("127.0.0.1" or "127.0.0.1:9889").
+
+        telemetry=True hands the state port to a TelloTelemetry receiver,
+        available as tello.telemetry (must be the first Tello in the process).
+    """
+    from djitellopy import Tello  # Only the client side needs djitellopy
+
+    if telemetry:
+        from tello_telemetry import TelloTelemetry
+        Tello.STATE_UDP_PORT = 0  # djitellopy's own state thread gets a dummy port
+
+    target = os.environ.get(SIM_ENV)
+    if not target:
+        tello = Tello(**kwargs)
+    else:
+        host, _, port = target.partition(":")
+        tello = Tello(host=host, **kwargs)
+        tello.address = (host, int(port or SIM_COMMAND_PORT))
+        print(f"[{SIM_ENV}] Using simulated Tello at {tello.address[0]}:{tello.address[1]}")
+
+    if telemetry:
+        tello.telemetry = TelloTelemetry(tello).start()
+    return tello
+
+
+# ----------------------------
+# Drone model
+# ----------------------------
+class DroneModel:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.rc = (0, 0, 0, 0)      # left_right, forward_back, up_down, yaw
+        self.last_rc_time = 0.0
+        self.flying = False
+        self.yaw = 0.0              # Unwrapped heading (deg)
+        self.yaw_rate = 0.0
+        self.vx = self.vy = self.vz = 0.0
+        self.x = self.y = 0.0
+        self.height = 0.0
+        self.target_height = 0.0
+        self.battery = 100.0
+        self.started = time.monotonic()
+        self.motor_time = 0.0
+
+    def set_rc(self, values, now):
+        with self.lock:
+            self.rc = values
+            self.last_rc_time = now
+
+    def step(self, dt, now):
+        with self.lock:
+            lr, fb, ud, yaw = self.rc
+            if not self.flying or now - self.last_rc_time > RC_TIMEOUT:
+                lr = fb = ud = yaw = 0
+
+            # First-order response to the commanded rates
+            a = min(1.0, dt / YAW_TAU)
+            self.yaw_rate += (yaw / 100 * MAX_YAW_RATE - self.yaw_rate) * a
+            self.yaw += self.yaw_rate * dt
+
+            b = min(1.0, dt / VELOCITY_TAU)
+            self.vx += (fb / 100 * MAX_VELOCITY - self.vx) * b
+            self.vy += (lr / 100 * MAX_VELOCITY - self.vy) * b
+            self.vz += (ud / 100 * MAX_VELOCITY - self.vz) * b
+
+            heading = math.radians(self.yaw)
+            self.x += (self.vx * math.cos(heading) - self.vy * math.sin(heading)) * dt
+            self.y += (self.vx * math.sin(heading) + self.vy * math.cos(heading)) * dt
+
+            if self.flying:
+                self.target_height = max(20.0, self.target_height + self.vz * dt)
+                self.motor_time += dt
+                self.battery = max(0.0, self.battery - BATTERY_DRAIN * dt)
+            # Takeoff/land/ud all move height toward the target
+            self.height += (self.target_height - self.height) * min(1.0, dt / 0.5)
+
+    def takeoff(self):
+        with self.lock:
+            self.flying = True
+            self.target_height = TAKEOFF_HEIGHT
+
+    def land(self):
+        with self.lock:
+            self.target_height = 0.0
+            self.flying = False
+            self.rc = (0, 0, 0, 0)
+
+    def emergency(self):
+        with self.lock:
+            self.flying = False
+            self.target_height = 0.0
+            self.height = 0.0
+            self.rc = (0, 0, 0, 0)
+            self.yaw_rate = self.vx = self.vy = self.vz = 0.0
+
+    def wrapped_yaw(self):
+        return int(round((self.yaw + 180) % 360 - 180))
+
+    def state_packet(self, now):
+        """State string in the Tello SDK 2.0 format."""
+        with self.lock:
+            return (
+                f"mid:-1;x:0;y:0;z:0;mpry:0,0,0;"
+                f"pitch:0;roll:0;yaw:{self.wrapped_yaw()};"
+                f"vgx:{int(self.vx / 10)};vgy:{int(self.vy / 10)};vgz:{int(self.vz / 10)};"
+                f"templ:60;temph:63;tof:{int(self.height) + 10};h:{int(self.height)};"
+                f"bat:{int(self.battery)};baro:{self.height / 100:.2f};"
+                f"time:{int(self.motor_time)};agx:0.00;agy:0.00;agz:-1000.00;\r\n"
+            ).encode()
+
+    def query(self, command):
+        """Answer to a read command ("battery?" ...)."""
+        with self.lock:
+            answers = {
+                "battery?": f"{int(self.battery)}",
+                "speed?": "10.0",
+                "time?": f"{int(self.motor_time)}s",
+                "height?": f"{int(self.height / 10)}dm",
+                "temp?": "60~63C",
+                "attitude?": f"pitch:0;roll:0;yaw:{self.wrapped_yaw()};",
+                "baro?": f"{self.height / 100:.2f}",
+                "tof?": f"{int(self.height) + 10}mm",
+                "wifi?": "90",
+                "sdk?": "30",
+                "sn?": "0TQSIMULATOR01",
+            }
+        return answers.get(command, "error")
+
+
+# ----------------------------
+# Network impairment
+# ----------------------------
+class DelayLine:
+    """ Runs callbacks after the configured latency (+ uniform jitter), in
+        due-time order, on one thread. Also decides which datagrams are lost.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, loss=0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.loss = loss
+        self.queue = []
+        self.counter = itertools.count()
+        self.cond = threading.Condition()
+        self.running = True
+        self.dropped = 0
+        threading.Thread(target=self.run, daemon=True).start()
+
+    def lost(self):
+        if self.loss and random.random() < self.loss:
+            self.dropped += 1
+            return True
+        return False
+
+    def schedule(self, fn, extra=0.0):
+        delay = self.latency + extra
+        if self.jitter:
+            delay += random.uniform(0, self.jitter)
+        if delay <= 0:
+            fn()
+            return
+        with self.cond:
+            heapq.heappush(self.queue, (time.monotonic() + delay, next(self.counter), fn))
+            self.cond.notify()
+
+    def run(self):
+        while self.running:
+            with self.cond:
+                while not self.queue:
+                    self.cond.wait()
+                due, _, fn = self.queue[0]
+                wait = due - time.monotonic()
+                if wait > 0:
+                    self.cond.wait(wait)
+                    continue
+                heapq.heappop(self.queue)
+            try:
+                fn()
+            except OSError:
+                pass
+
+
+# ----------------------------
+# Video replay
+# ----------------------------
+def split_access_units(data):
+    """ Split an H.264 elementary stream into frames. SPS/PPS/SEI/AUD units
+        stay with the frame that follows them.
+    """
+    frames = []
+    frame_start = 0
+    in_prefix = False   # Only parameter sets/SEI/AUD since the last frame cut
+    i = data.find(b"\x00\x00\x01")
+    while i != -1 and i + 4 < len(data):
+        start = i - 1 if i > 0 and data[i - 1] == 0 else i
+        nal_type = data[i + 3] & 0x1F
+        if nal_type in (1, 5):
+            # first_mb_in_slice == 0: a new frame, unless parameter sets opened it
+            if data[i + 4] & 0x80 and not in_prefix and start > frame_start:
+                frames.append(data[frame_start:start])
+                frame_start = start
+            in_prefix = False
+        elif not in_prefix:
+            if start > frame_start:
+                frames.append(data[frame_start:start])
+                frame_start = start
+            in_prefix = True
+        i = data.find(b"\x00\x00\x01", i + 3)
+    frames.append(data[frame_start:])
+    return [f for f in frames if f]
+
+
+# ----------------------------
+# Simulator
+# ----------------------------
+class TelloSim:
+    def __init__(self, host="127.0.0.1", port=SIM_COMMAND_PORT, video=None,
+                 state_hz=STATE_HZ, fps=VIDEO_FPS, latency=0.0, jitter=0.0, loss=0.0):
+        self.model = DroneModel()
+        self.net = DelayLine(latency, jitter, loss)
+        self.state_hz = state_hz
+        self.fps = fps
+
+        self.cmd_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.cmd_sock.bind((host, port))
+        self.out_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.host, self.port = host, port
+
+        self.client = None        # (ip, port) of the djitellopy command socket
+        self.streaming = False
+        self.running = True
+
+        self.frames = split_access_units(open(video, "rb").read()) if video else []
+
+        # Counters
+        self.commands = 0
+        self.rc_commands = 0
+        self.state_sent = 0
+        self.video_sent = 0
+
+    # ----------------------------
+    # Output
+    # ----------------------------
+    def send(self, data, addr, droppable=True):
+        if droppable and self.net.lost():
+            return
+        self.net.schedule(lambda: self.out_sock.sendto(data, addr))
+
+    def reply(self, text, addr, delay=0.0):
+        data = text.encode()
+        self.net.schedule(lambda: self.cmd_sock.sendto(data, addr), extra=delay)
+
+    # ----------------------------
+    # SDK commands
+    # ----------------------------
+    def command_loop(self):
+        while self.running:
+            try:
+                data, addr = self.cmd_sock.recvfrom(1024)
+            except OSError:
+                break
+            self.client = addr
+            if self.net.lost():
+                continue
+            try:
+                command = data.decode().strip()
+            except UnicodeDecodeError:
+                continue
+            self.commands += 1
+            self.net.schedule(lambda c=command, a=addr: self.handle(c, a))
+
+    def handle(self, command, addr):
+        now = time.monotonic()
+        words = command.split()
+        if not words:
+            return
+        verb = words[0]
+
+        if verb == "rc":
+            # No reply, like the real drone
+            try:
+                values = tuple(int(v) for v in words[1:5])
+            except ValueError:
+                return
+            if len(values) == 4:
+                self.rc_commands += 1
+                self.model.set_rc(values, now)
+            return
+
+        if verb.endswith("?"):
+            self.reply(self.model.query(verb), addr)
+            return
+
+        if verb == "takeoff":
+            self.model.takeoff()
+            self.reply("ok", addr, delay=TAKEOFF_TIME)
+        elif verb == "land":
+            self.model.land()
+            self.reply("ok", addr, delay=LAND_TIME)
+        elif verb == "emergency":
+            self.model.emergency()
+            self.reply("ok", addr)
+        elif verb == "streamon":
+            self.streaming = True
+            self.reply("ok", addr)
+        elif verb == "streamoff":
+            self.streaming = False
+            self.reply("ok", addr)
+        else:
+            # command, speed, up/down/cw/ccw ... are acknowledged
+            self.reply("ok", addr)
+
+    # ----------------------------
+    # State + physics
+    # ----------------------------
+    def state_loop(self):
+        period = 1 / PHYSICS_HZ
+        state_every = max(1, round(PHYSICS_HZ / self.state_hz))
+        tick = 0
+        next_tick = time.monotonic()
+        while self.running:
+            next_tick += period
+            now = time.monotonic()
+            self.model.step(period, now)
+            tick += 1
+            if tick % state_every == 0 and self.client:
+                self.send(self.model.state_packet(now), (self.client[0], CLIENT_STATE_PORT))
+                self.state_sent += 1
+            delay = next_tick - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_tick = time.monotonic()
+
+    # ----------------------------
+    # Video
+    # ----------------------------
+    def video_loop(self):
+        if not self.frames:
+            return
+        period = 1 / self.fps
+        next_frame = time.monotonic()
+        for frame in itertools.cycle(self.frames):
+            if not self.running:
+                break
+            next_frame += period
+            if self.streaming and self.client:
+                addr = (self.client[0], CLIENT_VIDEO_PORT)
+                for i in range(0, len(frame), VIDEO_CHUNK):
+                    self.send(frame[i:i + VIDEO_CHUNK], addr)
+                    self.video_sent += 1
+            delay = next_frame - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                next_frame = time.monotonic()
+
+    # ----------------------------
+    # Run
+    # ----------------------------
+    def start(self):
+        for target in (self.command_loop, self.state_loop, self.video_loop):
+            threading.Thread(target=target, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.running = False
+        self.net.running = False
+        self.cmd_sock.close()
+        self.out_sock.close()
+
+    def status(self):
+        m = self.model
+        return (f"[SIM] {'FLYING' if m.flying else 'LANDED'} yaw:{m.wrapped_yaw():4d} "
+                f"h:{int(m.height):3d} bat:{int(m.battery)}% | cmds:{self.commands} "
+                f"rc:{self.rc_commands} state:{self.state_sent} video:{self.video_sent}pkts "
+                f"lost:{self.net.dropped}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Local Tello simulator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=SIM_COMMAND_PORT)
+    parser.add_argument("--video", help="H.264 elementary stream to replay on port 11111")
+    parser.add_argument("--fps", type=float, default=VIDEO_FPS)
+    parser.add_argument("--state-hz", type=float, default=STATE_HZ)
+    parser.add_argument("--latency", type=float, default=0.0, help="Added one-way latency (ms)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Uniform extra latency (ms)")
+    parser.add_argument("--loss", type=float, default=0.0, help="Packet loss (%%)")
+    args = parser.parse_args()
+
+    sim = TelloSim(args.host, args.port, args.video, args.state_hz, args.fps,
+                   args.latency / 1000, args.jitter / 1000, args.loss / 100).start()
+
+    print(f"Tello simulator on {args.host}:{args.port}")
+    if sim.frames:
+        print(f"Video: {len(sim.frames)} frames from {args.video} at {args.fps:g} fps")
+    print(f"Point scripts at it with: {SIM_ENV}={args.host}:{args.port}")
+    print("Press Ctrl+C to stop.\n")
+
+    try:
+        while True:
+            time.sleep(5)
+            print(sim.status())
+    except KeyboardInterrupt:
+        print("\nStopping simulator...")
+    sim.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,196 @@
+"""
+Push-based Tello telemetry.
+
+The Tello pushes a state datagram (yaw, battery, height, ...) to UDP 8890
+about ten times a second. TelloTelemetry receives them on its own thread,
+decodes each one once into an immutable TelloState record and publishes it
+by swapping a single reference, so hot loops read `telemetry.state.yaw` and
+`telemetry.age()` without locks and without going through the SDK object.
+
+    tello = create_tello(telemetry=True)   # see tello_sim.create_tello
+    tello.connect()
+    telemetry = tello.telemetry
+
+    state = telemetry.state                # latest record (attribute access)
+    if telemetry.age() < 0.5: ...          # seconds since it arrived
+
+    # Run a controller step exactly when fresh state arrives
+    state = telemetry.wait_for_update(state.seq, timeout=0.2)
+
+    # ... or get called on the receiver thread
+    telemetry.subscribe(lambda state: ...)
+
+djitellopy binds 8890 itself when the first Tello() is created, so the port
+has to be taken over before that (create_tello(telemetry=True) does it). The
+decoded fields are still handed to djitellopy, so tello.connect() and the
+get_*() methods keep working.
+"""
+
+import collections
+import socket
+import threading
+import time
+
+STATE_PORT = 8890
+WAKEUP_TIMEOUT = 0.5  # Seconds between stop-flag checks when no state arrives
+
+# ----------------------------
+# State record
+# ----------------------------
+INT_FIELDS = ("mid", "x", "y", "z", "pitch", "roll", "yaw", "vgx", "vgy", "vgz",
+              "templ", "temph", "tof", "h", "bat", "time")
+FLOAT_FIELDS = ("baro", "agx", "agy", "agz")
+FIELDS = INT_FIELDS + FLOAT_FIELDS
+
+# received: time.monotonic() of arrival, seq: datagram counter (0 = nothing yet)
+TelloState = collections.namedtuple("TelloState", ("received", "seq") + FIELDS)
+EMPTY_STATE = TelloState(0.0, 0, *([0] * len(INT_FIELDS)), *([0.0] * len(FLOAT_FIELDS)))
+
+CONVERTERS = dict([(name, int) for name in INT_FIELDS] + [(name, float) for name in FLOAT_FIELDS])
+
+
+def parse_state(data):
+    """Decode one state datagram into a {field: value} dict (unknown fields kept as text)."""
+    fields = {}
+    for item in data.decode("ascii", "replace").strip().split(";"):
+        key, sep, value = item.partition(":")
+        if not sep:
+            continue
+        convert = CONVERTERS.get(key)
+        if convert is not None:
+            try:
+                value = convert(value)
+            except ValueError:
+                continue
+        fields[key] = value
+    return fields
+
+
+class TelloTelemetry:
+    """ Latest-value store for Tello state, fed by a receiver thread. """
+
+    def __init__(self, tello=None, port=STATE_PORT, host=None):
+        self.tello = tello
+        # Only accept state from the drone we talk to (like djitellopy does)
+        self.host = host or (tello.address[0] if tello is not None else None)
+
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(("", port))
+        self.sock.settimeout(WAKEUP_TIMEOUT)
+
+        self.state = EMPTY_STATE
+        self.interval = 0.0      # Smoothed time between datagrams (s)
+        self.received = 0
+        self.errors = 0
+
+        self.update = threading.Condition()
+        self.callbacks = ()      # Replaced copy-on-write, like the relay's subscriber table
+
+        self.active = False
+        self.thread = None
+
+    # ----------------------------
+    # Receiver thread
+    # ----------------------------
+    def run(self):
+        while self.active:
+            try:
+                data, address = self.sock.recvfrom(1024)
+            except socket.timeout:
+                continue
+            except OSError:
+                break
+            if self.host is not None and address[0] != self.host:
+                continue
+            self.on_datagram(data, time.monotonic())
+
+    def on_datagram(self, data, now):
+        fields = parse_state(data)
+        if not fields:
+            return  # "ok" replies land here too
+        previous = self.state
+        try:
+            state = TelloState(now, previous.seq + 1,
+                               *[fields.get(name, default) for name, default in zip(FIELDS, EMPTY_STATE[2:])])
+        except TypeError:
+            self.errors += 1
+            return
+
+        if previous.seq:
+            self.interval += 0.1 * ((now - previous.received) - self.interval)
+        self.received += 1
+
+        # Publish: one reference swap, readers never see a half-written record
+        self.state = state
+
+        # Keep djitellopy's getters and connect(wait_for_state=True) working
+        if self.tello is not None:
+            try:
+                self.tello.get_own_udp_object()["state"] = fields
+            except KeyError:
+                pass
+
+        with self.update:
+            self.update.notify_all()
+        for callback in self.callbacks:
+            try:
+                callback(state)
+            except Exception as e:
+                self.errors += 1
+                print(f"[Telemetry] Callback error: {e}")
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+        self.sock.close()
+
+    # ----------------------------
+    # Readers
+    # ----------------------------
+    def age(self, now=None):
+        """Seconds since the latest state arrived (inf before the first one)."""
+        state = self.state
+        if not state.seq:
+            return float("inf")
+        if now is None:
+            now = time.monotonic()
+        return now - state.received
+
+    def rate(self):
+        return 1.0 / self.interval if self.interval > 0 else 0.0
+
+    def wait_for_update(self, seq=None, timeout=None):
+        """ Block until a state newer than `seq` arrives (default: newer than
+            the current one). Returns the new state, or None on timeout.
+        """
+        if seq is None:
+            seq = self.state.seq
+        with self.update:
+            if self.update.wait_for(lambda: self.state.seq > seq, timeout):
+                return self.state
+        return None
+
+    # ----------------------------
+    # Change notification
+    # ----------------------------
+    def subscribe(self, callback):
+        """Call callback(state) on the receiver thread for every new state."""
+        self.callbacks = self.callbacks + (callback,)
+        return callback
+
+    def unsubscribe(self, callback):
+        # == rather than `is`: bound methods are new objects on every access
+        self.callbacks = tuple(c for c in self.callbacks if c != callback)
+
+    def describe(self):
+        state = self.state
+        age = self.age()
+        age_text = f"{age * 1000:.0f}ms" if age != float("inf") else "-"
+        return f"state {self.rate():.1f}Hz age:{age_text} bat:{state.bat}% yaw:{state.yaw}"
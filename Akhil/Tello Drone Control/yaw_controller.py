@@ -0,0 +1,328 @@
+"""
+Yaw PID shared by VR_Drone.py, espyaw.py, keyboardyaw.py, mouse_yaw.py and
+dronecontrol_imu/donecontrol_imu.py.
+
+YawPID is the controller the scripts run: one step per loop iteration with
+the measured time since the previous step, so the derivative and integral
+terms are right whatever rate the loop actually achieves. The command shaping
+is the same chain the scripts used inline:
+
+    PID -> deadband (command 0, integral decays) -> clamp to max_speed
+        -> min_speed kick -> max_cmd_step slew -> cmd_smoothing
+
+max_cmd_step and cmd_smoothing are per REFERENCE_PERIOD (the 40 Hz tick
+they were tuned on) and scaled by the measured dt, so the slew rate and
+the smoothing time constant don't change when a loop steps faster (e.g.
+on every packet) or slower. The smoothed change is what gets slew limited
+(to cmd_smoothing * max_cmd_step per period): at exactly REFERENCE_PERIOD
+that is the same as the old slew-then-smooth, and unlike it, it still
+converges when the steps get shorter.
+
+BatchYawPID runs N controllers with their own gains in NumPy, and simulate()
+flies all of them against a target yaw trace in one pass, for offline gain
+sweeps:
+
+    python yaw_controller.py --trace target.csv --kp 0.2:2.0:25 --kd 0:0.8:25 --ki 0:0.05:16
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+# ----------------------------
+# Defaults (the values most scripts used)
+# ----------------------------
+MAX_SPEED = 80
+MIN_SPEED = 12
+DEADBAND = 1.0
+INTEGRAL_LIMIT = 120
+DEADBAND_DECAY = 0.9   # Integral multiplier per step inside the deadband
+
+MIN_DT = 0.001         # Guard against two steps in the same clock tick
+REFERENCE_PERIOD = 1 / 40   # Step period max_cmd_step / cmd_smoothing are given for
+MAX_DT = 0.5           # Cap after a stall (takeoff sleep, slow frame ...)
+
+# ----------------------------
+# Simulation plant (same model as tello_sim.py)
+# ----------------------------
+SIM_HZ = 40
+YAW_RATE_PER_CMD = 1.0  # deg/s per RC yaw unit
+YAW_TAU = 0.15          # Yaw rate time constant (s)
+
+
+class YawPID:
+    """ Yaw PID with the scripts' command shaping.
+
+        max_cmd_step / cmd_smoothing = None disables that stage, and
+        deadband_decay = 1.0 keeps the integral inside the deadband.
+        kp/ki/kd are plain attributes so tuning keys can change them live.
+    """
+
+    def __init__(self, kp, ki, kd, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                 deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT,
+                 max_cmd_step=None, cmd_smoothing=None, deadband_decay=DEADBAND_DECAY,
+                 reference_period=REFERENCE_PERIOD):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.max_speed = max_speed
+        self.min_speed = min_speed
+        self.deadband = deadband
+        self.integral_limit = integral_limit
+        self.max_cmd_step = max_cmd_step
+        self.cmd_smoothing = cmd_smoothing
+        self.deadband_decay = deadband_decay
+        self.reference_period = reference_period
+        self.reset()
+
+    def reset(self):
+        self.prev_error = None
+        self.prev_time = None
+        self.integral = 0.0
+        self.last_cmd = 0.0
+        self.dt = 0.0
+        self.p_term = self.i_term = self.d_term = 0.0  # Last step's terms, for logging
+
+    def step(self, error, now=None, dt=None):
+        """Advance one step. Uses `dt` if given, else the time since the last step."""
+        if dt is None:
+            if now is None:
+                now = time.monotonic()
+            dt = now - self.prev_time if self.prev_time is not None else 0.0
+            self.prev_time = now
+        dt = min(MAX_DT, max(MIN_DT, dt))
+        self.dt = dt
+
+        # No derivative kick on the first step
+        derivative = (error - self.prev_error) / dt if self.prev_error is not None else 0.0
+        self.prev_error = error
+
+        self.integral += error * dt
+        self.integral = max(-self.integral_limit, min(self.integral_limit, self.integral))
+
+        self.p_term = self.kp * error
+        self.i_term = self.ki * self.integral
+        self.d_term = self.kd * derivative
+        cmd = self.p_term + self.d_term + self.i_term
+
+        if abs(error) < self.deadband:
+            cmd = 0.0
+            self.integral *= self.deadband_decay
+
+        cmd = max(-self.max_speed, min(self.max_speed, cmd))
+
+        if cmd > 0:
+            cmd = max(self.min_speed, cmd)
+        elif cmd < 0:
+            cmd = min(-self.min_speed, cmd)
+
+        # Smoothing, then slew on the smoothed change, both per reference period
+        last_cmd = self.last_cmd
+        periods = dt / self.reference_period
+        change = cmd - last_cmd
+        smoothing = 1.0
+        if self.cmd_smoothing is not None:
+            smoothing = self.cmd_smoothing
+            change *= 1 - (1 - smoothing) ** periods
+        if self.max_cmd_step is not None:
+            max_step = self.max_cmd_step * smoothing * periods
+            change = max(-max_step, min(max_step, change))
+        cmd = last_cmd + change
+
+        self.last_cmd = cmd
+        return cmd
+
+
+# ----------------------------
+# Vectorized controllers
+# ----------------------------
+class BatchYawPID:
+    """ N independent YawPIDs stepped together.
+
+        Every parameter may be a scalar or an array broadcastable to (N,),
+        so a sweep can vary gains, slew or smoothing per controller. step()
+        matches YawPID.step() element for element.
+    """
+
+    def __init__(self, kp, ki, kd, max_speed=MAX_SPEED, min_speed=MIN_SPEED,
+                 deadband=DEADBAND, integral_limit=INTEGRAL_LIMIT,
+                 max_cmd_step=None, cmd_smoothing=None, deadband_decay=DEADBAND_DECAY,
+                 reference_period=REFERENCE_PERIOD):
+        self.kp, self.ki, self.kd = np.broadcast_arrays(
+            *(np.asarray(g, dtype=np.float64) for g in (kp, ki, kd)))
+        self.size = self.kp.size
+        self.max_speed = np.asarray(max_speed, dtype=np.float64)
+        self.min_speed = np.asarray(min_speed, dtype=np.float64)
+        self.deadband = np.asarray(deadband, dtype=np.float64)
+        self.integral_limit = np.asarray(integral_limit, dtype=np.float64)
+        self.max_cmd_step = None if max_cmd_step is None else np.asarray(max_cmd_step, dtype=np.float64)
+        self.cmd_smoothing = None if cmd_smoothing is None else np.asarray(cmd_smoothing, dtype=np.float64)
+        self.deadband_decay = np.asarray(deadband_decay, dtype=np.float64)
+        self.reference_period = reference_period
+        self.reset()
+
+    def reset(self):
+        self.prev_error = None
+        self.integral = np.zeros(self.size)
+        self.last_cmd = np.zeros(self.size)
+
+    def step(self, error, dt):
+        dt = min(MAX_DT, max(MIN_DT, dt))
+
+        if self.prev_error is None:
+            derivative = 0.0
+        else:
+            derivative = (error - self.prev_error) / dt
+        self.prev_error = error
+
+        integral = self.integral + error * dt
+        np.clip(integral, -self.integral_limit, self.integral_limit, out=integral)
+
+        cmd = self.kp * error + self.kd * derivative + self.ki * integral
+
+        in_band = np.abs(error) < self.deadband
+        cmd = np.where(in_band, 0.0, cmd)
+        self.integral = np.where(in_band, integral * self.deadband_decay, integral)
+
+        np.clip(cmd, -self.max_speed, self.max_speed, out=cmd)
+        cmd = np.where(cmd > 0, np.maximum(cmd, self.min_speed),
+                       np.where(cmd < 0, np.minimum(cmd, -self.min_speed), 0.0))
+
+        last_cmd = self.last_cmd
+        periods = dt / self.reference_period
+        change = cmd - last_cmd
+        smoothing = 1.0
+        if self.cmd_smoothing is not None:
+            smoothing = self.cmd_smoothing
+            change = change * (1 - (1 - smoothing) ** periods)
+        if self.max_cmd_step is not None:
+            max_step = self.max_cmd_step * smoothing * periods
+            change = np.clip(change, -max_step, max_step)
+        cmd = last_cmd + change
+
+        self.last_cmd = cmd
+        return cmd
+
+
+def simulate(pid, target, dt, rc_quantize=True):
+    """ Fly every controller in `pid` (a BatchYawPID) after the target yaw trace.
+
+        target: (T,) target yaw in degrees, one sample per control step
+        dt:     scalar or (T,) step durations in seconds
+        Returns a dict of (N,) arrays: mean absolute error, RMS error,
+        worst overshoot past the target (deg) and mean |command| (effort).
+    """
+    target = np.asarray(target, dtype=np.float64)
+    dts = np.broadcast_to(np.asarray(dt, dtype=np.float64), target.shape)
+    n = pid.size
+
+    yaw = np.full(n, target[0])
+    rate = np.zeros(n)
+    abs_error = np.zeros(n)
+    sq_error = np.zeros(n)
+    overshoot = np.zeros(n)
+    effort = np.zeros(n)
+
+    pid.reset()
+    for t in range(len(target)):
+        step_dt = float(dts[t])
+        error = target[t] - yaw
+        cmd = pid.step(error, step_dt)
+        if rc_quantize:
+            cmd = np.trunc(cmd)  # send_rc_control(int(cmd))
+
+        # First-order yaw rate response, then integrate heading
+        rate += (cmd * YAW_RATE_PER_CMD - rate) * min(1.0, step_dt / YAW_TAU)
+        yaw += rate * step_dt
+
+        abs_error += np.abs(error)
+        sq_error += error * error
+        effort += np.abs(cmd)
+        # Past the target in the direction we were correcting
+        past = np.where(np.sign(error) != np.sign(target[t] - yaw), np.abs(target[t] - yaw), 0.0)
+        np.maximum(overshoot, past, out=overshoot)
+
+    steps = max(1, len(target))
+    return {
+        "mae": abs_error / steps,
+        "rms": np.sqrt(sq_error / steps),
+        "overshoot": overshoot,
+        "effort": effort / steps,
+    }
+
+
+# ----------------------------
+# Gain sweep CLI
+# ----------------------------
+def parse_range(text):
+    """'0.2:2.0:25' -> linspace, '0.6' -> single value."""
+    parts = [float(p) for p in text.split(":")]
+    if len(parts) == 1:
+        return np.array(parts)
+    start, stop, count = parts
+    return np.linspace(start, stop, int(count))
+
+
+def load_trace(path):
+    """ CSV with columns time,target_yaw (header optional), or a flight
+        recording (.fdr, see flight_recorder.py). Returns (target, dt).
+    """
+    if path.endswith(".fdr"):
+        from flight_recorder import load
+        columns = load(path)
+        return columns["target_yaw"].astype(np.float64), columns["dt"].astype(np.float64)
+
+    data = np.genfromtxt(path, delimiter=",", names=None, comments="#")
+    if np.isnan(data[0]).any():
+        data = data[1:]
+    times, target = data[:, 0], data[:, 1]
+    dt = np.diff(times, prepend=times[0] - 1 / SIM_HZ)
+    return target, dt
+
+
+def demo_trace(seconds=30, hz=SIM_HZ):
+    """Steps and a slow sweep, like a pilot looking around."""
+    t = np.arange(int(seconds * hz)) / hz
+    target = np.where(t < 5, 0.0, 45.0)
+    target = np.where(t >= 10, -30.0, target)
+    target = np.where(t >= 15, 60 * np.sin((t - 15) * 0.8), target)
+    target = np.where(t >= 25, 170.0, target)
+    return target, 1 / hz
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline yaw PID gain sweep")
+    parser.add_argument("--trace", help="CSV time,target_yaw or .fdr recording (default: built-in demo trace)")
+    parser.add_argument("--kp", default="0.2:2.0:25")
+    parser.add_argument("--ki", default="0:0.05:16")
+    parser.add_argument("--kd", default="0:0.8:25")
+    parser.add_argument("--max-cmd-step", type=float, default=6)
+    parser.add_argument("--cmd-smoothing", type=float, default=0.3)
+    parser.add_argument("--effort-weight", type=float, default=0.02,
+                        help="Cost = MAE + weight * effort + overshoot / 10")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    target, dt = load_trace(args.trace) if args.trace else demo_trace()
+    kp, ki, kd = np.meshgrid(parse_range(args.kp), parse_range(args.ki),
+                             parse_range(args.kd), indexing="ij")
+    kp, ki, kd = kp.ravel(), ki.ravel(), kd.ravel()
+
+    pid = BatchYawPID(kp, ki, kd, max_cmd_step=args.max_cmd_step,
+                      cmd_smoothing=args.cmd_smoothing)
+    print(f"Simulating {pid.size} gain sets over {len(target)} steps...")
+    start = time.perf_counter()
+    result = simulate(pid, target, dt)
+    elapsed = time.perf_counter() - start
+    print(f"Done in {elapsed:.2f}s ({pid.size * len(target) / elapsed / 1e6:.1f}M controller steps/s)\n")
+
+    cost = result["mae"] + args.effort_weight * result["effort"] + result["overshoot"] / 10
+    print(f"{'rank':>4} {'Kp':>6} {'Ki':>7} {'Kd':>6} {'MAE':>7} {'RMS':>7} {'over':>6} {'effort':>7}")
+    for rank, i in enumerate(np.argsort(cost)[:args.top], 1):
+        print(f"{rank:>4} {kp[i]:6.3f} {ki[i]:7.4f} {kd[i]:6.3f} {result['mae'][i]:7.2f} "
+              f"{result['rms'][i]:7.2f} {result['overshoot'][i]:6.1f} {result['effort'][i]:7.1f}")
+
+
+if __name__ == "__main__":
+    main()
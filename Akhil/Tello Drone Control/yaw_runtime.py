@@ -0,0 +1,198 @@
+"""
+Control/render split for the pygame yaw scripts (keyboardyaw.py,
+mouse_yaw.py, espyaw.py).
+
+The PID step and send_rc_control run on a ControlLoop thread against absolute
+monotonic deadlines, so a slow video frame, a resize or a big window never
+delays a control step or skews its measured dt. The pygame loop on the main
+thread only draws: it reads the newest snapshot the control step published
+(one reference swap, like tello_telemetry), copies new video frames into
+persistent surfaces and draws the HUD from cached glyph surfaces, redrawing
+only when a frame or a HUD value changed.
+
+    loop = ControlLoop(step, hz=40).start()   # step(now) returns a snapshot
+    source = tello_source(tello.get_frame_read()).start()
+    video = VideoView((WIDTH, HEIGHT))
+    hud = Hud(font)
+    while running:
+        ...events...
+        new_frame = video.update(source.latest())
+        if hud.update(hud_lines(loop.snapshot)) or new_frame:
+            video.draw(screen)
+            hud.draw(screen, (20, 20))
+            pygame.display.flip()
+        clock.tick(RENDER_FPS)
+    loop.stop()
+    source.stop()
+"""
+
+import threading
+import time
+
+import pygame
+
+CONTROL_HZ = 40
+RENDER_FPS = 60
+HUD_COLOR = (255, 255, 255)
+
+
+# ----------------------------
+# Control thread
+# ----------------------------
+class ControlLoop:
+    """ Calls step(now) every 1/hz seconds on its own thread.
+
+        Deadlines are absolute (start + n * period), so a late step does not
+        push the following ones back; if a step overruns a whole period the
+        missed deadlines are skipped rather than run back to back. Whatever
+        step() returns is published as `snapshot` for the render loop.
+    """
+
+    def __init__(self, step, hz=CONTROL_HZ, name="control"):
+        self.step = step
+        self.period = 1.0 / hz
+        self.name = name
+
+        self.snapshot = None
+        self.steps = 0
+        self.overruns = 0        # Deadlines skipped because a step ran long
+        self.errors = 0
+        self.lateness = 0.0      # Smoothed wake-up delay past the deadline (s)
+        self.max_lateness = 0.0
+
+        self.active = False
+        self.thread = None
+
+    def run(self):
+        deadline = time.monotonic()
+        while self.active:
+            now = time.monotonic()
+            late = now - deadline
+            self.lateness += 0.05 * (late - self.lateness)
+            if late > self.max_lateness:
+                self.max_lateness = late
+
+            try:
+                self.snapshot = self.step(now)
+            except Exception as e:
+                self.errors += 1
+                print(f"[{self.name}] Step error: {e}")
+            self.steps += 1
+
+            deadline += self.period
+            now = time.monotonic()
+            if now > deadline:
+                missed = int((now - deadline) / self.period) + 1
+                self.overruns += missed
+                deadline += missed * self.period
+            time.sleep(deadline - now)
+
+    def start(self):
+        self.active = True
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self, timeout=2):
+        self.active = False
+        if self.thread is not None:
+            self.thread.join(timeout=timeout)
+            self.thread = None
+
+    def describe(self):
+        return (f"{self.name} {self.steps} steps late:{self.lateness * 1000:.2f}ms "
+                f"max:{self.max_lateness * 1000:.1f}ms overruns={self.overruns} errors={self.errors}")
+
+
+# ----------------------------
+# Video
+# ----------------------------
+class VideoView:
+    """ Window-sized video surface, refilled in place when a new frame arrives.
+
+        Takes Frame records from a frame_source.FrameSource: (height, width, 3)
+        RGB images with a sequence number that tells new from already drawn.
+    """
+
+    def __init__(self, size):
+        self.size = tuple(size)
+        self.surface = pygame.Surface(self.size, depth=24)
+        self.source = None       # Frame-sized staging surface when scaling
+        self.seq = 0
+        self.frames = 0
+
+    def update(self, frame):
+        """Copy `frame` in if it is new. Returns True when the surface changed."""
+        if frame is None or frame.seq == self.seq:
+            return False
+        self.seq = frame.seq
+        image = frame.image
+        height, width = image.shape[:2]
+        # surfarray is (x, y): a transposed view, no intermediate copy
+        if (width, height) == self.size:
+            pygame.surfarray.blit_array(self.surface, image.swapaxes(0, 1))
+        else:
+            if self.source is None or self.source.get_size() != (width, height):
+                self.source = pygame.Surface((width, height), depth=24)
+            pygame.surfarray.blit_array(self.source, image.swapaxes(0, 1))
+            pygame.transform.scale(self.source, self.size, self.surface)
+        self.frames += 1
+        return True
+
+    def draw(self, screen, pos=(0, 0)):
+        screen.blit(self.surface, pos)
+
+
+# ----------------------------
+# HUD
+# ----------------------------
+class Hud:
+    """ Text overlay built from pre-rendered glyph surfaces.
+
+        Each character is rendered once per font; a line surface is rebuilt
+        from glyphs only when its text changes, and draw() is plain blits.
+    """
+
+    def __init__(self, font, color=HUD_COLOR, line_height=None):
+        self.font = font
+        self.color = color
+        self.line_height = line_height or font.get_linesize()
+        self.glyphs = {}
+        self.texts = []
+        self.surfaces = []
+
+    def glyph(self, char):
+        surface = self.glyphs.get(char)
+        if surface is None:
+            surface = self.glyphs[char] = self.font.render(char, True, self.color)
+        return surface
+
+    def render_line(self, text):
+        glyphs = [self.glyph(char) for char in text]
+        width = sum(g.get_width() for g in glyphs)
+        surface = pygame.Surface((max(width, 1), self.font.get_height()), pygame.SRCALPHA)
+        x = 0
+        for g in glyphs:
+            surface.blit(g, (x, 0))
+            x += g.get_width()
+        return surface
+
+    def update(self, lines):
+        """Re-render the lines whose text changed. Returns True if any did."""
+        changed = False
+        if len(lines) != len(self.texts):
+            self.texts = [None] * len(lines)
+            self.surfaces = [None] * len(lines)
+            changed = True
+        for i, text in enumerate(lines):
+            if text != self.texts[i]:
+                self.texts[i] = text
+                self.surfaces[i] = self.render_line(text)
+                changed = True
+        return changed
+
+    def draw(self, screen, pos):
+        x, y = pos
+        for surface in self.surfaces:
+            screen.blit(surface, (x, y))
+            y += self.line_height